@@ -4,17 +4,82 @@ import json
 import time
 import sys
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple, List, Union
+from typing import Dict, Any, Optional, Tuple, List, Union, Iterator, NamedTuple
 import threading
+import shutil
+import bisect
+import heapq
+from array import array
 from queue import Queue
 import uuid
+import errno
+import mmap
+import struct
+import stat
+import gzip
+import zlib
+import hashlib
+import mimetypes
+import fnmatch
+import argparse
+from collections import OrderedDict, deque
 import logging # Import logging
 
-from flask import Flask, request, jsonify, render_template, Response, stream_with_context, send_from_directory
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context, abort
+from werkzeug.security import safe_join
 from rich.filesize import decimal as format_size # Re-use from rich or write your own
+try:
+    import brotli  # Optional: adds 'br' variants to precompressed static assets
+except ImportError:
+    brotli = None
 
 # --- Constants ---
 FILE_COUNT_THRESHOLD = 500
+ERROR_GROUP_LIMIT = 64      # Max distinct (errno, path prefix) groups kept per scan
+ERROR_SAMPLE_LIMIT = 5      # Sample paths kept per error group
+ERROR_PREFIX_DEPTH = 2      # Path components (below the scan root) used to group errors
+
+# Completed scans are persisted here so they survive a server restart
+APP_DATA_DIR = Path(__file__).resolve().parent.parent / '03_DATA_-_Application-Data'
+SNAPSHOT_DIR = APP_DATA_DIR / 'scan-snapshots'
+SNAPSHOT_SUFFIX = '.scansnap'
+SNAPSHOT_OPEN_LIMIT = 8     # Snapshots kept memory-mapped at once (LRU)
+
+# Memory-bounded scans spill finished subtrees to segment files here
+SEGMENT_DIR = APP_DATA_DIR / 'scan-segments'
+SEGMENT_OPEN_LIMIT = 32         # Segments kept memory-mapped at once (LRU)
+SPILL_NODE_BYTES = 500          # Rough in-memory cost of one scanned node (dict + strings)
+SPILL_MIN_SUBTREE_NODES = 256   # Smaller finished subtrees are not worth a segment file
+SEGMENT_ORPHAN_GRACE_SECONDS = 3600  # Unreferenced segment folders younger than this may belong to a running scan
+
+# Size accounting modes accepted by POST /scan
+ACCOUNTING_APPARENT = 'apparent'  # Sum of st_size (default)
+ACCOUNTING_DISK = 'disk'          # du-style: hardlinks counted once, allocated bytes from st_blocks
+ACCOUNTING_MODES = (ACCOUNTING_APPARENT, ACCOUNTING_DISK)
+INODE_BUFFER_LIMIT = 65536        # Inodes buffered in a plain set before being packed into a sorted run
+
+SSE_SUBSCRIBER_QUEUE_LIMIT = 256  # Pending messages per SSE client before old progress is dropped
+SSE_KEEPALIVE_SECONDS = 15.0      # Idle interval before a keep-alive comment is sent
+SSE_END_STREAM = "event: end_stream\n"
+
+# Scan modes accepted by POST /scan
+SCAN_MODE_STANDARD = 'standard'
+SCAN_MODE_PROGRESSIVE = 'progressive'   # Quick breadth-first estimate first, then the exact walk
+SCAN_MODES = (SCAN_MODE_STANDARD, SCAN_MODE_PROGRESSIVE)
+ESTIMATE_TIME_BUDGET_SECONDS = 3.0      # Wall-clock budget for the sampling phase
+
+# Text listing export styles (see iter_tree_text)
+LISTING_STYLE_TREE = 'tree'         # Indented hierarchy, like `tree`
+LISTING_STYLE_LISTING = 'listing'   # DIRECTORIES/FILES sections, like the directory_listing_*.txt files
+LISTING_STYLES = (LISTING_STYLE_TREE, LISTING_STYLE_LISTING)
+LISTING_SIZE_UNITS = ('human', 'bytes', 'none')
+
+# Front-end assets are served from an in-memory, precompressed cache
+FRONTEND_DIR = Path(__file__).resolve().parent.parent / '04_FRNT_-_Client-Side-Codebase'
+STATIC_CACHE_LIMIT_BYTES = 16 * 1024 * 1024   # Raw + compressed bytes kept in memory (LRU)
+STATIC_COMPRESS_MIN_BYTES = 256               # Smaller files are served uncompressed
+STATIC_COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+SSE_GZIP_MIN_DEPTH = 3  # Scans this deep (or unlimited, or batch) get a gzip-compressed SSE stream
         
 # --- Flask App Setup ---
 # Update template and static folder paths to use the new structure
@@ -97,15 +162,839 @@ def validate_path(path_str: str, check_is_dir: bool = False, is_output_file_path
         return None, f"Invalid path: {path_str}. Error: {e}"
 
 
+# --- Per-Scan Error Aggregation ---
+class ScanErrorLog:
+    """Bounded, grouped record of the errors hit during one scan.
+
+    Errors are grouped by (errno, path prefix) where the prefix is the first
+    ERROR_PREFIX_DEPTH components below the scan root (or whichever of a batch
+    scan's roots contains the path). Each group keeps a count
+    and up to ERROR_SAMPLE_LIMIT sample paths; once ERROR_GROUP_LIMIT groups
+    exist, further new groups are only counted as overflow.
+    """
+
+    def __init__(self, root_path: Union[Path, List[Path]]):
+        self.root_paths = [root_path] if isinstance(root_path, Path) else list(root_path)
+        self.groups: Dict[Tuple[Optional[int], str], Dict[str, Any]] = {}
+        self.total = 0
+        self.overflow = 0
+        self._lock = threading.Lock()
+
+    def _prefix_for(self, path: Path) -> str:
+        for root_path in self.root_paths:
+            try:
+                parts = path.relative_to(root_path).parts
+            except ValueError:
+                continue
+            return str(root_path.joinpath(*parts[:ERROR_PREFIX_DEPTH]))
+        return str(path)
+
+    def record(self, path: Path, exc: BaseException, context: str) -> None:
+        """Counts one error; never logs, so it stays cheap inside the walk."""
+        err_no = getattr(exc, 'errno', None)
+        key = (err_no, self._prefix_for(path))
+        with self._lock:
+            self.total += 1
+            group = self.groups.get(key)
+            if group is None:
+                if len(self.groups) >= ERROR_GROUP_LIMIT:
+                    self.overflow += 1
+                    return
+                group = {
+                    "errno": err_no,
+                    "error_name": errno.errorcode.get(err_no, type(exc).__name__) if err_no else type(exc).__name__,
+                    "path_prefix": key[1],
+                    "context": context,
+                    "count": 0,
+                    "samples": [],
+                }
+                self.groups[key] = group
+            group["count"] += 1
+            if len(group["samples"]) < ERROR_SAMPLE_LIMIT:
+                group["samples"].append({"path": str(path), "message": str(exc)})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serialisable view, largest groups first."""
+        with self._lock:
+            groups = sorted(self.groups.values(), key=lambda g: g["count"], reverse=True)
+            return {
+                "total": self.total,
+                "overflow": self.overflow,
+                "groups": [dict(g, samples=list(g["samples"])) for g in groups],
+            }
+
+    def summary_line(self) -> str:
+        """One-line summary for the log at the end of a scan."""
+        with self._lock:
+            top = sorted(self.groups.values(), key=lambda g: g["count"], reverse=True)[:3]
+            top_text = ", ".join(f"{g['error_name']} x{g['count']} under '{g['path_prefix']}'" for g in top)
+            return (f"{self.total} errors in {len(self.groups)} groups"
+                    f"{f' (+{self.overflow} ungrouped)' if self.overflow else ''}"
+                    f"{f'; top: {top_text}' if top_text else ''}")
+
+
+# --- Scan Snapshot Persistence ---
+# Snapshot file layout (little-endian):
+#   header   : magic, version, metadata length, node count, node table offset, string table offset
+#   metadata : UTF-8 JSON (scan_id, root path, error summary, ...)
+#   nodes    : fixed-size records in breadth-first order, so each folder's children
+#              are one contiguous run [first_child, first_child + child_count)
+#   strings  : UTF-8 blob referenced by (offset, length) for names and by offset
+#              (u32 length prefix) for warning/error/segment text
+# The node table is read straight from an mmap, so browsing a stored scan only
+# touches the records it visits. A node's segment reference names the file a
+# spilled subtree (memory-bounded scan) was written to; disk_size holds the
+# allocated bytes under disk usage accounting.
+SNAPSHOT_MAGIC = b'SCANSNAP'
+SNAPSHOT_VERSION = 3
+_SNAP_HEADER = struct.Struct('<8sHHIQQQ')
+# type, flags, name_off, name_len, first_child, child_count, warning_ref, error_ref, segment_ref, size, disk_size
+_SNAP_NODE = struct.Struct('<BBxxIIIIIIIQQ')
+_SNAP_NO_STRING = 0xFFFFFFFF
+_SNAP_TYPES = ('folder', 'file', 'unknown')
+_SNAP_TYPE_CODES = {name: code for code, name in enumerate(_SNAP_TYPES)}
+_STUB_KEYS = ('segment', 'file_count', 'folder_count')  # Extra keys carried by spilled-subtree stubs
+_SNAP_FLAG_HARDLINK_DUPLICATE = 0x01
+_SNAP_FLAG_SPARSE = 0x02
+_SNAP_FLAG_DISK_SIZE = 0x04   # disk_size column is meaningful for this node
+_SNAP_FLAG_ROOTED = 0x08      # Name slot holds the node's full path (batch-scan roots)
+
+
+def write_scan_snapshot(snapshot_path: Path, tree: Dict[str, Any], metadata: Dict[str, Any]) -> None:
+    """Serialises a scan result tree to the binary snapshot format (atomic write)."""
+    strings = bytearray()
+    name_refs: Dict[str, Tuple[int, int]] = {}  # Names repeat a lot (index.html, .git, ...), store once
+
+    def add_name(text: str) -> Tuple[int, int]:
+        ref = name_refs.get(text)
+        if ref is None:
+            encoded = text.encode('utf-8', 'surrogateescape')
+            ref = (len(strings), len(encoded))
+            strings.extend(encoded)
+            name_refs[text] = ref
+        return ref
+
+    def add_message(text: Optional[str]) -> int:
+        if not text:
+            return _SNAP_NO_STRING
+        encoded = text.encode('utf-8', 'surrogateescape')
+        offset = len(strings)
+        strings.extend(struct.pack('<I', len(encoded)))
+        strings.extend(encoded)
+        return offset
+
+    nodes = bytearray()
+    order = [tree]
+    rooted = [False]  # Parallel to order: path is not parent path + name
+    position = 0
+    while position < len(order):
+        node = order[position]
+        is_rooted = rooted[position]
+        position += 1
+        children = node.get("children") or []
+        name_off, name_len = add_name(node.get("path", "") if is_rooted else node.get("name", ""))
+        flags = ((_SNAP_FLAG_HARDLINK_DUPLICATE if node.get("hardlink_duplicate") else 0)
+                 | (_SNAP_FLAG_SPARSE if node.get("sparse") else 0)
+                 | (_SNAP_FLAG_DISK_SIZE if "disk_size" in node else 0)
+                 | (_SNAP_FLAG_ROOTED if is_rooted else 0))
+        nodes.extend(_SNAP_NODE.pack(
+            _SNAP_TYPE_CODES.get(node.get("type"), _SNAP_TYPE_CODES['unknown']),
+            flags,
+            name_off, name_len,
+            len(order), len(children),
+            add_message(node.get("warning")),
+            add_message(node.get("error")),
+            add_message(node.get("segment")),
+            node.get("size", 0) or 0,
+            node.get("disk_size", 0) or 0,
+        ))
+        order.extend(children)
+        parent_path = node.get("path", "")
+        rooted.extend(child.get("path") != os.path.join(parent_path, child.get("name", "")) for child in children)
+
+    meta_bytes = json.dumps(dict(metadata, root_path=tree.get("path", "")), ensure_ascii=False).encode('utf-8')
+    nodes_offset = _SNAP_HEADER.size + len(meta_bytes)
+    strings_offset = nodes_offset + len(nodes)
+
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = snapshot_path.with_suffix(snapshot_path.suffix + '.tmp')
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(_SNAP_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(meta_bytes),
+                                      len(order), nodes_offset, strings_offset))
+            f.write(meta_bytes)
+            f.write(nodes)
+            f.write(strings)
+        os.replace(temp_path, snapshot_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)  # Don't leave a partial file behind (disk full, ...)
+        raise
+
+
+def read_snapshot_metadata(snapshot_path: Path) -> Dict[str, Any]:
+    """Reads only the header and metadata of a snapshot (no mmap, no node table)."""
+    with open(snapshot_path, 'rb') as f:
+        magic, version, _, meta_len, node_count, _, _ = _SNAP_HEADER.unpack(f.read(_SNAP_HEADER.size))
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"Not a supported scan snapshot: {snapshot_path}")
+        return dict(json.loads(f.read(meta_len).decode('utf-8')), node_count=node_count)
+
+
+class ScanSnapshot:
+    """Read-only, memory-mapped view over one snapshot (or segment) file.
+
+    The mmap is released when the object is garbage collected, so callers can
+    keep using a snapshot that an LRU has already dropped.
+    """
+
+    def __init__(self, snapshot_path: Path):
+        self.path = snapshot_path
+        with open(snapshot_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, meta_len, self.node_count, self._nodes_offset, self._strings_offset = \
+            _SNAP_HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self._map.close()
+            raise ValueError(f"Not a supported scan snapshot: {snapshot_path}")
+        self.metadata = json.loads(self._map[_SNAP_HEADER.size:_SNAP_HEADER.size + meta_len].decode('utf-8'))
+        self.root_path = self.metadata.get("root_path", "")
+
+    def record(self, index: int) -> Tuple:
+        """(type, flags, name_off, name_len, first_child, child_count, warning_ref, error_ref, segment_ref, size, disk_size)"""
+        return _SNAP_NODE.unpack_from(self._map, self._nodes_offset + index * _SNAP_NODE.size)
+
+    def name(self, index: int) -> str:
+        _, _, offset, length = self.record(index)[:4]
+        start = self._strings_offset + offset
+        return self._map[start:start + length].decode('utf-8', 'surrogateescape')
+
+    def message(self, offset: int) -> Optional[str]:
+        if offset == _SNAP_NO_STRING:
+            return None
+        start = self._strings_offset + offset
+        (length,) = struct.unpack_from('<I', self._map, start)
+        return self._map[start + 4:start + 4 + length].decode('utf-8', 'surrogateescape')
+
+
+class SnapshotStore:
+    """Directory of persisted scans, indexed lazily by scan_id.
+
+    Startup only lists file names; a snapshot is opened (and memory-mapped)
+    on first use and at most SNAPSHOT_OPEN_LIMIT stay cached at a time.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._paths: Dict[str, Path] = {}
+        self._open: "OrderedDict[str, ScanSnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def index(self) -> int:
+        """Records the snapshot files present on disk without reading them."""
+        with self._lock:
+            if self.directory.is_dir():
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith(SNAPSHOT_SUFFIX):
+                        self._paths[entry.name[:-len(SNAPSHOT_SUFFIX)]] = Path(entry.path)
+            return len(self._paths)
+
+    def save(self, scan_id: str, tree: Dict[str, Any], metadata: Dict[str, Any]) -> Path:
+        snapshot_path = self.directory / f"{scan_id}{SNAPSHOT_SUFFIX}"
+        write_scan_snapshot(snapshot_path, tree, metadata)
+        with self._lock:
+            self._open.pop(scan_id, None)
+            self._paths[scan_id] = snapshot_path
+        return snapshot_path
+
+    def scan_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._paths)
+
+    def metadata(self, scan_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            snapshot_path = self._paths.get(scan_id)
+        if snapshot_path is None:
+            return None
+        try:
+            return read_snapshot_metadata(snapshot_path)
+        except (OSError, ValueError) as e:
+            app.logger.warning(f"Could not read snapshot metadata '{snapshot_path}': {e}")
+            return None
+
+    def get(self, scan_id: str) -> Optional[ScanSnapshot]:
+        with self._lock:
+            snapshot = self._open.get(scan_id)
+            if snapshot is not None:
+                self._open.move_to_end(scan_id)
+                return snapshot
+            snapshot_path = self._paths.get(scan_id)
+            if snapshot_path is None:
+                return None
+            try:
+                snapshot = ScanSnapshot(snapshot_path)
+            except (OSError, ValueError) as e:
+                app.logger.warning(f"Could not open snapshot '{snapshot_path}': {e}")
+                return None
+            self._open[scan_id] = snapshot
+            while len(self._open) > SNAPSHOT_OPEN_LIMIT:
+                self._open.popitem(last=False)
+            return snapshot
+
+
+def prune_orphan_segments(store: SnapshotStore) -> int:
+    """Deletes segment folders that no stored snapshot refers to; returns how many.
+
+    A scan's segments live in SEGMENT_DIR/<scan_id> for as long as its
+    snapshot does. Folders left by scans that were never persisted (server
+    stopped mid-scan, snapshot write failed) or whose snapshot was deleted
+    are removed, unless touched within SEGMENT_ORPHAN_GRACE_SECONDS, as
+    another server process may still be scanning into them.
+    """
+    if not SEGMENT_DIR.is_dir():
+        return 0
+    stored = set(store.scan_ids())
+    cutoff = time.time() - SEGMENT_ORPHAN_GRACE_SECONDS
+    removed = 0
+    for entry in os.scandir(SEGMENT_DIR):
+        if entry.is_dir() and entry.name not in stored and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+snapshot_store = SnapshotStore(SNAPSHOT_DIR)
+logging.getLogger(__name__).info(f"Indexed {snapshot_store.index()} stored scan snapshot(s) in {SNAPSHOT_DIR}")
+logging.getLogger(__name__).info(f"Removed {prune_orphan_segments(snapshot_store)} orphaned segment folder(s) from {SEGMENT_DIR}")
+
+_open_segments: "OrderedDict[str, ScanSnapshot]" = OrderedDict()
+_open_segments_lock = threading.Lock()
+
+
+def open_segment(segment_ref: str) -> ScanSnapshot:
+    """Opens a spilled-subtree segment (path relative to APP_DATA_DIR), LRU cached.
+
+    Stubs can come back from the browser (exported scan_data), so the
+    reference must name a segment file inside SEGMENT_DIR; anything else
+    raises ValueError.
+    """
+    segment_path = (APP_DATA_DIR / segment_ref).resolve()
+    if SEGMENT_DIR.resolve() not in segment_path.parents or segment_path.suffix != SNAPSHOT_SUFFIX:
+        raise ValueError(f"Not a scan segment reference: {segment_ref}")
+    with _open_segments_lock:
+        segment = _open_segments.get(segment_ref)
+        if segment is None:
+            segment = ScanSnapshot(segment_path)
+            _open_segments[segment_ref] = segment
+            while len(_open_segments) > SEGMENT_OPEN_LIMIT:
+                _open_segments.popitem(last=False)
+        else:
+            _open_segments.move_to_end(segment_ref)
+        return segment
+
+
+# --- Scan Tree Access ---
+# A node reference is either an in-memory result dict or a (snapshot, index, path)
+# triple. Spilled subtrees (dict stubs or snapshot records with a segment) are
+# followed into their segment file transparently, only when actually visited.
+class SnapshotNodeRef(NamedTuple):
+    snapshot: ScanSnapshot
+    index: int
+    path: str
+
+
+def _segment_root(segment_ref: str) -> SnapshotNodeRef:
+    segment = open_segment(segment_ref)
+    return SnapshotNodeRef(segment, 0, segment.root_path)
+
+
+def node_fields(ref: Union[Dict[str, Any], SnapshotNodeRef]) -> Dict[str, Any]:
+    """A node's own fields (no children), identical for live, stored and spilled nodes."""
+    if isinstance(ref, dict):
+        return {key: value for key, value in ref.items() if key != "children" and key not in _STUB_KEYS}
+    node_type, flags, _, _, _, _, warning_ref, error_ref, _, size, disk_size = ref.snapshot.record(ref.index)
+    name = ref.snapshot.name(ref.index)
+    if flags & _SNAP_FLAG_ROOTED:
+        name = os.path.basename(name.rstrip('/\\')) or name
+    fields: Dict[str, Any] = {"name": name, "type": _SNAP_TYPES[node_type], "path": ref.path, "size": size}
+    if flags & _SNAP_FLAG_DISK_SIZE:
+        fields["disk_size"] = disk_size
+    if flags & _SNAP_FLAG_HARDLINK_DUPLICATE:
+        fields["hardlink_duplicate"] = True
+    if flags & _SNAP_FLAG_SPARSE:
+        fields["sparse"] = True
+    error = ref.snapshot.message(error_ref)
+    if node_type == _SNAP_TYPE_CODES['folder']:
+        fields["warning"] = ref.snapshot.message(warning_ref)
+        fields["error"] = error
+    elif error is not None:
+        fields["error"] = error
+    return fields
+
+
+def node_children(ref: Union[Dict[str, Any], SnapshotNodeRef]) -> Iterator[Union[Dict[str, Any], SnapshotNodeRef]]:
+    """Iterates a node's children, reading spilled segments back on demand."""
+    if isinstance(ref, dict):
+        if ref.get("segment"):
+            yield from node_children(_segment_root(ref["segment"]))
+        else:
+            yield from ref.get("children") or []
+        return
+    _, _, _, _, first_child, child_count, _, _, segment_ref, _, _ = ref.snapshot.record(ref.index)
+    if segment_ref != _SNAP_NO_STRING:
+        yield from node_children(_segment_root(ref.snapshot.message(segment_ref)))
+        return
+    for child in range(first_child, first_child + child_count):
+        name = ref.snapshot.name(child)
+        rooted = ref.snapshot.record(child)[1] & _SNAP_FLAG_ROOTED
+        yield SnapshotNodeRef(ref.snapshot, child, name if rooted else os.path.join(ref.path, name))
+
+
+def find_scan_node(root: Union[Dict[str, Any], SnapshotNodeRef], path_str: Optional[str]) -> Optional[Union[Dict[str, Any], SnapshotNodeRef]]:
+    """Finds a node by path below `root`, or None.
+
+    Descends into whichever child's path is the target or one of its
+    ancestors, so batch scans (whose roots are unrelated paths) work too.
+    """
+    if not path_str:
+        return root
+    target = os.path.normcase(os.path.normpath(path_str))
+    node = root
+    while os.path.normcase(node_fields(node).get("path", "")) != target:
+        for child in node_children(node):
+            child_path = os.path.normcase(node_fields(child).get("path", ""))
+            if child_path and (target == child_path or target.startswith(child_path.rstrip('/\\') + os.sep)):
+                node = child
+                break
+        else:
+            return None
+    return node
+
+
+def build_tree_dict(ref: Union[Dict[str, Any], SnapshotNodeRef], max_depth: Optional[int] = None) -> Dict[str, Any]:
+    """Scan-result dict for a node, `max_depth` levels deep (None = everything)."""
+    node = node_fields(ref)
+    if node.get("type") != "folder":
+        return node
+    if max_depth is not None and max_depth <= 0:
+        node["children"] = []
+        node["child_count"] = sum(1 for _ in node_children(ref))
+    else:
+        next_depth = None if max_depth is None else max_depth - 1
+        node["children"] = [build_tree_dict(child, next_depth) for child in node_children(ref)]
+    return node
+
+
+def iter_tree_json(ref: Union[Dict[str, Any], SnapshotNodeRef], level: int = 0) -> Iterator[str]:
+    """Streams a node as indented JSON (same layout as json.dump(indent=4)) without building it in memory."""
+    indent = '    '
+    inner = indent * (level + 1)
+    fields = node_fields(ref)
+    yield '{\n' + ',\n'.join(f'{inner}{json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}'
+                             for key, value in fields.items())
+    if fields.get("type") == "folder":
+        yield f',\n{inner}"children": ['
+        has_children = False
+        for child in node_children(ref):
+            yield (',\n' if has_children else '\n') + inner + indent
+            yield from iter_tree_json(child, level + 2)
+            has_children = True
+        yield f'\n{inner}]' if has_children else ']'
+    yield f'\n{indent * level}}}'
+
+
+def get_scan_node(scan_id: str, path_str: Optional[str] = None) -> Tuple[Optional[Union[Dict[str, Any], SnapshotNodeRef]], Optional[str]]:
+    """Returns (node reference, error) for a scan held in memory or persisted as a snapshot."""
+    state = scan_states.get(scan_id)
+    if state is not None and state.get('result') is not None:
+        root = state['result']
+    elif state is not None and state.get('status') in ('starting', 'running'):
+        return None, "Scan is still running."
+    else:
+        snapshot = snapshot_store.get(scan_id)
+        if snapshot is None:
+            return None, "Invalid or unknown scan ID"
+        root = SnapshotNodeRef(snapshot, 0, snapshot.root_path)
+    node = find_scan_node(root, path_str)
+    if node is None:
+        return None, f"Path not found in scan: {path_str}"
+    return node, None
+
+
+def get_scan_tree(scan_id: str, path_str: Optional[str] = None, max_depth: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Returns (node dict, error) for a scan held in memory or persisted as a snapshot."""
+    node, error = get_scan_node(scan_id, path_str)
+    if error:
+        return None, error
+    return build_tree_dict(node, max_depth), None
+
+
+# --- Text Listing Export ---
+LISTING_RULE = '=' * 80
+LISTING_SECTION_RULE = '-' * 40
+
+
+class ListingFilter(NamedTuple):
+    """Which nodes a text listing shows. Name patterns are fnmatch-style globs."""
+    include: Tuple[str, ...] = ()   # Files must match one of these (folders are always shown)
+    exclude: Tuple[str, ...] = ()   # Files and folders matching any of these are skipped (folders pruned)
+    min_size: int = 0               # Files smaller than this are skipped
+    max_depth: Optional[int] = None # Levels below the starting node (None = everything)
+    dirs_only: bool = False
+
+    def shows(self, fields: Dict[str, Any]) -> bool:
+        name = fields.get("name", "")
+        if any(fnmatch.fnmatch(name, pattern) for pattern in self.exclude):
+            return False
+        if fields.get("type") == "folder":
+            return True
+        if self.dirs_only or fields.get("size", 0) < self.min_size:
+            return False
+        return not self.include or any(fnmatch.fnmatch(name, pattern) for pattern in self.include)
+
+
+def _listing_size(fields: Dict[str, Any], sizes: str) -> str:
+    """Size suffix for a listing line: 'bytes' (1,195 bytes), 'human' (1.2 kB) or 'none'."""
+    if sizes == 'none':
+        return ''
+    size = fields.get("disk_size", fields.get("size", 0))
+    return f" ({size:,} bytes)" if sizes == 'bytes' else f" ({format_size(size)})"
+
+
+def iter_tree_text(ref: Union[Dict[str, Any], SnapshotNodeRef], style: str = LISTING_STYLE_TREE,
+                   filters: ListingFilter = ListingFilter(), sizes: str = 'human',
+                   generated_at: Optional[float] = None) -> Iterator[str]:
+    """Streams a node as a plain-text listing, one line at a time.
+
+    'tree' draws the hierarchy like `tree`. 'listing' writes the
+    DIRECTORIES/FILES sections of the repo's directory_listing_*.txt files,
+    one block per folder when more than one level is requested. Nodes are
+    read lazily (spilled segments included) and the summary is counted on
+    the way, so the text is never built up in memory.
+    """
+    fields = node_fields(ref)
+    counts = {"folder": 0, "file": 0}
+    yield f"Directory Listing of: {fields.get('path') or fields.get('name', '')}\n"
+    yield f"Generated on: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(generated_at))}\n"
+    yield LISTING_RULE + '\n'
+
+    def visible_children(node_ref) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        for child in node_children(node_ref):
+            child_fields = node_fields(child)
+            if filters.shows(child_fields):
+                yield child, child_fields
+
+    def tree_lines(node_ref, prefix: str, depth: int) -> Iterator[str]:
+        if filters.max_depth is not None and depth >= filters.max_depth:
+            return
+        children = visible_children(node_ref)
+        current = next(children, None)
+        while current is not None:
+            upcoming = next(children, None)  # One-item lookahead decides the branch glyph
+            child, child_fields = current
+            is_folder = child_fields.get("type") == "folder"
+            counts["folder" if is_folder else "file"] += 1
+            branch, extension = ('└── ', '    ') if upcoming is None else ('├── ', '│   ')
+            yield f"{prefix}{branch}{child_fields.get('name', '')}{'/' if is_folder else ''}{_listing_size(child_fields, sizes)}\n"
+            if is_folder:
+                yield from tree_lines(child, prefix + extension, depth + 1)
+            current = upcoming
+
+    def listing_blocks(node_ref, folder_fields: Dict[str, Any], depth: int) -> Iterator[str]:
+        folders, files = [], []  # One folder's direct children only
+        for child, child_fields in visible_children(node_ref):
+            (folders if child_fields.get("type") == "folder" else files).append((child, child_fields))
+        counts["folder"] += len(folders)
+        counts["file"] += len(files)
+        if depth > 0:
+            yield f"\n{LISTING_RULE}\nDirectory: {folder_fields.get('path', '')}\n{LISTING_RULE}\n"
+        yield f"\nDIRECTORIES ({len(folders)})\n{LISTING_SECTION_RULE}\n"
+        for _, child_fields in folders:
+            yield f"{child_fields.get('name', '')}/{_listing_size(child_fields, sizes)}\n"
+        if not filters.dirs_only:
+            yield f"\nFILES ({len(files)})\n{LISTING_SECTION_RULE}\n"
+            for _, child_fields in files:
+                yield f"{child_fields.get('name', '')}{_listing_size(child_fields, sizes)}\n"
+        if filters.max_depth is None or depth + 1 < filters.max_depth:
+            for child, child_fields in folders:
+                yield from listing_blocks(child, child_fields, depth + 1)
+
+    if style == LISTING_STYLE_TREE:
+        yield f"\n{fields.get('name', '')}/{_listing_size(fields, sizes)}\n"
+        yield from tree_lines(ref, '', 0)
+    else:
+        yield from listing_blocks(ref, fields, 0)
+    yield f"\n{LISTING_RULE}\nSUMMARY: {counts['folder']} directories, {counts['file']} files\n"
+
+
+def parse_listing_options(options: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Validates listing options (from JSON, a query string or the CLI) into iter_tree_text kwargs."""
+    style = options.get('format') or LISTING_STYLE_TREE
+    if style not in LISTING_STYLES:
+        return None, f"Format must be one of: {', '.join(LISTING_STYLES)}."
+    sizes = options.get('sizes') or ('bytes' if style == LISTING_STYLE_LISTING else 'human')
+    if sizes not in LISTING_SIZE_UNITS:
+        return None, f"Sizes must be one of: {', '.join(LISTING_SIZE_UNITS)}."
+
+    def patterns(value) -> Tuple[str, ...]:
+        if isinstance(value, str):
+            value = value.split(',')
+        return tuple(pattern.strip() for pattern in value or () if pattern and pattern.strip())
+
+    try:
+        min_size = int(options.get('min_size') or 0)
+        depth_str = options.get('depth')
+        if depth_str in (None, ''):
+            # The listing style defaults to one level, like the existing directory_listing files
+            max_depth = 1 if style == LISTING_STYLE_LISTING else None
+        else:
+            max_depth = int(depth_str)
+    except (TypeError, ValueError):
+        return None, "min_size and depth must be integers."
+    if min_size < 0 or (max_depth is not None and max_depth < 1):
+        return None, "min_size must be non-negative and depth at least 1."
+    dirs_only = options.get('dirs_only') in (True, 'true', '1', 1)
+    filters = ListingFilter(patterns(options.get('include')), patterns(options.get('exclude')),
+                            min_size, max_depth, dirs_only)
+    return {"style": style, "filters": filters, "sizes": sizes}, None
+
+
+# --- Disk Usage Accounting ---
+class CompactInodeSet:
+    """Set of (st_dev, st_ino) pairs that stays small at tens of millions of entries.
+
+    New inodes land in a plain set; every INODE_BUFFER_LIMIT entries the buffer
+    is packed into a sorted array('Q') run (8 bytes per inode). Runs are merged
+    whenever the newest is at least as big as the one before it, so a device
+    holds O(log n) runs and a lookup is one set probe plus a bisect per run.
+    """
+
+    def __init__(self):
+        self._devices: Dict[int, Tuple[set, List[array]]] = {}
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, st_dev: int, st_ino: int) -> bool:
+        """Adds an inode; returns False if it had already been seen."""
+        with self._lock:
+            buffer, runs = self._devices.setdefault(st_dev, (set(), []))
+            if st_ino in buffer:
+                return False
+            for run in runs:
+                position = bisect.bisect_left(run, st_ino)
+                if position < len(run) and run[position] == st_ino:
+                    return False
+            buffer.add(st_ino)
+            self.count += 1
+            if len(buffer) >= INODE_BUFFER_LIMIT:
+                runs.append(array('Q', sorted(buffer)))
+                buffer.clear()
+                while len(runs) > 1 and len(runs[-1]) >= len(runs[-2]):
+                    newest = runs.pop()
+                    runs[-1] = array('Q', heapq.merge(runs[-1], newest))
+            return True
+
+
+class DiskUsageAccounting:
+    """du-style size accounting for one scan.
+
+    Files with more than one link are counted once per (st_dev, st_ino); later
+    sightings are flagged `hardlink_duplicate` and add nothing to folder totals.
+    Allocated bytes come from st_blocks (512-byte units), falling back to
+    st_size where the platform has no st_blocks (Windows). Directory entries
+    count towards both totals, as they do in du.
+    """
+
+    def __init__(self):
+        self.inodes = CompactInodeSet()
+        self.hardlink_duplicates = 0
+        self.sparse_files = 0
+        self._lock = threading.Lock()  # Batch scans share one accounting across device threads
+
+    @staticmethod
+    def allocated(stat_result: os.stat_result) -> int:
+        blocks = getattr(stat_result, 'st_blocks', None)
+        return stat_result.st_size if blocks is None else blocks * 512
+
+    def account_file(self, file_data: Dict[str, Any], stat_result: os.stat_result) -> Tuple[int, int]:
+        """Annotates a file node; returns the (apparent, allocated) bytes it adds to its folder."""
+        disk_size = self.allocated(stat_result)
+        file_data["disk_size"] = disk_size
+        if disk_size < stat_result.st_size:
+            file_data["sparse"] = True
+            with self._lock:
+                self.sparse_files += 1
+        if stat_result.st_nlink > 1 and not self.inodes.add(stat_result.st_dev, stat_result.st_ino):
+            file_data["hardlink_duplicate"] = True
+            with self._lock:
+                self.hardlink_duplicates += 1
+            return 0, 0
+        return stat_result.st_size, disk_size
+
+    def summary(self) -> Dict[str, int]:
+        return {"hardlink_duplicates": self.hardlink_duplicates, "sparse_files": self.sparse_files,
+                "tracked_inodes": self.inodes.count}
+
+
+# --- Memory-Bounded Scanning ---
+class SubtreeSpiller:
+    """Keeps a scan's in-memory tree under a node budget.
+
+    Called as each folder finishes; once the scan holds more live nodes than
+    the budget allows, any finished subtree of at least SPILL_MIN_SUBTREE_NODES
+    nodes is written to a segment file and replaced by a small stub holding
+    its size, file/folder counts and segment reference. If the segment
+    cannot be written (disk full, permissions) the subtree simply stays in
+    memory.
+    """
+
+    def __init__(self, scan_id: str, budget_bytes: int):
+        self.directory = SEGMENT_DIR / scan_id
+        self.node_budget = max(budget_bytes // SPILL_NODE_BYTES, SPILL_MIN_SUBTREE_NODES)
+        self.live_nodes = 0
+        self.segment_count = 0  # Segments written
+        self._next_segment = 0  # Segment file numbers handed out, including failed writes
+        self._subtrees: Dict[int, Tuple[int, int, int]] = {}  # id(folder dict) -> (live nodes, files, folders)
+        self._lock = threading.Lock()  # Batch scans share one spiller across device threads
+
+    def finish(self, folder_data: Dict[str, Any], spill_allowed: bool = True) -> Dict[str, Any]:
+        # The lock only covers the bookkeeping; the segment file is written outside it so
+        # batch scans' device threads don't queue up behind each other's disk writes.
+        # The finished subtree belongs to the calling thread alone until it is returned.
+        with self._lock:
+            live, files, folders = self._count(folder_data)
+            if not (spill_allowed and self.live_nodes > self.node_budget and live >= SPILL_MIN_SUBTREE_NODES):
+                self._subtrees[id(folder_data)] = (live, files, folders)
+                return folder_data
+            segment_path = self.directory / f"{self._next_segment:06d}{SNAPSHOT_SUFFIX}"
+            self._next_segment += 1
+
+        try:
+            write_scan_snapshot(segment_path, folder_data, {"file_count": files, "folder_count": folders})
+        except OSError as e:
+            app.logger.warning(f"Could not spill '{folder_data['path']}' to {segment_path}, keeping it in memory: {e}")
+            with self._lock:
+                self._subtrees[id(folder_data)] = (live, files, folders)
+            return folder_data
+        stub = {
+            "name": folder_data["name"], "type": "folder", "path": folder_data["path"],
+            "size": folder_data["size"], "children": [],
+            "warning": folder_data.get("warning"), "error": folder_data.get("error"),
+            "segment": segment_path.relative_to(APP_DATA_DIR).as_posix(),
+            "file_count": files, "folder_count": folders,
+        }
+        if "disk_size" in folder_data:
+            stub["disk_size"] = folder_data["disk_size"]
+        with self._lock:
+            self.segment_count += 1
+            self.live_nodes -= live - 1
+            self._subtrees[id(stub)] = (1, files, folders)
+        return stub
+
+    def _count(self, folder_data: Dict[str, Any]) -> Tuple[int, int, int]:
+        """Adds a finished folder to the live-node count; returns its subtree's (live nodes, files, folders)."""
+        live, files, folders = 1, 0, 1
+        for child in folder_data["children"]:
+            if child.get("type") == "folder":
+                child_live, child_files, child_folders = self._subtrees.pop(id(child), (1, 0, 1))
+                live, files, folders = live + child_live, files + child_files, folders + child_folders
+            else:
+                self.live_nodes += 1
+                live += 1
+                files += child.get("type") == "file"
+        self.live_nodes += 1
+        return live, files, folders
+
+
+# --- SSE Event Fan-Out ---
+class ScanEventBroker:
+    """Fans out one scan's SSE messages to per-subscriber bounded queues.
+
+    Progress messages are droppable: when a subscriber's queue is full the
+    oldest pending progress message is discarded. Terminal messages (complete,
+    error, end_stream) are never dropped and are replayed to late subscribers
+    together with the latest progress message, so nothing grows with scan size
+    and a stalled client never holds up the scan or other clients.
+    """
+
+    def __init__(self, queue_limit: int = SSE_SUBSCRIBER_QUEUE_LIMIT):
+        self.queue_limit = queue_limit
+        self.closed = False
+        self.dropped = 0
+        self._cond = threading.Condition()
+        self._subscribers: List[deque] = []
+        self._latest_progress: Optional[str] = None
+        self._terminal: List[str] = []
+
+    def _enqueue(self, queue: deque, message: str, terminal: bool) -> None:
+        if len(queue) >= self.queue_limit:
+            for position, (queued_terminal, _) in enumerate(queue):
+                if not queued_terminal:
+                    del queue[position]
+                    self.dropped += 1
+                    break
+            else:
+                if not terminal:
+                    self.dropped += 1
+                    return
+        queue.append((terminal, message))
+
+    def publish(self, message: str, terminal: bool = False) -> None:
+        with self._cond:
+            if terminal:
+                self._terminal.append(message)
+                if message.startswith(SSE_END_STREAM):
+                    self.closed = True
+            else:
+                self._latest_progress = message
+            for queue in self._subscribers:
+                self._enqueue(queue, message, terminal)
+            self._cond.notify_all()
+
+    def subscribe(self) -> deque:
+        with self._cond:
+            queue: deque = deque()
+            if self._latest_progress is not None and not self._terminal:
+                queue.append((False, self._latest_progress))
+            queue.extend((True, message) for message in self._terminal)
+            self._subscribers.append(queue)
+            return queue
+
+    def unsubscribe(self, queue: deque) -> None:
+        with self._cond:
+            # By identity: deques compare by value, and two idle subscribers are equal
+            self._subscribers = [subscriber for subscriber in self._subscribers if subscriber is not queue]
+
+    def get(self, queue: deque, timeout: float) -> List[str]:
+        """Drains a subscriber's queue, waiting up to `timeout` for something to arrive."""
+        with self._cond:
+            if not queue:
+                self._cond.wait_for(lambda: bool(queue), timeout=timeout)
+            messages = [message for _, message in queue]
+            queue.clear()
+            return messages
+
+
 # --- Background Scanning Logic (_scan_directory_recursive remains the same) ---
 def _scan_directory_recursive(
     current_path: Path,
     max_depth: Optional[int],
     current_depth: int,
     progress_callback: callable,
-    cancel_event: threading.Event
+    cancel_event: threading.Event,
+    error_log: Optional[ScanErrorLog] = None,
+    subtree_callback: Optional[callable] = None,
+    spiller: Optional[SubtreeSpiller] = None,
+    disk_usage: Optional[DiskUsageAccounting] = None
 ) -> Optional[Dict[str, Any]]:
-    """Recursive helper adapted for web backend. Now uses callback for progress."""
+    """Recursive helper adapted for web backend. Now uses callback for progress.
+
+    Per-entry errors are recorded into `error_log` (when given) rather than
+    logged one line at a time; the caller summarises them once per scan.
+    `subtree_callback` (top level only) is called with each top-level folder
+    as soon as its subtree is complete. With a `spiller`, finished subtrees
+    may come back as stubs whose contents live in a segment file. With
+    `disk_usage`, nodes also carry du-style `disk_size` (allocated bytes).
+    """
     if cancel_event.is_set(): return None
 
     try:
@@ -129,12 +1018,19 @@ def _scan_directory_recursive(
         "error": None, # Initialize error field
     }
     total_size = 0
+    total_disk_size = 0
     all_items = []
 
     try:
+        if disk_usage is not None:
+            # The directory's own entry counts too, as in du
+            dir_stat = os.lstat(current_path)
+            total_size += dir_stat.st_size
+            total_disk_size += disk_usage.allocated(dir_stat)
+
         # --- Check Read Permission on current_path before iterdir ---
         if not os.access(current_path, os.R_OK | os.X_OK): # Need read and execute(list) perm
-             raise PermissionError(f"Cannot access directory contents: {current_path}")
+             raise PermissionError(errno.EACCES, "Cannot access directory contents", str(current_path))
 
         # --- Get items and Check File Count ---
         scan_iterator = os.scandir(current_path) # Use scandir for potential efficiency
@@ -174,10 +1070,15 @@ def _scan_directory_recursive(
                             "size": file_size
                         }
                         folder_data["children"].append(file_data)
-                        total_size += file_size
+                        if disk_usage is not None:
+                            size_added, disk_added = disk_usage.account_file(file_data, stat_result)
+                            total_size += size_added
+                            total_disk_size += disk_added
+                        else:
+                            total_size += file_size
                     except (FileNotFoundError, PermissionError, OSError) as e:
                         # Handle cases where file disappears or permissions change after scandir
-                        app.logger.warning(f"Could not stat file '{entry.name}': {e}")
+                        if error_log: error_log.record(item_path, e, "stat")
                         folder_data["children"].append({
                            "name": entry.name, "type": "file", "path": str(item_path),
                            "error": f"Could not get size: {e}", "size": 0
@@ -186,18 +1087,22 @@ def _scan_directory_recursive(
                 elif entry.is_dir(follow_symlinks=False):
                     # Pass callback and cancel event down
                     sub_folder_data = _scan_directory_recursive(
-                        item_path, max_depth, current_depth + 1, progress_callback, cancel_event
+                        item_path, max_depth, current_depth + 1, progress_callback, cancel_event, error_log,
+                        spiller=spiller, disk_usage=disk_usage
                     )
                     if sub_folder_data:
                         folder_data["children"].append(sub_folder_data)
                         total_size += sub_folder_data.get("size", 0)
+                        total_disk_size += sub_folder_data.get("disk_size", 0)
+                        if subtree_callback:
+                            subtree_callback(sub_folder_data)
                 # Handle symlinks or other types if needed - currently ignored
                 # elif entry.is_symlink():
                 #     # ... handle symlink ...
 
             except OSError as e:
                  # Catch errors during is_file/is_dir calls if entry became invalid
-                 app.logger.warning(f"Error checking type of '{entry.name}': {e}")
+                 if error_log: error_log.record(item_path, e, "type-check")
                  folder_data["children"].append({
                     "name": entry.name, "type": "unknown", "path": str(item_path),
                     "error": f"Could not determine type: {e}", "size": 0
@@ -205,55 +1110,237 @@ def _scan_directory_recursive(
 
 
     except PermissionError as e:
-        app.logger.warning(f"Permission denied scanning directory '{current_path}': {e}")
+        if error_log: error_log.record(current_path, e, "list-directory")
         folder_data["error"] = f"Permission denied: {e}"
         # Can't proceed further into this dir, return what we have (name, type, error)
     except FileNotFoundError as e:
-        app.logger.warning(f"Directory not found during scan '{current_path}': {e}")
+        if error_log: error_log.record(current_path, e, "list-directory")
         folder_data["error"] = f"Directory disappeared during scan: {e}"
     except OSError as e: # Catch other OS-level errors during scandir/stat
-        app.logger.error(f"OS error scanning directory '{current_path}': {e}", exc_info=True)
+        if error_log: error_log.record(current_path, e, "list-directory")
         folder_data["error"] = f"OS error: {e}"
     except Exception as e:
+        # Not a filesystem condition but a bug: log it with its traceback rather than aggregating it
         app.logger.error(f"Unexpected error scanning directory '{current_path}': {e}", exc_info=True)
         folder_data["error"] = f"Unexpected error: {e}"
 
 
     folder_data["size"] = total_size
+    if disk_usage is not None:
+        folder_data["disk_size"] = total_disk_size
     # Sort children only if no error occurred during listing/processing
     if folder_data["error"] is None:
         folder_data["children"].sort(key=lambda x: (x.get("type", "file") != "folder", x.get("name", "").lower()))
 
+    if spiller is not None:
+        folder_data = spiller.finish(folder_data, spill_allowed=current_depth > 0)
+
     return folder_data
 
-# --- perform_scan_worker_sse remains largely the same, calling the updated _scan_directory_recursive ---
-def perform_scan_worker_sse(scan_id: str, target_path: Path, max_depth: Optional[int]):
-    """Worker function UPDATED for SSE list approach."""
+# --- Progressive Scan Estimates ---
+def count_tree_files(node: Dict[str, Any]) -> int:
+    """Number of files below a scanned node."""
+    if node.get("segment"):
+        return node["file_count"]
+    if node.get("type") != "folder":
+        return 1 if node.get("type") == "file" else 0
+    return sum(count_tree_files(child) for child in node.get("children") or [])
+
+
+def estimate_top_level_folders(
+    root_path: Path,
+    max_depth: Optional[int],
+    time_budget: float,
+    cancel_event: threading.Event
+) -> Dict[str, Any]:
+    """Breadth-first sample of every top-level folder within a time budget.
+
+    Folders are sampled round-robin (one directory listing per folder per
+    round) so all of them get a share of the budget. A folder whose walk
+    finishes inside the budget is exact; otherwise each still-pending
+    directory is assumed to hold as much as an average sampled directory.
+    Errors are ignored here - the exact walk records them.
+    """
+    deadline = time.monotonic() + time_budget
+    root_files = {"count": 0, "size": 0}
+    samplers = []
+    try:
+        with os.scandir(root_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        root_files["count"] += 1
+                        root_files["size"] += entry.stat(follow_symlinks=False).st_size
+                    elif entry.is_dir(follow_symlinks=False):
+                        samplers.append({"path": entry.path, "name": entry.name, "frontier": deque([(entry.path, 1)]),
+                                         "dirs": 0, "files": 0, "size": 0})
+                except OSError:
+                    continue
+    except OSError:
+        pass
+
+    active = list(samplers)
+    first_round = True  # Every folder gets at least one listing, however tight the budget
+    while active and (first_round or time.monotonic() < deadline) and not cancel_event.is_set():
+        first_round = False
+        for sampler in list(active):
+            dir_path, depth = sampler["frontier"].popleft()
+            sampler["dirs"] += 1
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_file(follow_symlinks=False):
+                                sampler["files"] += 1
+                                sampler["size"] += entry.stat(follow_symlinks=False).st_size
+                            elif entry.is_dir(follow_symlinks=False) and (max_depth is None or depth < max_depth):
+                                sampler["frontier"].append((entry.path, depth + 1))
+                        except OSError:
+                            continue
+            except OSError:
+                pass
+            if not sampler["frontier"]:
+                active.remove(sampler)
+
+    folders = []
+    for sampler in samplers:
+        pending = len(sampler["frontier"])
+        sampled = max(sampler["dirs"], 1)
+        folders.append({
+            "name": sampler["name"],
+            "path": sampler["path"],
+            "size": int(sampler["size"] + pending * sampler["size"] / sampled),
+            "file_count": int(sampler["files"] + pending * sampler["files"] / sampled),
+            "exact": pending == 0,
+            "sampled_dirs": sampler["dirs"],
+            "pending_dirs": pending,
+        })
+    return {"root_files": root_files, "folders": folders}
+
+
+def _estimate_event(estimate: Dict[str, Any], phase: str, root: Optional[str] = None) -> str:
+    folders = estimate["folders"]
+    message_data = {
+        "type": "estimate",
+        "phase": phase,
+        "total_size": estimate["root_files"]["size"] + sum(f["size"] for f in folders),
+        "total_files": estimate["root_files"]["count"] + sum(f["file_count"] for f in folders),
+        "exact_folders": sum(1 for f in folders if f["exact"]),
+        "root_files": estimate["root_files"],
+        "folders": folders,
+    }
+    if root is not None:
+        message_data["root"] = root  # Batch scans: which root this estimate belongs to
+    return f"data: {json.dumps(message_data)}\n\n"
+
+
+# --- Scan Worker Helpers (shared by single-root and batch workers) ---
+def _publish_scan_outcome(scan_id: str, is_error: bool, data: Union[str, Dict]):
+    """Publishes the terminal complete/error message followed by end_stream."""
     global scan_states
+    if scan_id in scan_states and 'events' in scan_states[scan_id]:
+        message_data = {}
+        if is_error:
+            message_data = {'type': 'error', 'message': str(data)}
+            app.logger.info(f"Scan {scan_id} reporting error: {str(data)}") # Log error reporting
+        else:
+             message_data = {'type': 'complete', 'result': data}
+             app.logger.info(f"Scan {scan_id} reporting completion.") # Log completion
+
+        message = f"data: {json.dumps(message_data)}\n\n"
+        events = scan_states[scan_id]['events']
+        events.publish(message, terminal=True)
+        # Also publish the end stream signal right after the final message
+        events.publish("event: end_stream\ndata: finished\n\n", terminal=True)
+        app.logger.info(f"Scan {scan_id} published end_stream event ({events.dropped} progress messages dropped for slow clients).")
+
+
+def _persist_scan_result(scan_id: str, tree: Dict[str, Any], max_depth: Optional[int], accounting: str):
+    """Persists a completed scan so it stays browsable/exportable after a restart.
+
+    Called after the completion event is published: the result is already
+    served from memory, so a large scan's snapshot write doesn't delay it.
+    """
+    try:
+        state = scan_states[scan_id]
+        metadata = {
+            "scan_id": scan_id,
+            "target_path": state['target_path'],
+            "max_depth": max_depth,
+            "accounting": accounting,
+            "disk_usage": state['disk_usage'].summary() if state.get('disk_usage') else None,
+            "completed_at": time.time(),
+            "errors": state['error_log'].to_dict(),
+        }
+        if state.get('root_results') is not None:
+            metadata["target_paths"] = state['target_paths']
+            metadata["root_results"] = state['root_results']
+        snapshot_path = snapshot_store.save(scan_id, tree, metadata)
+        state['snapshot_path'] = str(snapshot_path)
+    except Exception as e:
+        app.logger.error(f"Scan {scan_id}: could not persist snapshot: {e}")
+
+
+def _publish_fallback_end_stream(scan_id: str):
+    """Ensures end_stream is sent if not already done by the complete/error path."""
+    if scan_id in scan_states and 'events' in scan_states[scan_id]:
+        if not scan_states[scan_id]['events'].closed:
+            app.logger.warning(f"Scan worker {scan_id} adding fallback end_stream event.")
+            scan_states[scan_id]['events'].publish("event: end_stream\ndata: finished_fallback\n\n", terminal=True)
+
+
+def _run_root_scan(scan_id: str, root_path: Path, max_depth: Optional[int], scan_mode: str, cancel_event: threading.Event,
+                   spiller: Optional[SubtreeSpiller], disk_usage: Optional[DiskUsageAccounting],
+                   root_label: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Scans one root, publishing progress (and progressive estimates) to the scan's broker.
+
+    `root_label` is set for batch scans so clients can tell which root an event belongs to.
+    """
+    events = scan_states[scan_id]['events']
+    error_log = scan_states[scan_id]['error_log']
 
-    # Define callbacks that append to the shared list
     def report_progress_sse(current_path_str: str):
-        global scan_states
-        if scan_id in scan_states and 'progress_messages' in scan_states[scan_id]:
-            message = f"data: {json.dumps({'type': 'progress', 'path': current_path_str})}\n\n"
-            scan_states[scan_id]['progress_messages'].append(message)
+        message_data = {'type': 'progress', 'path': current_path_str}
+        if root_label is not None:
+            message_data['root'] = root_label
+        events.publish(f"data: {json.dumps(message_data)}\n\n")
+
+    refine_subtree = None
+    if scan_mode == SCAN_MODE_PROGRESSIVE and (max_depth is None or max_depth > 0):
+        # Phase 1: quick breadth-first estimate per top-level folder
+        estimate = estimate_top_level_folders(root_path, max_depth, ESTIMATE_TIME_BUDGET_SECONDS, cancel_event)
+        estimate_by_path = {folder["path"]: folder for folder in estimate["folders"]}
+        events.publish(_estimate_event(estimate, 'sample', root_label))
+        app.logger.info(f"Scan {scan_id}: estimate published for {len(estimate['folders'])} top-level folders of {root_path}.")
+
+        # Phase 2: the exact walk replaces each estimate as its folder completes
+        def refine_estimate(folder_data: Dict[str, Any]):
+            folder = estimate_by_path.get(folder_data["path"])
+            if folder is None:
+                return
+            folder.update(size=folder_data.get("size", 0), file_count=count_tree_files(folder_data),
+                          exact=True, pending_dirs=0)
+            events.publish(_estimate_event(estimate, 'refine', root_label))
+        refine_subtree = refine_estimate
+
+    return _scan_directory_recursive(
+        root_path,
+        max_depth,
+        current_depth=0,
+        progress_callback=report_progress_sse,
+        cancel_event=cancel_event,
+        error_log=error_log,
+        subtree_callback=refine_subtree,
+        spiller=spiller,
+        disk_usage=disk_usage
+    )
 
-    def complete_or_error_sse(is_error: bool, data: Union[str, Dict]):
-        global scan_states
-        if scan_id in scan_states and 'progress_messages' in scan_states[scan_id]:
-            message_data = {}
-            if is_error:
-                message_data = {'type': 'error', 'message': str(data)}
-                app.logger.info(f"Scan {scan_id} reporting error: {str(data)}") # Log error reporting
-            else:
-                 message_data = {'type': 'complete', 'result': data}
-                 app.logger.info(f"Scan {scan_id} reporting completion.") # Log completion
 
-            message = f"data: {json.dumps(message_data)}\n\n"
-            scan_states[scan_id]['progress_messages'].append(message)
-            # Also append the end stream signal right after the final message
-            scan_states[scan_id]['progress_messages'].append("event: end_stream\ndata: finished\n\n")
-            app.logger.info(f"Scan {scan_id} appended end_stream event.") # Log end stream
+# --- perform_scan_worker_sse remains largely the same, calling the updated _scan_directory_recursive ---
+def perform_scan_worker_sse(scan_id: str, target_path: Path, max_depth: Optional[int], scan_mode: str = SCAN_MODE_STANDARD,
+                            memory_budget_mb: Optional[float] = None, accounting: str = ACCOUNTING_APPARENT):
+    """Worker function publishing to the scan's SSE event broker."""
+    global scan_states
 
     # Ensure state is initialized (moved to /scan route just before thread start)
 
@@ -265,14 +1352,21 @@ def perform_scan_worker_sse(scan_id: str, target_path: Path, max_depth: Optional
 
         app.logger.info(f"Scan worker {scan_id} starting recursive scan for {target_path}")
         scan_states[scan_id]['status'] = 'running' # Mark as running *within* the thread now
-
-        tree_data = _scan_directory_recursive(
-            target_path,
-            max_depth,
-            current_depth=0,
-            progress_callback=report_progress_sse,
-            cancel_event=threading.Event()
-        )
+        error_log = scan_states[scan_id]['error_log']
+        cancel_event = threading.Event()
+        spiller = SubtreeSpiller(scan_id, int(memory_budget_mb * 1024 * 1024)) if memory_budget_mb else None
+        disk_usage = DiskUsageAccounting() if accounting == ACCOUNTING_DISK else None
+        scan_states[scan_id]['disk_usage'] = disk_usage
+
+        tree_data = _run_root_scan(scan_id, target_path, max_depth, scan_mode, cancel_event, spiller, disk_usage)
+        if disk_usage is not None:
+            app.logger.info(f"Scan {scan_id}: disk usage accounting {disk_usage.summary()}")
+        if spiller is not None and spiller.segment_count:
+            app.logger.info(f"Scan {scan_id}: spilled {spiller.segment_count} subtrees to {spiller.directory}")
+
+        # One summary line per scan instead of one log line per unreadable entry
+        if error_log.total:
+            app.logger.warning(f"Scan {scan_id}: {error_log.summary_line()}")
 
         # Check if scan completed but returned no data (e.g. depth 0 or empty dir)
         # or if an error happened at the root level reported inside tree_data
@@ -283,12 +1377,14 @@ def perform_scan_worker_sse(scan_id: str, target_path: Path, max_depth: Optional
                  app.logger.error(f"Scan {scan_id} failed at root: {tree_data['error']}")
                  scan_states[scan_id]['status'] = 'error'
                  scan_states[scan_id]['error'] = scan_error_message
-                 complete_or_error_sse(is_error=True, data=scan_error_message)
+                 shutil.rmtree(SEGMENT_DIR / scan_id, ignore_errors=True)
+                 _publish_scan_outcome(scan_id, is_error=True, data=scan_error_message)
              else:
                 # Successful scan, potentially with partial errors deeper down
                 scan_states[scan_id]['status'] = 'complete'
                 scan_states[scan_id]['result'] = tree_data
-                complete_or_error_sse(is_error=False, data=tree_data)
+                _publish_scan_outcome(scan_id, is_error=False, data=tree_data)
+                _persist_scan_result(scan_id, tree_data, max_depth, accounting)
         elif scan_id in scan_states and scan_states[scan_id].get('status') == 'running':
              # _scan_directory_recursive returned None, likely depth limit or cancel
              # Treat as complete but possibly empty, rather than error, unless cancelled.
@@ -298,29 +1394,291 @@ def perform_scan_worker_sse(scan_id: str, target_path: Path, max_depth: Optional
              # Create minimal valid tree structure indicating empty/depth limited result
              empty_tree = {"name": target_path.name, "type": "folder", "path": str(target_path), "size": 0, "children": [], "warning":"Scan returned no data (check depth limit or if directory is empty)."}
              scan_states[scan_id]['result'] = empty_tree
-             complete_or_error_sse(is_error=False, data=empty_tree)
+             _publish_scan_outcome(scan_id, is_error=False, data=empty_tree)
+             _persist_scan_result(scan_id, empty_tree, max_depth, accounting)
              app.logger.info(f"Scan {scan_id} completed but returned no tree data (depth limit/empty dir?).")
 
     except Exception as e:
         # Catch unexpected errors within the worker thread itself
         error_message = f"Unexpected worker error: {e}"
         app.logger.error(f"Scan worker {scan_id} crashed: {e}", exc_info=True)
+        shutil.rmtree(SEGMENT_DIR / scan_id, ignore_errors=True) # Drop any spilled segments
         if scan_id in scan_states: # Ensure state exists before updating
             scan_states[scan_id]['status'] = 'error'
             scan_states[scan_id]['error'] = error_message
             # Try to send error via SSE if possible
             try:
-                 complete_or_error_sse(is_error=True, data=error_message)
+                 _publish_scan_outcome(scan_id, is_error=True, data=error_message)
             except Exception as sse_e:
                  app.logger.error(f"Scan worker {scan_id}: Failed to send final error via SSE: {sse_e}")
     finally:
-        # Ensure end_stream is sent if not already done by complete/error callbacks
-        if scan_id in scan_states and 'progress_messages' in scan_states[scan_id]:
-            last_message = scan_states[scan_id]['progress_messages'][-1] if scan_states[scan_id]['progress_messages'] else ""
-            if "event: end_stream" not in last_message:
-                app.logger.warning(f"Scan worker {scan_id} adding fallback end_stream event.")
-                scan_states[scan_id]['progress_messages'].append("event: end_stream\ndata: finished_fallback\n\n")
+        _publish_fallback_end_stream(scan_id)
+
+
+# --- Multi-Root Batch Scans ---
+def group_roots_by_device(target_paths: List[Path]) -> List[List[Path]]:
+    """Groups scan roots by the device they live on, keeping request order.
+
+    Roots on the same device are scanned one after another (parallel walks on
+    one disk mostly fight over the same queue); separate devices run in parallel.
+    """
+    groups: Dict[Any, List[Path]] = OrderedDict()
+    for root_path in target_paths:
+        try:
+            device = os.stat(root_path).st_dev
+        except OSError:
+            device = ("unknown", str(root_path))  # Scanned alone; the walk reports the error
+        groups.setdefault(device, []).append(root_path)
+    return list(groups.values())
+
+
+def nested_root_errors(target_paths: List[Path]) -> List[str]:
+    """One message per batch root that lies inside another root.
+
+    Its files would be walked (and their sizes added to the combined total)
+    twice, so such requests are rejected rather than double counted. The
+    roots are already resolved, so symlinked aliases are caught too.
+    """
+    normalised = [(root_path, Path(os.path.normcase(root_path))) for root_path in target_paths]
+    return [f"{inner} is inside {outer}; scan {outer} alone or pick roots that do not overlap."
+            for inner, inner_norm in normalised
+            for outer, outer_norm in normalised
+            if outer_norm in inner_norm.parents]
+
+
+def perform_batch_scan_worker_sse(scan_id: str, target_paths: List[Path], max_depth: Optional[int],
+                                  scan_mode: str = SCAN_MODE_STANDARD, memory_budget_mb: Optional[float] = None,
+                                  accounting: str = ACCOUNTING_APPARENT):
+    """Batch worker: scans several roots (one thread per device) into one combined result.
+
+    Each root publishes a 'root_complete' event as soon as it finishes. The
+    combined tree is a synthetic folder (path "") whose children are the
+    per-root trees in request order, so the browse/export routes work as-is.
+    """
+    global scan_states
+    try:
+        if scan_id not in scan_states:
+             app.logger.error(f"Scan state for {scan_id} not found at start of worker thread.")
+             return
+
+        state = scan_states[scan_id]
+        state['status'] = 'running'
+        events = state['events']
+        cancel_event = threading.Event()
+        spiller = SubtreeSpiller(scan_id, int(memory_budget_mb * 1024 * 1024)) if memory_budget_mb else None
+        disk_usage = DiskUsageAccounting() if accounting == ACCOUNTING_DISK else None
+        state['disk_usage'] = disk_usage
+
+        trees: Dict[str, Dict[str, Any]] = {}
+        root_results: Dict[str, Dict[str, Any]] = {}
+        results_lock = threading.Lock()
+
+        def scan_device_group(roots: List[Path]):
+            for root_path in roots:
+                root_label = str(root_path)
+                started = time.time()
+                try:
+                    tree_data = _run_root_scan(scan_id, root_path, max_depth, scan_mode, cancel_event,
+                                               spiller, disk_usage, root_label=root_label)
+                except Exception as e:
+                    app.logger.error(f"Scan {scan_id}: root {root_label} crashed: {e}", exc_info=True)
+                    tree_data = {"name": root_path.name, "type": "folder", "path": root_label, "size": 0,
+                                 "children": [], "error": f"Unexpected error: {e}"}
+                if tree_data is None:
+                    tree_data = {"name": root_path.name, "type": "folder", "path": root_label, "size": 0, "children": [],
+                                 "warning": "Scan returned no data (check depth limit or if directory is empty)."}
+                summary = {
+                    "root": root_label,
+                    "size": tree_data.get("size", 0),
+                    "file_count": count_tree_files(tree_data),
+                    "elapsed_seconds": round(time.time() - started, 3),
+                    "error": tree_data.get("error"),
+                }
+                if "disk_size" in tree_data:
+                    summary["disk_size"] = tree_data["disk_size"]
+                with results_lock:
+                    trees[root_label] = tree_data
+                    root_results[root_label] = summary
+                events.publish(f"data: {json.dumps({'type': 'root_complete', **summary})}\n\n")
+                app.logger.info(f"Scan {scan_id}: root {root_label} finished in {summary['elapsed_seconds']}s.")
+
+        device_groups = group_roots_by_device(target_paths)
+        app.logger.info(f"Scan worker {scan_id} starting batch scan of {len(target_paths)} roots on {len(device_groups)} devices")
+        threads = [threading.Thread(target=scan_device_group, args=(roots,), daemon=True) for roots in device_groups]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        children = [trees[str(root_path)] for root_path in target_paths]
+        state['root_results'] = [root_results[str(root_path)] for root_path in target_paths]
+        if state['error_log'].total:
+            app.logger.warning(f"Scan {scan_id}: {state['error_log'].summary_line()}")
+        if disk_usage is not None:
+            app.logger.info(f"Scan {scan_id}: disk usage accounting {disk_usage.summary()}")
+
+        if all(child.get("error") for child in children):
+            # Nothing usable: report like a single-root failure
+            scan_error_message = "Error scanning every root: " + "; ".join(
+                f"{child['path']}: {child['error']}" for child in children)
+            state['status'] = 'error'
+            state['error'] = scan_error_message
+            shutil.rmtree(SEGMENT_DIR / scan_id, ignore_errors=True)
+            _publish_scan_outcome(scan_id, is_error=True, data=scan_error_message)
+            return
+
+        tree_data = {
+            "name": f"Batch scan ({len(children)} roots)",
+            "type": "folder",
+            "path": "",
+            "size": sum(child.get("size", 0) for child in children),
+            "children": children,
+        }
+        if disk_usage is not None:
+            tree_data["disk_size"] = sum(child.get("disk_size", 0) for child in children)
+        state['status'] = 'complete'
+        state['result'] = tree_data
+        _publish_scan_outcome(scan_id, is_error=False, data=tree_data)
+        _persist_scan_result(scan_id, tree_data, max_depth, accounting)
+
+    except Exception as e:
+        error_message = f"Unexpected worker error: {e}"
+        app.logger.error(f"Scan worker {scan_id} crashed: {e}", exc_info=True)
+        shutil.rmtree(SEGMENT_DIR / scan_id, ignore_errors=True)
+        if scan_id in scan_states:
+            scan_states[scan_id]['status'] = 'error'
+            scan_states[scan_id]['error'] = error_message
+            try:
+                 _publish_scan_outcome(scan_id, is_error=True, data=error_message)
+            except Exception as sse_e:
+                 app.logger.error(f"Scan worker {scan_id}: Failed to send final error via SSE: {sse_e}")
+    finally:
+        _publish_fallback_end_stream(scan_id)
+
+
 
+# --- Static Asset Cache ---
+class StaticAsset(NamedTuple):
+    """One front-end file, its precompressed variants and validators."""
+    mtime_ns: int
+    size: int
+    mimetype: str
+    etag: str                       # Content hash of the raw bytes
+    variants: Dict[str, bytes]      # Content-Encoding ('identity', 'gzip', 'br') -> body
+
+    @property
+    def cost(self) -> int:
+        return sum(len(body) for body in self.variants.values())
+
+
+class StaticAssetCache:
+    """Serves front-end files from memory, precompressed once per file version.
+
+    Each file is read, hashed (the ETag) and compressed to gzip and, when the
+    optional `brotli` package is installed, brotli on first request. Entries
+    are revalidated against the file's mtime/size on every hit, so edits show
+    up without a restart. Least recently used entries are evicted once the
+    cache holds more than STATIC_CACHE_LIMIT_BYTES.
+    """
+
+    def __init__(self, root_dir: Path, limit_bytes: int = STATIC_CACHE_LIMIT_BYTES):
+        self.root_dir = root_dir
+        self.limit_bytes = limit_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, StaticAsset]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, rel_path: str, mimetype: Optional[str] = None) -> Optional[StaticAsset]:
+        """Returns the asset for `rel_path` (below root_dir), or None if it is not a file."""
+        full_path = safe_join(str(self.root_dir), rel_path)
+        if full_path is None:
+            return None
+        try:
+            stat_result = os.stat(full_path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None
+
+        with self._lock:
+            asset = self._entries.get(full_path)
+            if asset is not None and (asset.mtime_ns, asset.size) == (stat_result.st_mtime_ns, stat_result.st_size):
+                self._entries.move_to_end(full_path)
+                return asset
+
+        asset = self._load(full_path, stat_result, mimetype)  # Compress outside the lock
+        with self._lock:
+            previous = self._entries.pop(full_path, None)
+            if previous is not None:
+                self.total_bytes -= previous.cost
+            if asset.cost <= self.limit_bytes:
+                self._entries[full_path] = asset
+                self.total_bytes += asset.cost
+                while self.total_bytes > self.limit_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.total_bytes -= evicted.cost
+        return asset
+
+    @staticmethod
+    def _load(full_path: str, stat_result: os.stat_result, mimetype: Optional[str]) -> StaticAsset:
+        with open(full_path, 'rb') as f:
+            raw = f.read()
+        mimetype = mimetype or mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        variants = {'identity': raw}
+        if len(raw) >= STATIC_COMPRESS_MIN_BYTES and mimetype.startswith(STATIC_COMPRESSIBLE_TYPES):
+            # mtime=0 keeps the gzip bytes (and so any proxy cache) stable across reloads
+            variants['gzip'] = gzip.compress(raw, compresslevel=9, mtime=0)
+            if brotli is not None:
+                variants['br'] = brotli.compress(raw, quality=11)
+            # Drop encodings that do not actually save anything
+            variants = {enc: body for enc, body in variants.items() if enc == 'identity' or len(body) < len(raw)}
+        etag = hashlib.sha256(raw).hexdigest()[:32]
+        return StaticAsset(stat_result.st_mtime_ns, stat_result.st_size, mimetype, etag, variants)
+
+
+static_assets = StaticAssetCache(FRONTEND_DIR)
+
+
+def serve_static_asset(rel_path: str, mimetype: Optional[str] = None) -> Response:
+    """Builds a cached, content-negotiated response for a front-end file.
+
+    Each encoding gets its own strong ETag (content hash plus an encoding
+    suffix) and responses carry `Vary: Accept-Encoding`; a matching
+    If-None-Match yields 304 Not Modified. `no-cache` makes browsers
+    revalidate the unhashed module URLs on each load, which costs one 304.
+    """
+    asset = static_assets.get(rel_path, mimetype)
+    if asset is None:
+        abort(404)
+
+    encoding = 'identity'
+    for candidate in ('br', 'gzip'):
+        if candidate in asset.variants and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+    etag = asset.etag if encoding == 'identity' else f"{asset.etag}-{encoding}"
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def gzip_event_stream(chunks: Iterator[str]) -> Iterator[bytes]:
+    """Gzip-compresses an SSE stream, flushing after every message so events are not delayed."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    try:
+        for chunk in chunks:
+            yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        chunks.close()  # Let the inner generator unsubscribe from the broker
 
 
 # --- Flask Routes ---
@@ -333,16 +1691,14 @@ def index():
 @app.route('/static/style.css')
 def serve_css():
     """Serves the CSS file from the new location."""
-    return send_from_directory('../04_FRNT_-_Client-Side-Codebase/04_10_-_Main-App_-_Style-Sheet-CSS-Library', 
-                              '04_10_01_-_Main-App_-_Style-Sheet.css', 
+    return serve_static_asset('04_10_-_Main-App_-_Style-Sheet-CSS-Library/04_10_01_-_Main-App_-_Style-Sheet.css',
                               mimetype='text/css')
 
 # Routes for the modular JavaScript files
 @app.route('/static/<path:file_path>')
 def serve_static_files(file_path):
     """Serves static files from the client-side codebase."""
-    directory = '../04_FRNT_-_Client-Side-Codebase'
-    return send_from_directory(directory, file_path)
+    return serve_static_asset(file_path)
 
 @app.route('/scan', methods=['POST'])
 def start_scan_sse():
@@ -353,11 +1709,40 @@ def start_scan_sse():
         return jsonify({"errors": {"_global": "Invalid request body"}}), 400
 
     dir_path_str = data.get('directory_path')
+    dir_paths_list = data.get('directory_paths')  # Optional list: batch scan of several roots
     json_path_str = data.get('output_path', None)  # Make it optional with default None
     depth_str = data.get('max_depth')
-
-    # --- Validate directory path (always required) ---
-    target_path, dir_error = validate_path(dir_path_str, check_is_dir=True)
+    scan_mode = data.get('scan_mode') or SCAN_MODE_STANDARD
+    budget_str = data.get('memory_budget_mb')
+    accounting = data.get('accounting') or ACCOUNTING_APPARENT
+
+    # --- Validate directory path(s): either directory_path or a directory_paths list ---
+    target_paths: List[Path] = []
+    dir_error = None
+    if dir_paths_list:
+        if not isinstance(dir_paths_list, list):
+            dir_error = "directory_paths must be a list of directory paths."
+        else:
+            path_errors = []
+            for path_str in dir_paths_list:
+                if not isinstance(path_str, str) or not path_str.strip():
+                    path_errors.append(f"{path_str!r}: each entry must be a non-empty path string.")
+                    continue
+                root_path, root_error = validate_path(path_str, check_is_dir=True)
+                if root_error:
+                    path_errors.append(f"{path_str}: {root_error}")
+                elif root_path not in target_paths:  # Ignore exact duplicates
+                    target_paths.append(root_path)
+            path_errors.extend(nested_root_errors(target_paths))
+            if path_errors:
+                dir_error = "; ".join(path_errors)
+        target_path = target_paths[0] if len(target_paths) == 1 else None
+    elif dir_path_str is not None and not isinstance(dir_path_str, str):
+        target_path, dir_error = None, "directory_path must be a path string."
+    else:
+        target_path, dir_error = validate_path(dir_path_str, check_is_dir=True)
+        if target_path:
+            target_paths = [target_path]
 
     # --- Only validate JSON path if it's provided ---
     json_path = None
@@ -377,32 +1762,53 @@ def start_scan_sse():
         except ValueError:
             depth_error = "Depth must be a valid integer."
 
+    # --- Validate memory budget (optional; enables spilling subtrees to disk) ---
+    budget_val = None
+    budget_error = None
+    if budget_str not in (None, ''):
+        try:
+            budget_val = float(budget_str)
+            if budget_val <= 0:
+                budget_error = "Memory budget must be a positive number of MB."
+                budget_val = None
+        except (TypeError, ValueError):
+            budget_error = "Memory budget must be a number (MB)."
+
     # --- Collect errors ---
     errors = {}
-    if dir_error: errors['directory_path'] = dir_error
+    if dir_error: errors['directory_paths' if dir_paths_list else 'directory_path'] = dir_error
     if json_error: errors['output_path'] = json_error
     if depth_error: errors['max_depth'] = depth_error
+    if scan_mode not in SCAN_MODES: errors['scan_mode'] = f"Scan mode must be one of: {', '.join(SCAN_MODES)}."
+    if budget_error: errors['memory_budget_mb'] = budget_error
+    if accounting not in ACCOUNTING_MODES: errors['accounting'] = f"Accounting must be one of: {', '.join(ACCOUNTING_MODES)}."
 
     if errors:
         return jsonify({"errors": errors}), 400
 
     # --- Initiate Scan ---
     scan_id = str(uuid.uuid4())
-    app.logger.info(f"Received valid scan request {scan_id} for '{target_path}' (Depth: {depth_val}, Output: '{json_path}')")
+    is_batch = len(target_paths) > 1
+    target_label = "; ".join(str(root_path) for root_path in target_paths)
+    app.logger.info(f"Received valid scan request {scan_id} for '{target_label}' (Depth: {depth_val}, Mode: {scan_mode}, Memory budget: {budget_val} MB, Accounting: {accounting}, Output: '{json_path}')")
 
     # Initialize state IMMEDIATELY before starting thread
     scan_states[scan_id] = {
         'status': 'starting',
-        'progress_messages': [],
+        'events': ScanEventBroker(),
         'result': None,
         'error': None,
-        'target_path': str(target_path),
+        'target_path': target_label,
+        'target_paths': [str(root_path) for root_path in target_paths],
         'output_path': str(json_path) if json_path else None,  # Store validated output path or None
+        'error_log': ScanErrorLog(target_paths),
+        # Larger scans end with a big 'complete' payload; worth compressing the stream
+        'compress_events': is_batch or depth_val is None or depth_val >= SSE_GZIP_MIN_DEPTH,
     }
 
     scan_thread = threading.Thread(
-        target=perform_scan_worker_sse,
-        args=(scan_id, target_path, depth_val),
+        target=perform_batch_scan_worker_sse if is_batch else perform_scan_worker_sse,
+        args=(scan_id, target_paths if is_batch else target_path, depth_val, scan_mode, budget_val, accounting),
         daemon=True
     )
     scan_thread.start()
@@ -423,81 +1829,106 @@ def stream_status(scan_id):
             return
 
         app.logger.info(f"SSE connection opened for scan {scan_id}")
-        last_sent_index = 0
-        # Check immediately if the scan finished *before* the SSE connection was established
-        initial_state = scan_states.get(scan_id, {})
-        initial_status = initial_state.get('status')
-        initial_messages_count = len(initial_state.get('progress_messages', []))
-
-        if initial_status not in ['starting', 'running'] and initial_messages_count > 0:
-             app.logger.info(f"SSE for {scan_id}: Scan already completed ({initial_status}). Sending backlog.")
-             # Send all messages at once if scan is already done
-             current_messages = initial_state.get('progress_messages', [])
-             for msg in current_messages:
-                 yield msg
-             last_sent_index = len(current_messages)
-             # Check if the last message was indeed the end_stream event
-             if not current_messages or "event: end_stream" not in current_messages[-1]:
-                  app.logger.warning(f"SSE for {scan_id}: Completed state but end_stream missing? Adding fallback.")
-                  yield "event: end_stream\ndata: finished_immediate_complete\n\n"
-             app.logger.info(f"SSE connection for completed scan {scan_id} closed after sending backlog.")
-             return # End the generator immediately
-
-
-        # If scan is starting or running, enter the polling loop
-        while True:
-            if scan_id not in scan_states: # Check if state was removed during loop
-                app.logger.warning(f"SSE for {scan_id}: Scan state disappeared during streaming.")
-                yield "event: error\ndata: {json.dumps({'message': 'Scan state lost'})}\n\n"
-                yield "event: end_stream\ndata: error_state_lost\n\n"
-                break
-
-            state = scan_states[scan_id]
-            current_messages = state.get('progress_messages', [])
-            new_messages_count = len(current_messages) - last_sent_index
-
-            if new_messages_count > 0:
-                app.logger.debug(f"SSE for {scan_id}: Sending {new_messages_count} new messages.")
-                for i in range(last_sent_index, len(current_messages)):
-                    yield current_messages[i]
-                    # Check if end_stream event was just sent
-                    if "event: end_stream" in current_messages[i]:
+        events = scan_states[scan_id]['events']
+        subscription = events.subscribe()
+        try:
+            while True:
+                messages = events.get(subscription, timeout=SSE_KEEPALIVE_SECONDS)
+                if not messages:
+                    # Comment line; lets the server notice a client that has gone away
+                    yield ": keep-alive\n\n"
+                    continue
+                for message in messages:
+                    yield message
+                    if message.startswith(SSE_END_STREAM):
                         app.logger.info(f"SSE for {scan_id}: Detected end_stream event. Closing SSE connection.")
-                        # Optional: Consider cleaning up scan_states[scan_id] here or periodically
                         return # Stop the generator
-                last_sent_index = len(current_messages)
-
-            # If no new messages, check if status changed to indicate completion/error
-            # This handles cases where the final state is set but messages might lag or fail
-            current_status = state.get('status')
-            if current_status not in ['starting', 'running'] and last_sent_index == len(current_messages):
-                 app.logger.warning(f"SSE for {scan_id}: Status is {current_status} but no new messages. Ending stream.")
-                 # Send a final status message if appropriate (though callbacks *should* handle this)
-                 # Add end_stream just in case it was missed
-                 yield "event: end_stream\ndata: finished_status_change\n\n"
-                 return # End stream
-
-            # Add a small delay to prevent busy-waiting
-            time.sleep(0.2) # Check for updates 5 times per second
+        finally:
+            events.unsubscribe(subscription)
 
     # Set headers for SSE
-    response = Response(stream_with_context(generate()), content_type='text/event-stream')
+    stream = generate()
+    compress = scan_states.get(scan_id, {}).get('compress_events') and request.accept_encodings['gzip']
+    if compress:
+        stream = gzip_event_stream(stream)
+    response = Response(stream_with_context(stream), content_type='text/event-stream')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
     response.headers['Cache-Control'] = 'no-cache'
     response.headers['X-Accel-Buffering'] = 'no' # Useful for nginx buffering issues
     return response
 
 
+@app.route('/scan/<scan_id>/errors')
+def scan_errors(scan_id):
+    """Returns the grouped, bounded error summary collected for a scan."""
+    state = scan_states.get(scan_id)
+    if state is None:
+        # Fall back to the summary stored with a persisted snapshot
+        metadata = snapshot_store.metadata(scan_id)
+        if metadata is None:
+            return jsonify({"error": "Invalid or unknown scan ID"}), 404
+        return jsonify({"scan_id": scan_id, "status": "complete", "errors": metadata.get("errors", {})}), 200
+    return jsonify({"scan_id": scan_id, "status": state.get('status'), "errors": state['error_log'].to_dict()}), 200
+
+
+@app.route('/scans')
+def list_scans():
+    """Lists scans known to this server: live ones and persisted snapshots."""
+    scans = {
+        scan_id: {"scan_id": scan_id, "status": state.get('status'), "target_path": state.get('target_path')}
+        for scan_id, state in list(scan_states.items())
+    }
+    for scan_id in snapshot_store.scan_ids():
+        if scan_id in scans:
+            continue
+        metadata = snapshot_store.metadata(scan_id)
+        if metadata:
+            scans[scan_id] = {"scan_id": scan_id, "status": "stored", "target_path": metadata.get("target_path"),
+                              "completed_at": metadata.get("completed_at"), "node_count": metadata.get("node_count")}
+    return jsonify({"scans": list(scans.values())}), 200
+
+
+@app.route('/scan/<scan_id>/tree')
+def browse_scan_tree(scan_id):
+    """Returns one node of a scan (live or persisted), optionally limited to `depth` levels."""
+    depth_str = request.args.get('depth', '1')
+    try:
+        depth_val = int(depth_str) if depth_str != '' else None
+    except ValueError:
+        return jsonify({"error": "Depth must be a valid integer."}), 400
+    node, error = get_scan_tree(scan_id, request.args.get('path'), depth_val)
+    if error:
+        return jsonify({"error": error}), 404
+    return jsonify(node), 200
+
+
 @app.route('/export', methods=['POST'])
 def export_json():
-    """Saves the scan data (provided by frontend) to a JSON file."""
+    """Saves the scan data (provided by frontend, or looked up by scan_id) to a JSON or text listing file."""
     data = request.get_json()
     if not data:
         return jsonify({"error": "Invalid request body"}), 400
 
+    # format: 'json' (default), or a text listing style with optional filters
+    listing_options = None
+    if data.get('format') not in (None, '', 'json'):
+        listing_options, options_error = parse_listing_options(data)
+        if options_error:
+            return jsonify({"error": options_error}), 400
+
     scan_data = data.get('scan_data')
     output_path_str = data.get('output_path')
 
-    if not scan_data:
+    scan_node = None
+    if data.get('scan_id'):
+        # Export straight from a live or persisted scan (the server's copy wins over scan_data)
+        scan_node, lookup_error = get_scan_node(data['scan_id'], data.get('path'))
+        if lookup_error:
+            return jsonify({"error": lookup_error}), 404
+
+    if not scan_data and scan_node is None:
         return jsonify({"error": "Missing scan_data"}), 400
     if not output_path_str:
         return jsonify({"error": "Missing output_path"}), 400
@@ -513,7 +1944,12 @@ def export_json():
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
         with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(scan_data, f, indent=4, ensure_ascii=False)
+            if listing_options is not None:
+                f.writelines(iter_tree_text(scan_node if scan_node is not None else scan_data, **listing_options))
+            else:
+                # Streamed, so spilled segments (also stubs inside a posted scan_data tree) are
+                # expanded and read back one at a time
+                f.writelines(iter_tree_json(scan_node if scan_node is not None else scan_data))
 
         app.logger.info(f"Successfully exported data to {output_path}")
         return jsonify({"message": f"Successfully exported to: {output_path}"}), 200
@@ -524,12 +1960,78 @@ def export_json():
     except OSError as e: # Catch other OS errors like disk full, etc.
          app.logger.error(f"OS error writing export file to '{output_path}': {e}", exc_info=True)
          return jsonify({"error": f"OS error writing file: {e}"}), 500
+    except ValueError as e:  # A spilled-folder stub in scan_data that names no segment of ours
+        app.logger.warning(f"Export to '{output_path}' rejected: {e}")
+        return jsonify({"error": f"Invalid scan_data: {e}"}), 400
     except Exception as e:
         app.logger.error(f"Unexpected error exporting JSON to '{output_path}': {e}", exc_info=True)
         return jsonify({"error": f"Unexpected error exporting JSON: {e}"}), 500
 
+
+@app.route('/scan/<scan_id>/listing')
+def scan_listing(scan_id):
+    """Streams a scan (or ?path= subtree) as a plain-text tree or directory listing.
+
+    Query options: format (tree|listing), depth, include/exclude (comma-separated
+    globs), min_size (bytes), sizes (human|bytes|none), dirs_only.
+    """
+    listing_options, options_error = parse_listing_options(request.args)
+    if options_error:
+        return jsonify({"error": options_error}), 400
+    node, error = get_scan_node(scan_id, request.args.get('path'))
+    if error:
+        return jsonify({"error": error}), 404
+    return Response(stream_with_context(iter_tree_text(node, **listing_options)), mimetype='text/plain')
+
+
+# --- Command-Line Listing Export ---
+def run_listing_cli(argv: List[str]) -> int:
+    """`listing` subcommand: writes a stored scan as text without starting the server or rescanning."""
+    parser = argparse.ArgumentParser(prog='listing', description='Export a stored scan as a text tree or directory listing.')
+    parser.add_argument('scan_id', help="Scan ID of a persisted scan, or 'latest'")
+    parser.add_argument('--path', help='Subtree of the scan to export (default: scan root)')
+    parser.add_argument('--format', choices=LISTING_STYLES, default=LISTING_STYLE_TREE)
+    parser.add_argument('--depth', type=int, help='Levels to show (default: all for tree, 1 for listing)')
+    parser.add_argument('--include', action='append', default=[], help='Glob files must match (repeatable)')
+    parser.add_argument('--exclude', action='append', default=[], help='Glob for files/folders to skip (repeatable)')
+    parser.add_argument('--min-size', type=int, default=0, help='Skip files smaller than this many bytes')
+    parser.add_argument('--sizes', choices=LISTING_SIZE_UNITS, help='Size display (default: human for tree, bytes for listing)')
+    parser.add_argument('--dirs-only', action='store_true')
+    parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    scan_id = args.scan_id
+    if scan_id == 'latest':
+        stored = [((snapshot_store.metadata(sid) or {}).get("completed_at") or 0, sid) for sid in snapshot_store.scan_ids()]
+        if not stored:
+            print("No stored scans found.", file=sys.stderr)
+            return 1
+        scan_id = max(stored)[1]
+
+    listing_options, options_error = parse_listing_options({
+        'format': args.format, 'depth': args.depth, 'include': args.include, 'exclude': args.exclude,
+        'min_size': args.min_size, 'sizes': args.sizes, 'dirs_only': args.dirs_only,
+    })
+    if options_error:
+        print(options_error, file=sys.stderr)
+        return 2
+    node, error = get_scan_node(scan_id, args.path)
+    if error:
+        print(error, file=sys.stderr)
+        return 1
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.writelines(iter_tree_text(node, **listing_options))
+    else:
+        sys.stdout.writelines(iter_tree_text(node, **listing_options))
+    return 0
+
 # --- Main execution ---
 if __name__ == '__main__':
+    # `python <this file> listing <scan_id> [...]` exports a stored scan instead of starting the server
+    if len(sys.argv) > 1 and sys.argv[1] == 'listing':
+        sys.exit(run_listing_cli(sys.argv[2:]))
     # Use host='0.0.0.0' to make it accessible on your network if needed
     # Ensure debug=False for any kind of production/shared use
     is_debug = os.environ.get('FLASK_DEBUG', '0') == '1'
@@ -10,6 +10,7 @@ function initApp() {
     // Application state
     const state = {
         scanData: null,
+        scanId: null,
     };
     
     try {
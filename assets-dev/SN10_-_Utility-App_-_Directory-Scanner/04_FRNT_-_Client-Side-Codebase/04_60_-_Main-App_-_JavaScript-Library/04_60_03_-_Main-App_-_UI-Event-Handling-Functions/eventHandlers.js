@@ -1,5 +1,5 @@
 import { validateScanForm, validateExportForm, displayServerErrors } from '../04_60_90_-_Main-App_-__Error-Handling-Functions/formValidation.js';
-import { startScan, exportToJson } from '../04_60_04_-_Main-App_-_System-Level-API-Functions/apiClient.js';
+import { startScan, fetchScanNode, exportToJson } from '../04_60_04_-_Main-App_-_System-Level-API-Functions/apiClient.js';
 import { setLoadingState, updateStatus, clearErrors, updateExportStatus } from '../04_60_05_-_Main-App_-_DOM-Interaction-Functions/domElements.js';
 import { renderDirectoryTree } from '../04_60_29_-_Main-App_-_UI-Rendering-Functions/treeRenderer.js';
 
@@ -16,6 +16,7 @@ function setupScanButtonHandler(elements, state) {
         inputDepth,
         inputJson,
         enableJsonExport,
+        enableProgressiveScan,
         previewTree
     } = elements;
 
@@ -26,6 +27,7 @@ function setupScanButtonHandler(elements, state) {
         previewTree.innerHTML = '<p>Scanning...</p>';
         clearErrors(elements);
         state.scanData = null;
+        state.scanId = null;
         btnExport.disabled = true;
         
         // Get input values
@@ -33,6 +35,7 @@ function setupScanButtonHandler(elements, state) {
         const depth = inputDepth.value.trim();
         const jsonExportEnabled = enableJsonExport.checked;
         const jsonPath = jsonExportEnabled ? inputJson.value.trim() : '';
+        const scanMode = enableProgressiveScan.checked ? 'progressive' : null;
         
         // Client-side validation
         const validation = validateScanForm(
@@ -56,7 +59,8 @@ function setupScanButtonHandler(elements, state) {
             },
             onComplete: (result) => {
                 state.scanData = result;
-                renderDirectoryTree(result, previewTree);
+                // Spilled folders arrive without children; they are fetched when expanded
+                renderDirectoryTree(result, previewTree, (path) => fetchScanNode(state.scanId, path));
                 setLoadingState(elements, false);
                 
                 // Enable export button if JSON export is enabled
@@ -74,11 +78,13 @@ function setupScanButtonHandler(elements, state) {
         
         // Start the scan
         const scanResult = await startScan(
-            { dirPath, depth, jsonExportEnabled, jsonPath },
+            { dirPath, depth, jsonExportEnabled, jsonPath, scanMode },
             callbacks
         );
         
-        if (!scanResult.success) {
+        if (scanResult.success) {
+            state.scanId = scanResult.scanId;
+        } else {
             // Handle API errors
             displayServerErrors(scanResult.errors, elements, jsonExportEnabled);
             setLoadingState(elements, false);
@@ -131,7 +137,7 @@ function setupExportButtonHandler(elements, state) {
         
         // Start export
         await exportToJson(
-            { scanData: state.scanData, outputPath },
+            { scanData: state.scanData, scanId: state.scanId, outputPath },
             callbacks
         );
     });
@@ -2,6 +2,8 @@
  * Module for handling API calls to the server
  */
 
+import { formatBytes } from '../04_60_03_-_Main-App_-_Global-Helper-Functions/formatBytes.js';
+
 // Module-level state for SSE connection
 let currentEventSource = null;
 let currentScanId = null;
@@ -13,7 +15,7 @@ let currentScanId = null;
  * @returns {Promise<Object>} - Promise resolving to the scan result
  */
 async function startScan(scanParams, callbacks) {
-    const { dirPath, depth, jsonExportEnabled, jsonPath } = scanParams;
+    const { dirPath, depth, jsonExportEnabled, jsonPath, scanMode } = scanParams;
     const { onProgress, onComplete, onError } = callbacks;
     
     // Prepare request body
@@ -22,6 +24,11 @@ async function startScan(scanParams, callbacks) {
         max_depth: depth
     };
     
+    // Only include scan_mode when a non-default mode was chosen
+    if (scanMode) {
+        requestBody.scan_mode = scanMode;
+    }
+    
     // Only include output_path if JSON export is enabled
     if (jsonExportEnabled && jsonPath) {
         requestBody.output_path = jsonPath;
@@ -91,6 +98,25 @@ function connectToSSE(scanId, callbacks) {
                     onProgress(`Scanning: ${data.path}`);
                     break;
                     
+                case 'estimate':
+                    // Progressive scans: approximate totals, refined as folders complete
+                    onProgress(
+                        `${data.phase === 'sample' ? 'Estimated' : 'Refining'}: ` +
+                        `~${data.total_files.toLocaleString()} files, ~${formatBytes(data.total_size)} ` +
+                        `(${data.exact_folders} of ${data.folders.length} folders exact)`
+                    );
+                    break;
+
+                case 'root_complete':
+                    // Batch scans: one root finished; the combined result follows on 'complete'
+                    onProgress(
+                        data.error
+                            ? `Finished ${data.root} with error: ${data.error}`
+                            : `Finished ${data.root}: ${data.file_count.toLocaleString()} files, ` +
+                              `${formatBytes(data.size)} in ${data.elapsed_seconds}s`
+                    );
+                    break;
+
                 case 'complete':
                     onProgress('Scan complete!');
                     onComplete(data.result);
@@ -148,6 +174,23 @@ function closeSSE() {
     }
 }
 
+/**
+ * Fetches one folder of a scan, one level deep, from the server
+ * (used for folders whose contents were spilled to disk during the scan)
+ * @param {string} scanId - ID of the scan
+ * @param {string} path - Path of the folder within the scan
+ * @returns {Promise<Object>} - Promise resolving to the folder node with its children
+ */
+async function fetchScanNode(scanId, path) {
+    const query = new URLSearchParams({ path, depth: '1' });
+    const response = await fetch(`/scan/${encodeURIComponent(scanId)}/tree?${query}`);
+    const result = await response.json();
+    if (!response.ok) {
+        throw new Error(result.error || response.statusText);
+    }
+    return result;
+}
+
 /**
  * Exports scan data to a JSON file
  * @param {Object} exportParams - Parameters for export
@@ -155,17 +198,19 @@ function closeSSE() {
  * @returns {Promise<Object>} - Promise resolving to the export result
  */
 async function exportToJson(exportParams, callbacks) {
-    const { scanData, outputPath } = exportParams;
+    const { scanData, scanId, outputPath } = exportParams;
     const { onSuccess, onError } = callbacks;
     
+    // With a scan ID the server exports its own full copy, spilled folders included
+    const requestBody = scanId
+        ? { scan_id: scanId, output_path: outputPath }
+        : { scan_data: scanData, output_path: outputPath };
+    
     try {
         const response = await fetch('/export', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                scan_data: scanData,
-                output_path: outputPath
-            })
+            body: JSON.stringify(requestBody)
         });
 
         const result = await response.json();
@@ -197,5 +242,6 @@ export {
     startScan, 
     connectToSSE, 
     closeSSE, 
+    fetchScanNode,
     exportToJson 
 }; 
\ No newline at end of file
@@ -15,6 +15,7 @@ function initDOMElements() {
         inputDepth: document.getElementById('input-depth'),
         inputJson: document.getElementById('input-json'),
         enableJsonExport: document.getElementById('enable-json-export'),
+        enableProgressiveScan: document.getElementById('enable-progressive-scan'),
         
         // Containers and status elements
         jsonExportOptions: document.getElementById('json-export-options'),
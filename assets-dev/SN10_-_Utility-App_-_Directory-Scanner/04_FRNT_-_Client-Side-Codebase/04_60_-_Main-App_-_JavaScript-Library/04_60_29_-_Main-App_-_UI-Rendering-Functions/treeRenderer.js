@@ -1,11 +1,25 @@
 import { formatBytes } from '../04_60_03_-_Main-App_-_Global-Helper-Functions/formatBytes.js';
 
+/**
+ * Whether a folder's children still have to be fetched from the server:
+ * spilled folders (a `segment` stub) and folders cut off by a depth limit
+ * arrive with an empty children list
+ * @param {Object} item - Node data object
+ * @returns {boolean}
+ */
+function isUnloadedFolder(item) {
+    const empty = !item.children || item.children.length === 0;
+    return item.type === 'folder' && empty && Boolean(item.segment || item.child_count > 0);
+}
+
 /**
  * Renders a tree structure for directory/file visualization
  * @param {Array} nodeDataArray - Array of node data objects to render
+ * @param {Function} [loadFolder] - Called with a folder path, resolves to that folder
+ *     with its children; unloaded folders start collapsed and are fetched on first expand
  * @returns {HTMLElement} - A UL element containing the rendered tree
  */
-function renderTree(nodeDataArray) {
+function renderTree(nodeDataArray, loadFolder) {
     const ul = document.createElement('ul');
     
     nodeDataArray.forEach(item => {
@@ -14,11 +28,28 @@ function renderTree(nodeDataArray) {
         nodeDiv.classList.add('tree-node', item.type);
 
         if (item.type === 'folder') {
-            li.classList.add('expanded');
-            nodeDiv.classList.add('expanded');
+            let pendingLoad = loadFolder && isUnloadedFolder(item);
+            if (!pendingLoad) {
+                li.classList.add('expanded');
+                nodeDiv.classList.add('expanded');
+            }
 
-            nodeDiv.addEventListener('click', (e) => {
+            nodeDiv.addEventListener('click', async (e) => {
                 e.stopPropagation();
+                if (pendingLoad) {
+                    pendingLoad = false;
+                    try {
+                        const folder = await loadFolder(item.path);
+                        if (folder.children && folder.children.length > 0) {
+                            const childUl = renderTree(folder.children, loadFolder);
+                            li.appendChild(childUl);
+                        }
+                    } catch (error) {
+                        console.error(`Could not load folder ${item.path}:`, error);
+                        pendingLoad = true;  // Let a later click retry
+                        return;
+                    }
+                }
                 li.classList.toggle('expanded');
                 nodeDiv.classList.toggle('expanded');
                 const isExpanded = li.classList.contains('expanded');
@@ -30,7 +61,7 @@ function renderTree(nodeDataArray) {
             });
             
             nodeDiv.setAttribute('role', 'treeitem');
-            nodeDiv.setAttribute('aria-expanded', 'true');
+            nodeDiv.setAttribute('aria-expanded', (!pendingLoad).toString());
         } else {
             nodeDiv.setAttribute('role', 'treeitem');
         }
@@ -70,7 +101,7 @@ function renderTree(nodeDataArray) {
         li.appendChild(nodeDiv);
 
         if (item.type === 'folder' && item.children && item.children.length > 0) {
-            const childUl = renderTree(item.children);
+            const childUl = renderTree(item.children, loadFolder);
             childUl.style.display = 'block';
             li.appendChild(childUl);
         }
@@ -85,8 +116,9 @@ function renderTree(nodeDataArray) {
  * Creates a root tree node and renders the entire tree structure
  * @param {Object} rootData - Data for the root node
  * @param {HTMLElement} container - Container element to append the tree to
+ * @param {Function} [loadFolder] - Fetches folders that arrived without their children (see renderTree)
  */
-function renderDirectoryTree(rootData, container) {
+function renderDirectoryTree(rootData, container, loadFolder) {
     container.innerHTML = ''; // Clear container
     
     if (!rootData || typeof rootData !== 'object') {
@@ -130,7 +162,7 @@ function renderDirectoryTree(rootData, container) {
     rootLi.classList.add('expanded');
 
     if (rootData.children && rootData.children.length > 0) {
-        const childUl = renderTree(rootData.children);
+        const childUl = renderTree(rootData.children, loadFolder);
         childUl.style.display = 'block';
         rootLi.appendChild(childUl);
     }
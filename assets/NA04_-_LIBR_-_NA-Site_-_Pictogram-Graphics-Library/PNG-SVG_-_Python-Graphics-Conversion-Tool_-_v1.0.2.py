@@ -12,14 +12,74 @@
 #   - Pillow (PIL Fork): For image preprocessing
 #   - OpenCV (cv2): For contour detection and processing
 #   - svgwrite: For SVG file creation
-#   - scikit-image: For advanced edge detection
+#   - scikit-image: For advanced edge detection (optional with --edge-backend opencv)
 #
 # Installation:
 #   pip install pillow opencv-python svgwrite numpy scikit-image
 #
 # Version Notes:
 # -------------
-# v1.0.1 (Current)
+# v1.0.2 (Current)
+#   - Path data is serialized per contour in bulk (contour_path_data) instead of
+#     one formatted string per point; output is byte-for-byte unchanged
+#   - New default "stream" writer (--writer) emits <g>/<path> elements straight to
+#     a buffered file instead of building an svgwrite DOM; same output, plus a
+#     --compact mode. The temporary file now lives next to the output so the
+#     final rename stays atomic
+#   - --jobs N converts files across a process pool (--jobs 0 = all cores); each
+#     file's log is printed as one block in input order, followed by a summary
+#     listing any failed files
+#   - Conversion cache keyed on the input's content hash plus every output-affecting
+#     setting: unchanged files are skipped or restored from the cache. LRU
+#     eviction keeps it under --cache-max-mb; --no-cache bypasses it
+#   - Sweep mode: a list or range for --threshold/--size (e.g. -t 180:250:10)
+#     converts every combination through a memoized stage graph (decode, resize
+#     and Canny run once per size) and writes a path-count/file-size report
+#   - --edge-backend opencv: GaussianBlur + cv2.Canny tuned to match skimage's
+#     Canny (~10x faster); scikit-image is now only imported when selected.
+#     --benchmark-edges compares time and edge agreement of the backends
+#   - Preprocessing decodes once, shares one grayscale array between the edge
+#     and threshold stages, thresholds with a vectorized comparison and drops
+#     the unused full-size copies; grayscale conversion now happens before the
+#     resize, so only one channel is resampled
+#   - Tiled mode (--tile-size N) for very large scans: traces at full resolution
+#     in overlapping tiles, optionally in parallel (--tile-jobs), and stitches
+#     contours across tile seams into one SVG whose viewBox is the image size.
+#     The whole image is still decoded once (PNG has no random access), so
+#     memory grows with the image; tiling bounds the processing buffers on top.
+#     Seam pixels are read from the tile that contains them, and every loop
+#     starts at its top-left point, so shapes do not depend on the tile size
+#   - --curve-tolerance T fits cubic Bezier curves (split at corners) in place of
+#     dense polylines, keeping every contour point within T units of the curve,
+#     and reports the node and path-data byte reduction for each file
+#   - --path-encoding relative writes path data as relative offsets with h/v
+#     shortcuts, implicit command repeats and minimal separators; --precision
+#     sets the decimal places kept for coordinates
+#   - Each shape is written as one evenodd compound path of its outer boundary
+#     and its holes (from the RETR_TREE hierarchy, or by containment in tiled
+#     mode), so holes render as holes; fill and stroke are set once per layer
+#     group instead of on every path. --no-layers works again
+#   - --sprite sprite.svg combines every converted icon into one sprite sheet of
+#     <symbol>s (IDs from the file names) with a JSON manifest; path data that
+#     repeats across icons is stored once and referenced through <use>
+#   - --report run.json records per file and stage (decode, resize, canny,
+#     threshold, find_contours, simplify, svg_build, save, ...) the wall time
+#     and peak resident memory, contour/point counts before and after
+#     simplification and the output size; --quiet drops the progress messages
+#   - vectorize(image_bytes_or_array, **options) -> SVG bytes: in-memory API
+#     with no file I/O or printing (safe to call from several threads), and
+#     --serve PORT, a local HTTP service (POST /vectorize) over a pool of
+#     pre-warmed worker processes that is rebuilt if a worker dies; options
+#     are range-checked (--size up to 10000, --tile-size up to 8192, ...)
+#   - Layered mode traces the edge, circle and shape layers of an image in
+#     parallel threads (--layer-jobs, automatic by default) and runs Canny
+#     alongside the threshold/circle masks; output is unchanged
+#   - Each layer's contours are measured once into a NumPy table of area,
+#     perimeter, bounding box and point count (contour_metrics); the circle
+#     pick, simplification, size filters and compound-path grouping all read
+#     from it, and the SVG filters run on whole layers at once
+#
+# v1.0.1
 #   - Added proper layered SVG structure instead of simple silhouettes
 #   - Implemented separate processing paths for:
 #     * Background circle with white fill and bronze outline
@@ -57,20 +117,45 @@
 #   python PNG-SVG_-_Python-Graphics-Conversion-Tool_-_v1.0.1.py image.png -t 200 -s 1200
 #   python PNG-SVG_-_Python-Graphics-Conversion-Tool_-_v1.0.1.py image.png -o custom_output.svg --smooth
 #   python PNG-SVG_-_Python-Graphics-Conversion-Tool_-_v1.0.1.py *.png  # Process all PNG files
+#   python PNG-SVG_-_Python-Graphics-Conversion-Tool_-_v1.0.2.py *.png --jobs 0  # All files, all CPU cores
+#   python PNG-SVG_-_Python-Graphics-Conversion-Tool_-_v1.0.2.py image.png -t 180:250:10 -s 800,1000  # Sweep
+#   python PNG-SVG_-_Python-Graphics-Conversion-Tool_-_v1.0.2.py scan.png --tile-size 2048 --tile-jobs 0  # Huge scan
+#   python PNG-SVG_-_Python-Graphics-Conversion-Tool_-_v1.0.2.py poster.png -s 4000 --layer-jobs 3  # Large image, layers in parallel
+#   python PNG-SVG_-_Python-Graphics-Conversion-Tool_-_v1.0.2.py icon.png --curve-tolerance 1 --path-encoding relative --compact  # Smallest files
+#   python PNG-SVG_-_Python-Graphics-Conversion-Tool_-_v1.0.2.py icons/*.png --sprite icons/sprite.svg  # One file for the site
+#   python PNG-SVG_-_Python-Graphics-Conversion-Tool_-_v1.0.2.py *.png --quiet --report run.json  # Timing per stage
+#   python PNG-SVG_-_Python-Graphics-Conversion-Tool_-_v1.0.2.py --serve 8765 --jobs 2  # Local conversion service
+#     curl --data-binary @icon.png "http://127.0.0.1:8765/vectorize?threshold=200" -o icon.svg
 
 import os
 import sys
 import tempfile
 import argparse
 import glob
+import io
+import time
+import contextlib
+import hashlib
+import json
+import shutil
+import signal
+import threading
+import csv
+import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
 import numpy as np
 import cv2
 import svgwrite
 from PIL import Image, ImageOps
-from skimage import feature
+# scikit-image is imported lazily by detect_edges, only when its Canny backend is selected
 
 # --- Default Configuration ---
 DEFAULT_TARGET_SIZE_PX = 1000  # Intermediate processing size & SVG viewBox units
+MAX_TARGET_SIZE_PX = 10000  # Largest --size: each processing mask is size x size bytes
 DEFAULT_REAL_WIDTH_MM = 100
 DEFAULT_REAL_HEIGHT_MM = 100
 # Default threshold: Assumes icon is darker than near-white (e.g., 240).
@@ -82,356 +167,1626 @@ DEFAULT_SMOOTH = False # Smoothing often distorts icons, disable by default
 DEFAULT_STROKE_WIDTH = 0.5  # Default stroke width in pt
 DEFAULT_BRONZE_COLOR = "#8B7355"  # Bronze color for lines
 DEFAULT_PRESERVE_LAYERS = True  # Create layered SVG by default
+SVG_WRITER_STREAM = "stream"      # Write elements straight to the file (fast, low memory)
+SVG_WRITER_SVGWRITE = "svgwrite"  # Build and validate an svgwrite DOM, then save it
+DEFAULT_SVG_WRITER = SVG_WRITER_STREAM
+SVG_WRITE_BUFFER_BYTES = 1 << 16  # Output buffer for the streaming writer
+
+# Canny edge detection backends for the stroke layer
+EDGE_BACKEND_SKIMAGE = "skimage"  # skimage.feature.canny (reference output, slow, heavy import)
+EDGE_BACKEND_OPENCV = "opencv"    # GaussianBlur + cv2.Canny tuned to match it
+EDGE_BACKENDS = (EDGE_BACKEND_SKIMAGE, EDGE_BACKEND_OPENCV)
+DEFAULT_EDGE_BACKEND = EDGE_BACKEND_SKIMAGE
+CANNY_SIGMA = 3.0
+CANNY_LOW, CANNY_HIGH = 0.1, 0.2  # skimage's default thresholds, as a fraction of full scale
+CIRCLE_CLOSE_KERNEL = np.ones((5, 5), np.uint8)  # Closes small gaps in the outer circle mask
+
+# Tiled mode: very large scans are traced at full resolution, one tile at a time
+DEFAULT_TILE_SIZE = 0  # Tile edge in pixels; 0 = off (resize to --size as before)
+DEFAULT_TILE_OVERLAP = 32  # Context pixels around each tile; Canny's blur alone reaches 13 px
+LAYER_COUNT = 3  # Edges, circle and shapes: the most threads --layer-jobs can keep busy
+# Per-contour measurements, one table per layer (see contour_metrics)
+CONTOUR_METRICS_DTYPE = np.dtype([
+    ("area", np.float64),  # Signed like cv2.contourArea(oriented=True): negative for outer boundaries
+    ("perimeter", np.float64),  # Closed, as cv2.arcLength(contour, True)
+    ("x0", np.float64), ("y0", np.float64), ("x1", np.float64), ("y1", np.float64),  # Bounding box
+    ("points", np.int64),
+])
+# Contours drawn in the SVG, per layer: (minimum points, minimum area)
+SVG_LAYER_MINIMUMS = {'circle': (3, 0), 'edges': (2, 0), 'shapes': (3, 50)}
+SVG_LEGACY_MINIMUMS = (2, 0)  # --no-layers
+SVG_CLOSED_EDGE_MIN_PERIMETER = 20  # Stroke paths are only closed when very clearly a closed shape
+TILE_SIMPLIFY_MAX_EPSILON = 1.0  # Cap (px) on simplification, so page-sized contours keep their detail
+TILE_MAX_IMAGE_PIXELS = 1 << 30  # Tiled mode's decompression-bomb limit, in place of PIL's ~89 Mpx
+MAX_TILE_SIZE_PX = 8192  # Largest --tile-size; per-tile float buffers grow with its square
+MAX_TILE_OVERLAP_PX = 1024
+MAX_TILE_JOBS = 64
+
+# Bezier curve fitting (--curve-tolerance): replaces polyline runs with cubic curves
+DEFAULT_CURVE_TOLERANCE = 0.0  # Max distance (viewBox units) between contour points and the curve; 0 = off
+CURVE_CORNER_ANGLE_DEG = 60  # Turns sharper than this stay corners instead of being smoothed over
+CURVE_REPARAMETERIZE_ITERATIONS = 4
+
+# Path data encoding (--path-encoding, --precision)
+PATH_ENCODING_ABSOLUTE = "absolute"  # "M x,y L x,y ... Z", as always
+PATH_ENCODING_RELATIVE = "relative"  # Relative offsets, h/v shortcuts, implicit repeats, minimal separators
+DEFAULT_PATH_ENCODING = PATH_ENCODING_ABSOLUTE
+PATH_DECIMALS = 1  # Default decimal places for fractional coordinates (0.1 unit = 0.01 mm at the defaults)
+
+# Sprite sheet (--sprite): one <symbol> per icon, repeated paths shared through <use>
+SPRITE_SYMBOL_PREFIX = "icon-"
+SPRITE_SHARED_PATH_PREFIX = "path-"
+
+# Conversion cache: finished SVGs keyed on input bytes + output-affecting settings
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "png-svg-vectorizer")
+DEFAULT_CACHE_MAX_MB = 256
+CACHE_FORMAT_VERSION = 3  # Bump whenever the pipeline's output changes for the same settings
+CACHE_KEY_SETTINGS = (
+    "threshold", "size", "width", "height", "simplify", "smooth",
+    "stroke_width", "bronze_color", "preserve_layers", "compact", "edge_backend",
+    "tile_size", "tile_overlap", "curve_tolerance", "path_encoding", "precision", "writer",
+)
+
+# In-memory API (vectorize) and conversion service (--serve): every option and its default
+VECTORIZE_OPTIONS = {
+    "threshold": DEFAULT_THRESHOLD_VALUE,
+    "size": DEFAULT_TARGET_SIZE_PX,
+    "width": DEFAULT_REAL_WIDTH_MM,
+    "height": DEFAULT_REAL_HEIGHT_MM,
+    "simplify": DEFAULT_SIMPLIFY,
+    "smooth": DEFAULT_SMOOTH,
+    "stroke_width": DEFAULT_STROKE_WIDTH,
+    "bronze_color": DEFAULT_BRONZE_COLOR,
+    "preserve_layers": DEFAULT_PRESERVE_LAYERS,
+    "edge_backend": DEFAULT_EDGE_BACKEND,
+    "curve_tolerance": DEFAULT_CURVE_TOLERANCE,
+    "path_encoding": DEFAULT_PATH_ENCODING,
+    "precision": None,
+    "compact": False,
+    "tile_size": DEFAULT_TILE_SIZE,
+    "tile_overlap": DEFAULT_TILE_OVERLAP,
+    "tile_jobs": 1,
+    "layer_jobs": 1,
+}
+DEFAULT_SERVE_HOST = "127.0.0.1"  # Local only: the service has no authentication
+SERVE_MAX_UPLOAD_MB = 64
+
+# --- Stage Timing (--report) ---
+
+class StageTimer:
+    """Wall time and peak memory per pipeline stage, plus contour counts, for --report.
+
+    `stage(name)` times a block (repeated stages accumulate) and
+    `timed(name, iterable)` books the time spent pulling items to `name`.
+    On Linux the peak RSS is reset as each stage starts, so it is the
+    stage's own peak; elsewhere it is the peak so far. Stages may overlap
+    in threads (--layer-jobs). A disabled timer measures nothing.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = {}
+        self.contours = {}
+        self._timed_seconds = 0.0  # Total booked through timed(), to keep it out of enclosing stages
+        self._lock = threading.Lock()
+        self._running = 0  # Stages currently open, across threads
+        self.per_stage_memory = enabled and self._reset_peak_rss()
+
+    @staticmethod
+    def _reset_peak_rss():
+        """Restarts the kernel's peak-RSS counter (Linux only); False where that is not possible."""
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _peak_rss_mb():
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        try:
+            import resource  # Not available on Windows
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KiB elsewhere
+
+    def stage(self, name):
+        return self._measure(name) if self.enabled else contextlib.nullcontext()
+
+    @contextlib.contextmanager
+    def _measure(self, name):
+        with self._lock:
+            # A nested or concurrent stage must not clear the peak of the stage around it
+            if self.per_stage_memory and not self._running:
+                self._reset_peak_rss()
+            self._running += 1
+        timed_before = self._timed_seconds
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started - (self._timed_seconds - timed_before)
+            peak_mb = self._peak_rss_mb()
+            with self._lock:
+                self._running -= 1
+                record = self.stages.setdefault(name, {"seconds": 0.0, "peak_rss_mb": None})
+                record["seconds"] += seconds
+                if peak_mb is not None:
+                    record["peak_rss_mb"] = max(record["peak_rss_mb"] or 0.0, peak_mb)
+
+    def timed(self, name, iterable):
+        """Yields from `iterable`, booking the time spent producing each item to stage `name`."""
+        if not self.enabled:
+            yield from iterable
+            return
+        record = self.stages.setdefault(name, {"seconds": 0.0, "peak_rss_mb": None})
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds = time.perf_counter() - started
+                record["seconds"] += seconds
+                self._timed_seconds += seconds
+            yield item
+
+    def count_contours(self, when, layer, contours):
+        """Records the number of contours and points of one layer, e.g. ("before_simplify", "edges")."""
+        if self.enabled:
+            self.contours.setdefault(when, {})[layer] = {
+                "contours": len(contours),
+                "points": int(sum(len(contour) for contour in contours)),
+            }
+
+    def as_dict(self):
+        return {
+            "stages": {name: {"seconds": round(record["seconds"], 6),
+                              "peak_rss_mb": None if record["peak_rss_mb"] is None else round(record["peak_rss_mb"], 1)}
+                       for name, record in self.stages.items()},
+            "per_stage_memory": self.per_stage_memory,
+            "contours": self.contours,
+        }
+
 
 # --- Helper Functions ---
 
-def preprocess_image(input_path, target_size, threshold, preserve_layers=True):
-    """Prepares the image for vectorization: handles transparency, converts to B&W bitmap based on threshold."""
+def contour_path_data(contour, close=True):
+    """Builds SVG path data ("M x,y L x,y ... Z") for an OpenCV contour in one pass.
+
+    The contour's (N, 1, 2) point array is flattened once and formatted with a
+    single %-format call, rather than one f-string per point. Integer contours
+    (everything OpenCV returns) produce exactly the same text as formatting the
+    points one by one; fractional contours (tiled mode traces pixel edges, so
+    its points sit on half pixels) are written without trailing zeros.
+    """
+    points = np.asarray(contour).reshape(-1, 2)
+    if np.issubdtype(points.dtype, np.integer):
+        path_data = ("M %d,%d" + " L %d,%d" * (len(points) - 1)) % tuple(points.ravel().tolist())
+    else:
+        path_data = ("M %.8g,%.8g" + " L %.8g,%.8g" * (len(points) - 1)) % tuple(points.ravel().tolist())
+    return path_data + " Z" if close else path_data
+
+
+class PathEncoder:
+    """Turns contours and fitted curve segments into SVG path data.
+
+    The default absolute encoding writes exactly what contour_path_data
+    always has ("M x,y L x,y ... Z"). The relative encoding writes each
+    point as an offset from the previous one, uses h/v for horizontal and
+    vertical moves, leaves out repeated command letters and every separator
+    SVG does not need ("M10 20l3-4h5v-.5z"). `precision` is the number of
+    decimal places kept; by default integer contours stay exact and
+    fractional ones (fitted curves, tiled half pixels) keep PATH_DECIMALS.
+    Offsets are taken between already rounded absolute points, so rounding
+    never accumulates along a path. svgwrite's validator is stricter than
+    the SVG grammar (it rejects "10-5" and ".5"), so the svgwrite writer
+    asks for minimal_separators=False, which keeps a space between numbers
+    and the leading zero.
+    """
+
+    def __init__(self, encoding=PATH_ENCODING_ABSOLUTE, precision=None, minimal_separators=True):
+        self.relative = encoding == PATH_ENCODING_RELATIVE
+        self.precision = precision
+        self.minimal_separators = minimal_separators
+
+    def _decimals(self, points):
+        if self.precision is not None:
+            return self.precision
+        return 0 if np.issubdtype(np.asarray(points).dtype, np.integer) else PATH_DECIMALS
+
+    def path_data(self, contour, close=True):
+        """Drop-in replacement for contour_path_data."""
+        if not self.relative and self.precision is None:
+            return contour_path_data(contour, close)
+        points = np.asarray(contour).reshape(-1, 2)
+        decimals = self._decimals(points)
+        segments = [("L", point) for point in _quantize(points[1:], decimals)]
+        return self._encode(_quantize(points[:1], decimals)[0], segments, close, decimals)
+
+    def segments_path_data(self, start, segments, close=True):
+        """Path data for ("L", end) / ("C", c1, c2, end) segments starting at `start`."""
+        decimals = PATH_DECIMALS if self.precision is None else self.precision
+        quantized = [(segment[0],) + tuple(_quantize(np.asarray(segment[1:]), decimals)) for segment in segments]
+        return self._encode(_quantize(np.asarray([start]), decimals)[0], quantized, close, decimals)
+
+    def _encode(self, start, segments, close, decimals):
+        """Formats quantized (integer, scaled by 10**decimals) segments."""
+        if close and segments and segments[-1][0] == "L" and tuple(segments[-1][1]) == tuple(start):
+            segments = segments[:-1]  # The closing line is implied by Z
+        minimal = self.relative and self.minimal_separators
+        number = _number_formatter(decimals, leading_zero=not minimal)
+        if not self.relative:
+            def point_text(point):
+                return f"{number(point[0])},{number(point[1])}"
+            parts = [f"M {point_text(start)}"]
+            for segment in segments:
+                parts.append(f"{segment[0]} " + " ".join(point_text(point) for point in segment[1:]))
+            path_data = " ".join(parts)
+            return path_data + " Z" if close else path_data
+
+        out = ["M"]
+        previous = None  # Last number written since the last command letter
+        def write_number(value):
+            nonlocal previous
+            text = number(value)
+            # A separator is only needed where the next number could run into the previous one
+            if previous is not None and not (minimal and (text[0] == "-" or (text[0] == "." and "." in previous))):
+                out.append(" ")
+            out.append(text)
+            previous = text
+
+        x, y = int(start[0]), int(start[1])
+        write_number(x)
+        write_number(y)
+        command = "M"
+        for segment in segments:
+            end_x, end_y = int(segment[-1][0]), int(segment[-1][1])
+            dx, dy = end_x - x, end_y - y
+            if segment[0] == "C":
+                next_command = "c"
+                values = [int(segment[1][0]) - x, int(segment[1][1]) - y,
+                          int(segment[2][0]) - x, int(segment[2][1]) - y, dx, dy]
+            elif dx == 0 and dy == 0:
+                continue  # Collapsed onto the previous point by rounding
+            elif dy == 0:
+                next_command, values = "h", [dx]
+            elif dx == 0:
+                next_command, values = "v", [dy]
+            else:
+                next_command, values = "l", [dx, dy]
+            if next_command != command:
+                out.append(next_command)
+                command = next_command
+                previous = None
+            for value in values:
+                write_number(value)
+            x, y = end_x, end_y
+        if close:
+            out.append("z")
+        return "".join(out)
+
+
+def _quantize(points, decimals):
+    """Points as integers scaled by 10**decimals (rounded half to even, like round())."""
+    return np.rint(np.asarray(points, np.float64) * 10 ** decimals).astype(np.int64)
+
+
+def _number_formatter(decimals, leading_zero=True):
+    """Formats a quantized integer without trailing zeros: 15 -> "1.5", 20 -> "2", -5 -> "-0.5" (or "-.5")."""
+    if decimals == 0:
+        return str
+    scale = 10 ** decimals
+    def number(value):
+        sign = "-" if value < 0 else ""
+        whole, fraction = divmod(abs(value), scale)
+        if not fraction:
+            return f"{sign}{whole}"
+        fraction_text = f"{fraction:0{decimals}d}".rstrip("0")
+        return f"{sign}{whole if whole or leading_zero else ''}.{fraction_text}"
+    return number
+
+
+def has_transparency(img):
+    """True if a PIL image carries an alpha channel or a transparent palette entry."""
+    return img.mode == 'RGBA' or 'A' in img.info.get('transparency', ())
+
+
+def flatten_on_white(img):
+    """Flattens any transparency of a PIL image onto white. Returns an RGB PIL image."""
+    # Handle transparency: Create a white background
+    if has_transparency(img):
+        bg = Image.new("RGB", img.size, (255, 255, 255))
+        # Use alpha channel as mask (single band, rather than splitting all four)
+        bg.paste(img, mask=img.getchannel('A') if img.mode == 'RGBA' else img.convert('RGBA').getchannel('A'))
+        return bg
+    # If no alpha, ensure it's RGB first before grayscale
+    return img.convert("RGB")
+
+
+_pixel_limit_lock = threading.Lock()
+
+
+def open_image(source, max_pixels=None):
+    """Opens a path or binary file object with PIL; an already open PIL image is returned as is.
+
+    `max_pixels` replaces PIL's decompression-bomb limit for this one open
+    (PIL checks it only there). The global is restored straight after the
+    header is read, and every open goes through the same lock, so no other
+    open ever sees the raised limit.
+    """
+    if isinstance(source, Image.Image):
+        return source
+    with _pixel_limit_lock:
+        if max_pixels is None:
+            return Image.open(source)
+        default_limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = max_pixels
+        try:
+            return Image.open(source)
+        finally:
+            Image.MAX_IMAGE_PIXELS = default_limit
+
+
+def load_image_on_white(input_path, log=print):
+    """Decodes an image once and flattens any transparency onto white. Returns an RGB PIL image.
+
+    `input_path` may also be a file object or PIL image (see open_image).
+    Progress messages go to `log` (print by default).
+    """
+    img = open_image(input_path)
+    if has_transparency(img):
+        log("Handling transparency (placing on white background)...")
+    return flatten_on_white(img)
+
+
+def resize_for_processing(img, target_size):
+    """Resizes the flattened image to the square processing size."""
+    return img.resize((target_size, target_size), Image.Resampling.LANCZOS)
+
+
+def gray_array_for_processing(img, target_size):
+    """Resized grayscale pixels as a uint8 array, shared by the edge and threshold stages.
+
+    Converting to grayscale before the Lanczos resize resamples one channel
+    instead of three (about half the time); results differ from resizing
+    in RGB by at most a couple of levels on a fraction of a percent of pixels.
+    """
+    return np.asarray(resize_for_processing(img.convert('L'), target_size))
+
+
+def detect_edges(img_gray, backend=DEFAULT_EDGE_BACKEND):
+    """Canny edge map (0/255 uint8) of a grayscale image (array or PIL), used for the stroke layer."""
+    img_array = np.asarray(img_gray)
+    if backend == EDGE_BACKEND_OPENCV:
+        return _opencv_canny(img_array)
+    from skimage import feature  # Deferred: the import alone costs about a second
+    edges = feature.canny(img_array, sigma=CANNY_SIGMA).view(np.uint8)  # bool -> 0/1 without a copy
+    edges *= 255
+    return edges
+
+
+def _opencv_canny(img_array, sigma=CANNY_SIGMA, gradient_scale=8):
+    """OpenCV Canny set up to reproduce skimage.feature.canny(sigma=3).
+
+    skimage blurs in floating point with a Gaussian truncated at 4 sigma,
+    takes unnormalized Sobel gradients of the [0, 1] image and applies
+    hysteresis at 0.1/0.2 of full scale on the L2 magnitude. Here the same
+    blur runs in float32, the Sobel derivatives are fed to cv2.Canny as
+    int16 (scaled up by `gradient_scale` to keep sub-level precision) and
+    the thresholds are scaled to match; skimage also never marks the outer
+    one-pixel border. On the sample pictograms this agrees with skimage on
+    more than 99% of edge pixels within one pixel, about 10x faster.
+    """
+    radius = int(4 * sigma + 0.5)
+    blurred = cv2.GaussianBlur(img_array.astype(np.float32), (2 * radius + 1, 2 * radius + 1), sigma,
+                               borderType=cv2.BORDER_REPLICATE)
+    dx = cv2.Sobel(blurred, cv2.CV_32F, 1, 0, ksize=3, scale=gradient_scale)
+    dy = cv2.Sobel(blurred, cv2.CV_32F, 0, 1, ksize=3, scale=gradient_scale)
+    full_scale = 255 * gradient_scale
+    edges = cv2.Canny(np.rint(dx).astype(np.int16), np.rint(dy).astype(np.int16),
+                      CANNY_LOW * full_scale, CANNY_HIGH * full_scale, L2gradient=True)
+    edges[[0, -1], :] = 0
+    edges[:, [0, -1]] = 0
+    return edges
+
+
+def threshold_image(img_gray, threshold):
+    """Binary mask: pixels darker than threshold become black (0), others white (255).
+
+    One vectorized comparison into a single new uint8 array, instead of a
+    per-pixel Python callback and three array copies. The array is not
+    reused between calls: the sweep memoizes one mask per threshold.
+    """
+    img_array = np.asarray(img_gray)
+    mask = np.empty(img_array.shape, np.uint8)
+    np.greater_equal(img_array, threshold, out=mask.view(np.bool_))
+    mask *= 255
+    return mask
+
+
+def close_circle_mask(img_opencv_bw):
+    """Morphological close of the shape mask so the outer circle is complete (returns a new array)."""
+    # Apply a morphological operation to ensure the circle is complete
+    return cv2.morphologyEx(img_opencv_bw, cv2.MORPH_CLOSE, CIRCLE_CLOSE_KERNEL)
+
+
+def preprocess_image(input_path, target_size, threshold, preserve_layers=True, edge_backend=DEFAULT_EDGE_BACKEND,
+                     timer=None, layer_jobs=1, log=print):
+    """Prepares the image for vectorization: handles transparency, converts to B&W bitmap based on threshold.
+
+    `timer` (a StageTimer) times the decode, resize, canny and threshold stages.
+    With `layer_jobs` > 1 Canny runs in a second thread while the threshold
+    and circle masks are built, so those two stages overlap.
+    Progress and error messages go to `log`, called like print (file=sys.stderr for errors).
+    """
+    timer = timer or StageTimer()
     try:
-        print(f"Preprocessing image: {input_path}")
-        img = Image.open(input_path)
-        original_img = img.copy()
-
-        # Handle transparency: Create a white background
-        if img.mode == 'RGBA' or 'A' in img.info.get('transparency', ()):
-            print("Handling transparency (placing on white background)...")
-            bg = Image.new("RGB", img.size, (255, 255, 255))
-            try:
-                # Use alpha channel as mask
-                bg.paste(img, mask=img.split()[3]) # Assumes alpha is the 4th channel
-            except IndexError:
-                 # Fallback if no alpha channel after check (should not happen often with check)
-                 bg.paste(img, mask=img.convert('RGBA').split()[3])
-            img = bg
-        else:
-            # If no alpha, ensure it's RGB first before grayscale
-            img = img.convert("RGB")
+        log(f"Preprocessing image: {input_path}")
+        with timer.stage("decode"):
+            img = load_image_on_white(input_path, log)
         
-        # Resize image for processing
-        img_resized = img.resize((target_size, target_size), Image.Resampling.LANCZOS)
+        # Resize and convert to grayscale once; both layouts work from this one array
+        with timer.stage("resize"):
+            img_gray = gray_array_for_processing(img, target_size)
+        del img  # Full-resolution pixels are no longer needed
         
         if preserve_layers:
             # For layered processing, we'll create multiple representations
-            # Convert to Grayscale for edge detection
-            img_gray = img_resized.convert('L')
-            img_array = np.array(img_gray)
+            def edge_layer():
+                # Detect edges using Canny
+                with timer.stage("canny"):
+                    return detect_edges(img_gray, edge_backend)
             
-            # Detect edges using Canny
-            edges = feature.canny(img_array, sigma=3)
-            edges_uint8 = np.uint8(edges) * 255
-            
-            # Create binary mask for the main shapes (for fills)
-            # Pixels darker than threshold become black (0), others white (255)
-            img_bw = img_gray.point(lambda p: 0 if p < threshold else 255, '1')
-            img_array_bw = np.array(img_bw)
-            img_opencv_bw = np.uint8(img_array_bw) * 255
-            
-            # Detect the outer circle for background
-            img_circle = img_opencv_bw.copy()
-            # Apply a morphological operation to ensure the circle is complete
-            kernel = np.ones((5,5), np.uint8)
-            img_circle = cv2.morphologyEx(img_circle, cv2.MORPH_CLOSE, kernel)
+            # Both layers only read img_gray, so Canny can run alongside the masks
+            with ThreadPoolExecutor(max_workers=1) if layer_jobs > 1 else contextlib.nullcontext() as pool:
+                edges_job = pool.submit(edge_layer) if pool else None
+                
+                with timer.stage("threshold"):
+                    # Create binary mask for the main shapes (for fills)
+                    img_opencv_bw = threshold_image(img_gray, threshold)
+                    
+                    # Detect the outer circle for background
+                    img_circle = close_circle_mask(img_opencv_bw)
+                
+                edges_uint8 = edges_job.result() if edges_job else edge_layer()
             
-            print("Multi-layer image preprocessing completed.")
+            log("Multi-layer image preprocessing completed.")
             return {
                 'edges': edges_uint8,
                 'shapes': img_opencv_bw,
                 'circle': img_circle,
-                'original': np.array(img_resized)
             }, True
         else:
             # Original binary processing for backward compatibility
-            # Convert to Grayscale
-            print("Converting to grayscale...")
-            img_gray = img_resized.convert('L')
-
             # Apply threshold to make it black and white
-            print(f"Applying threshold (value: {threshold}). Pixels < {threshold} become black.")
-            img_bw = img_gray.point(lambda p: 0 if p < threshold else 255, '1')
-            img_array_bw = np.array(img_bw)
-            img_opencv_bw = np.uint8(img_array_bw) * 255
+            log(f"Applying threshold (value: {threshold}). Pixels < {threshold} become black.")
+            with timer.stage("threshold"):
+                img_opencv_bw = threshold_image(img_gray, threshold)
             
-            print("Image preprocessing completed.")
+            log("Image preprocessing completed.")
             return img_opencv_bw, True
 
     except FileNotFoundError:
-        print(f"ERROR: Input file not found: {input_path}", file=sys.stderr)
+        log(f"ERROR: Input file not found: {input_path}", file=sys.stderr)
         return None, False
     except Exception as e:
-        print(f"ERROR during image preprocessing: {e}", file=sys.stderr)
+        log(f"ERROR during image preprocessing: {e}", file=sys.stderr)
         # import traceback
         # traceback.print_exc() # Uncomment for detailed debugging
         return None, False
 
 
-def detect_contours(image_data, simplify=True, smooth=False, preserve_layers=True):
-    """Detect contours in the preprocessed image data."""
-    print("Detecting contours...")
+def default_layer_jobs():
+    """Threads for --layer-jobs 0: one per layer, but no more than there are CPU cores."""
+    return min(LAYER_COUNT, os.cpu_count() or 1)
+
+
+def contour_metrics(contours):
+    """Table of signed area, perimeter, bounding box and point count for every contour (CONTOUR_METRICS_DTYPE).
+
+    Each layer's table is computed once and every later filtering and
+    sorting decision reads from it: the largest circle, the simplification
+    tolerance, the minimum area/point filters and the compound-path
+    grouping. Areas and boxes come from one set of array operations over
+    all contours, as in loop_geometry; perimeters stay with cv2.arcLength,
+    so simplification tolerances are unchanged to the last bit.
+    """
+    table = np.zeros(len(contours), CONTOUR_METRICS_DTYPE)
+    lengths = np.fromiter(map(len, contours), np.int64, len(contours))
+    table["points"] = lengths
+    filled = np.flatnonzero(lengths)
+    if not len(filled):
+        return table
+    table["perimeter"][filled] = [cv2.arcLength(contours[i], True) for i in filled]
+    points = np.concatenate([np.asarray(contours[i]).reshape(-1, 2) for i in filled]).astype(np.float64)
+    loop_ends = np.cumsum(lengths[filled])
+    loop_begins = loop_ends - lengths[filled]
+    following = np.arange(1, len(points) + 1)
+    following[loop_ends - 1] = loop_begins
+    x, y = points[:, 0], points[:, 1]
+    table["area"][filled] = np.add.reduceat(x * y[following] - x[following] * y, loop_begins) / 2
+    table["x0"][filled] = np.minimum.reduceat(x, loop_begins)
+    table["y0"][filled] = np.minimum.reduceat(y, loop_begins)
+    table["x1"][filled] = np.maximum.reduceat(x, loop_begins)
+    table["y1"][filled] = np.maximum.reduceat(y, loop_begins)
+    return table
+
+
+def contour_mask(metrics, min_points=0, min_area=0):
+    """Vectorized filter over a contour_metrics table: True where a contour has enough points and area."""
+    return (metrics["points"] >= min_points) & (np.abs(metrics["area"]) >= min_area)
+
+
+def _find_layer_contours(mask, mode):
+    """findContours on the inverted layer mask; returns (contours, hierarchy, metrics)."""
+    contours, hierarchy = cv2.findContours(cv2.bitwise_not(mask), mode, cv2.CHAIN_APPROX_SIMPLE)
+    return contours, hierarchy, contour_metrics(contours)
+
+
+def _simplify_layer_contours(contours, metrics, min_points=0):
+    """approxPolyDP at 0.1% of each contour's perimeter, dropping contours of fewer than min_points points."""
+    return [cv2.approxPolyDP(contours[i], 0.001 * metrics["perimeter"][i], True)
+            for i in np.flatnonzero(contour_mask(metrics, min_points))]
+
+
+def detect_contours(image_data, simplify=True, smooth=False, preserve_layers=True, timer=None, layer_jobs=1, log=print):
+    """Detect contours in the preprocessed image data.
+
+    `timer` (a StageTimer) times the find_contours, simplify, smooth and
+    metrics stages and records contour/point counts before and after
+    simplification. Layered results carry each layer's final
+    contour_metrics table under 'metrics' for the SVG stage.
+    With `layer_jobs` > 1 the edges, circle and shapes layers are traced and
+    simplified in that many threads (OpenCV releases the GIL); the result is
+    the same as tracing them one after the other. Messages go to `log`, as
+    in preprocess_image.
+    """
+    timer = timer or StageTimer()
+    log("Detecting contours...")
     
     if preserve_layers:
         # Handle multi-layer approach
         result = {}
         
-        # Process edges for strokes
-        edges = image_data['edges']
-        inverted_edges = cv2.bitwise_not(edges)
-        edge_contours, _ = cv2.findContours(inverted_edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Process background circle
-        circle_img = image_data['circle']
-        inverted_circle = cv2.bitwise_not(circle_img)
-        circle_contours, _ = cv2.findContours(inverted_circle, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Find largest contour which should be the outer circle
-        if circle_contours:
-            max_contour = max(circle_contours, key=cv2.contourArea)
-            # Only keep the largest contour
-            circle_contours = [max_contour]
-        
-        # Process shapes for internal details
-        shapes = image_data['shapes']
-        inverted_shapes = cv2.bitwise_not(shapes)
-        shape_contours, shape_hierarchy = cv2.findContours(inverted_shapes, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Apply simplification if requested
-        if simplify:
-            processed_edge_contours = []
-            for contour in edge_contours:
-                if len(contour) < 5:  # Skip very small contours
-                    continue
-                epsilon = 0.001 * cv2.arcLength(contour, True)
-                simplified = cv2.approxPolyDP(contour, epsilon, True)
-                processed_edge_contours.append(simplified)
-            
-            processed_circle_contours = []
-            for contour in circle_contours:
-                epsilon = 0.001 * cv2.arcLength(contour, True)
-                simplified = cv2.approxPolyDP(contour, epsilon, True)
-                processed_circle_contours.append(simplified)
+        # Edges for strokes, background circle, shapes for internal details
+        masks = [image_data['edges'], image_data['circle'], image_data['shapes']]
+        modes = [cv2.RETR_EXTERNAL, cv2.RETR_EXTERNAL, cv2.RETR_TREE]
+        with ThreadPoolExecutor(max_workers=layer_jobs) if layer_jobs > 1 else contextlib.nullcontext() as pool:
+            run = pool.map if pool else map
+            with timer.stage("find_contours"):
+                ((edge_contours, _, edge_metrics), (circle_contours, _, circle_metrics),
+                 (shape_contours, shape_hierarchy, shape_metrics)) = run(_find_layer_contours, masks, modes)
                 
-            processed_shape_contours = []
-            for contour in shape_contours:
-                epsilon = 0.001 * cv2.arcLength(contour, True)
-                simplified = cv2.approxPolyDP(contour, epsilon, True)
-                processed_shape_contours.append(simplified)
-        else:
-            processed_edge_contours = edge_contours
-            processed_circle_contours = circle_contours
-            processed_shape_contours = shape_contours
+                # Find largest contour which should be the outer circle
+                if circle_contours:
+                    largest = int(np.argmax(np.abs(circle_metrics["area"])))
+                    # Only keep the largest contour
+                    circle_contours = [circle_contours[largest]]
+                    circle_metrics = circle_metrics[largest:largest + 1]
+            for layer, contours in (("edges", edge_contours), ("circle", circle_contours), ("shapes", shape_contours)):
+                timer.count_contours("before_simplify", layer, contours)
+            
+            # Apply simplification if requested
+            with timer.stage("simplify"):
+                if simplify:
+                    processed_edge_contours, processed_circle_contours, processed_shape_contours = run(
+                        _simplify_layer_contours, [edge_contours, circle_contours, shape_contours],
+                        [edge_metrics, circle_metrics, shape_metrics], [5, 0, 0])
+                else:
+                    processed_edge_contours = edge_contours
+                    processed_circle_contours = circle_contours
+                    processed_shape_contours = shape_contours
         
         # Apply smoothing if requested
         if smooth:
-            # Apply smoothing to each set of contours
-            for contour_set in [processed_edge_contours, processed_circle_contours, processed_shape_contours]:
-                for i, contour in enumerate(contour_set):
-                    if len(contour) > 5:
-                        try:
-                            contour_float = np.float32(contour)
-                            smoothed = cv2.GaussianBlur(contour_float, (3, 3), 0)
-                            contour_set[i] = np.int32(smoothed)
-                        except Exception as e:
-                            print(f"Warning: Could not smooth contour: {e}", file=sys.stderr)
+            with timer.stage("smooth"):
+                # Apply smoothing to each set of contours
+                for contour_set in [processed_edge_contours, processed_circle_contours, processed_shape_contours]:
+                    for i, contour in enumerate(contour_set):
+                        if len(contour) > 5:
+                            try:
+                                contour_float = np.float32(contour)
+                                smoothed = cv2.GaussianBlur(contour_float, (3, 3), 0)
+                                contour_set[i] = np.int32(smoothed)
+                            except Exception as e:
+                                log(f"Warning: Could not smooth contour: {e}", file=sys.stderr)
+        for layer, contours in (("edges", processed_edge_contours), ("circle", processed_circle_contours),
+                                ("shapes", processed_shape_contours)):
+            timer.count_contours("after_simplify", layer, contours)
         
         result['edges'] = processed_edge_contours
         result['circle'] = processed_circle_contours
         result['shapes'] = processed_shape_contours
         result['shape_hierarchy'] = shape_hierarchy
+        if simplify or smooth:
+            # The contours changed, so their tables are measured again, once
+            with timer.stage("metrics"):
+                result['metrics'] = {layer: contour_metrics(result[layer]) for layer in ('edges', 'circle', 'shapes')}
+        else:
+            result['metrics'] = {'edges': edge_metrics, 'circle': circle_metrics, 'shapes': shape_metrics}
         
-        print(f"Processed contours: {len(processed_edge_contours)} edges, {len(processed_circle_contours)} circle, {len(processed_shape_contours)} shapes")
+        log(f"Processed contours: {len(processed_edge_contours)} edges, {len(processed_circle_contours)} circle, {len(processed_shape_contours)} shapes")
         return result, True
     else:
         # Original contour detection for backward compatibility
-        inverted_bw = cv2.bitwise_not(image_data)
-        contours, hierarchy = cv2.findContours(inverted_bw, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        with timer.stage("find_contours"):
+            inverted_bw = cv2.bitwise_not(image_data)
+            contours, hierarchy = cv2.findContours(inverted_bw, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        timer.count_contours("before_simplify", "shapes", contours)
         
-        print(f"Found {len(contours)} raw contours.")
+        log(f"Found {len(contours)} raw contours.")
+        metrics = contour_metrics(contours)
 
         # Ensure hierarchy is returned correctly (it's a numpy array wrapper)
         if hierarchy is None:
-            print("No contours found or hierarchy is None.")
+            log("No contours found or hierarchy is None.")
             return [], None
         else:
             hierarchy = hierarchy[0]
 
         processed_contours = []
-        valid_hierarchy = []
+        kept_indices = []
 
         # Filter out tiny contours and process valid ones
-        min_contour_area = 5
-        for i, contour in enumerate(contours):
-            area = cv2.contourArea(contour)
-            if area < min_contour_area:
-                continue
+        with timer.stage("simplify"):
+            min_contour_area = 5
+            for i in np.flatnonzero(contour_mask(metrics, min_area=min_contour_area)):
+                processed_contour = contours[i]
 
-            processed_contour = contour
+                # Simplify contours (reduce number of points)
+                if simplify:
+                    epsilon = 0.001 * metrics["perimeter"][i]
+                    processed_contour = cv2.approxPolyDP(processed_contour, epsilon, True)
 
-            # Simplify contours (reduce number of points)
-            if simplify:
-                epsilon = 0.001 * cv2.arcLength(processed_contour, True)
-                processed_contour = cv2.approxPolyDP(processed_contour, epsilon, True)
+                # Smooth contours (optional)
+                if smooth and len(processed_contour) > 5:
+                    try:
+                        processed_contour_float = np.float32(processed_contour)
+                        smoothed_contour_float = cv2.GaussianBlur(processed_contour_float, (3, 3), 0)
+                        processed_contour = np.int32(smoothed_contour_float)
+                    except Exception as smooth_err:
+                        log(f"Warning: Could not smooth contour {i}: {smooth_err}", file=sys.stderr)
 
-            # Smooth contours (optional)
-            if smooth and len(processed_contour) > 5:
-                try:
-                    processed_contour_float = np.float32(processed_contour)
-                    smoothed_contour_float = cv2.GaussianBlur(processed_contour_float, (3, 3), 0)
-                    processed_contour = np.int32(smoothed_contour_float)
-                except Exception as smooth_err:
-                    print(f"Warning: Could not smooth contour {i}: {smooth_err}", file=sys.stderr)
-
-            # Check if contour is still valid after processing
-            if len(processed_contour) >= 2:
-                processed_contours.append(processed_contour)
-                valid_hierarchy.append(hierarchy[i])
-            else:
-                print(f"  Skipping contour {i} after processing (too few points).")
+                # Check if contour is still valid after processing
+                if len(processed_contour) >= 2:
+                    processed_contours.append(processed_contour)
+                    kept_indices.append(i)
+                else:
+                    log(f"  Skipping contour {i} after processing (too few points).")
+        timer.count_contours("after_simplify", "shapes", processed_contours)
 
-        print(f"Processed {len(processed_contours)} contours after filtering/simplification.")
-        final_hierarchy = np.array(valid_hierarchy) if valid_hierarchy else None
+        log(f"Processed {len(processed_contours)} contours after filtering/simplification.")
+        final_hierarchy = filtered_hierarchy(hierarchy, kept_indices) if kept_indices else None
         return processed_contours, final_hierarchy
 
 
+def filtered_hierarchy(hierarchy, kept):
+    """RETR_TREE hierarchy rows for the contours `kept` (original indices, in order), renumbered to their new positions.
+
+    Links to contours that were left out become -1, except the parent: it
+    is the nearest ancestor that was kept, so holes still find their outer
+    boundary.
+    """
+    position = np.full(len(hierarchy), -1)
+    position[kept] = np.arange(len(kept))
+    rows = hierarchy[kept].copy()
+    for column in range(3):  # next, previous, first child
+        rows[:, column] = np.where(rows[:, column] >= 0, position[rows[:, column]], -1)
+    parents = hierarchy[:, 3]
+    for row, i in enumerate(kept):
+        parent = parents[i]
+        while parent >= 0 and position[parent] < 0:
+            parent = parents[parent]
+        rows[row, 3] = position[parent] if parent >= 0 else -1
+    return rows
+
+
+# --- Bezier Curve Fitting ---
+
+class CurveFitter:
+    """Replaces contour polylines with cubic Bezier curves within a distance tolerance.
+
+    Each contour is cut at its corners (turns sharper than
+    CURVE_CORNER_ANGLE_DEG) and every run between corners is fitted with as
+    few cubics as keep all of its points within `tolerance` viewBox units of
+    the curve: a least-squares fit with Newton-Raphson reparameterization,
+    split at the worst point when it misses (Schneider, "An Algorithm for
+    Automatically Fitting Digitized Curves", Graphics Gems 1990). Runs that
+    come out straight are written as plain lines, and a contour whose curves
+    would take more text than its polyline keeps the polyline. `path_data` is
+    a drop-in replacement for contour_path_data (written with `encoder`) and
+    keeps node/byte counts of both forms for the per-file report.
+    """
+
+    def __init__(self, tolerance, encoder=None):
+        self.tolerance = tolerance
+        self.encoder = encoder or PathEncoder()
+        self.corner_cos = np.cos(np.radians(CURVE_CORNER_ANGLE_DEG))
+        self.nodes_before = self.nodes_after = 0
+        self.bytes_before = self.bytes_after = 0
+
+    def path_data(self, contour, close=True):
+        polyline = self.encoder.path_data(contour, close)
+        points = np.asarray(contour, np.float64).reshape(-1, 2)
+        # Repeated points have no direction and would break the tangents
+        keep = np.ones(len(points), bool)
+        keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+        if close and len(points) > 1:
+            keep[-1] &= bool(np.any(points[-1] != points[0]))
+        points = points[keep]
+        if len(points) < 3:
+            path_data = polyline
+            node_count = len(points)
+        else:
+            start, segments = self.fit_closed(points) if close else (points[0], self.fit_run(points))
+            path_data = self.encoder.segments_path_data(start, segments, close)
+            node_count = len(segments) + 1 - (close and segments[-1][0] == "L")  # A closing line is left to Z
+            if len(path_data) >= len(polyline):  # Short or jagged contours can come out longer as curves
+                path_data, node_count = polyline, len(contour)
+        self.nodes_before += len(contour)
+        self.nodes_after += node_count
+        self.bytes_before += len(polyline)
+        self.bytes_after += len(path_data)
+        return path_data
+
+    def fit_closed(self, points):
+        """Fits a closed contour: run by run between corners, or all the way round if it has none.
+
+        Returns (start point, segments); a contour with corners starts at its first corner.
+        """
+        incoming = points - np.roll(points, 1, axis=0)
+        outgoing = np.roll(points, -1, axis=0) - points
+        cos_turn = np.einsum("ij,ij->i", incoming, outgoing) / (
+            np.linalg.norm(incoming, axis=1) * np.linalg.norm(outgoing, axis=1))
+        corners = np.flatnonzero(cos_turn < self.corner_cos)
+        if not len(corners):
+            loop = np.vstack([points, points[:1]])
+            tangent = _unit(points[1] - points[-1])  # Smooth through the start point
+            return points[0], self.fit_run(loop, tangent, -tangent)
+        # Start at the first corner so that every run ends on one
+        start = corners[0]
+        loop = np.vstack([points[start:], points[:start + 1]])
+        cuts = np.append(corners - start, len(points))
+        segments = []
+        for run_start, run_end in zip(cuts[:-1], cuts[1:]):
+            segments.extend(self.fit_run(loop[run_start:run_end + 1]))
+        return loop[0], segments
+
+    def fit_run(self, points, left_tangent=None, right_tangent=None):
+        """Fits one corner-free run of points; returns ("L", end) and ("C", c1, c2, end) segments."""
+        if left_tangent is None:
+            left_tangent = _unit(points[1] - points[0])
+        if right_tangent is None:
+            right_tangent = _unit(points[-2] - points[-1])
+        segments = []
+        pending = [(points, left_tangent, right_tangent)]  # Explicit stack: long contours can split deeply
+        while pending:
+            run, run_left, run_right = pending.pop()
+            if _is_straight(run, self.tolerance):
+                segments.append(("L", run[-1]))
+                continue
+            u = _chord_length_parameters(run)
+            bezier = _least_squares_bezier(run, u, run_left, run_right)
+            error, split = _max_bezier_error(run, bezier, u)
+            if self.tolerance ** 2 < error <= (4 * self.tolerance) ** 2:
+                # Close miss: improving the parameterization is cheaper than splitting
+                for _ in range(CURVE_REPARAMETERIZE_ITERATIONS):
+                    u = _newton_reparameterize(bezier, run, u)
+                    bezier = _least_squares_bezier(run, u, run_left, run_right)
+                    error, split = _max_bezier_error(run, bezier, u)
+                    if error <= self.tolerance ** 2:
+                        break
+            if error <= self.tolerance ** 2:
+                segments.append(("C", bezier[1], bezier[2], run[-1]))
+                continue
+            # Split at the worst point, keeping the curve smooth across it (second half pushed first)
+            center_tangent = _unit(run[split - 1] - run[split + 1])
+            pending.append((run[split:], -center_tangent, run_right))
+            pending.append((run[:split + 1], run_left, center_tangent))
+        return segments
+
+    def summary(self):
+        """One-line node/byte comparison of the fitted curves against plain polylines."""
+        def change(before, after):
+            return f"{before:,} -> {after:,} ({(after - before) / before:+.1%})" if before else f"{before:,} -> {after:,}"
+        return (f"Curve fitting (tolerance {self.tolerance}): nodes {change(self.nodes_before, self.nodes_after)}, "
+                f"path data bytes {change(self.bytes_before, self.bytes_after)}")
+
+
+def path_data_for_args(args):
+    """(path_data callable, CurveFitter or None) for the encoding and curve options in `args`."""
+    encoder = PathEncoder(args.path_encoding, args.precision, minimal_separators=args.writer == SVG_WRITER_STREAM)
+    if args.curve_tolerance > 0:
+        curve_fitter = CurveFitter(args.curve_tolerance, encoder)
+        return curve_fitter.path_data, curve_fitter
+    return encoder.path_data, None
+
+
+def _unit(vector):
+    length = np.hypot(vector[0], vector[1])
+    return vector / length if length else vector
+
+
+def _chord_length_parameters(points):
+    distances = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(points, axis=0).T))])
+    return distances / distances[-1]
+
+
+def _bernstein(u):
+    """Cubic Bernstein basis, one row per parameter."""
+    v = 1 - u
+    basis = np.empty((len(u), 4))
+    basis[:, 0] = v * v * v
+    basis[:, 1] = 3 * u * v * v
+    basis[:, 2] = 3 * u * u * v
+    basis[:, 3] = u * u * u
+    return basis
+
+
+def _least_squares_bezier(points, u, left_tangent, right_tangent):
+    """Control points with the given end tangents that best fit `points` at parameters `u`."""
+    first, last = points[0], points[-1]
+    basis = _bernstein(u)
+    b1, b2 = basis[:, 1], basis[:, 2]
+    residual = points - (basis[:, 0] + b1)[:, None] * first - (b2 + basis[:, 3])[:, None] * last
+    # Normal equations; with unit tangents the A.A products reduce to products of the basis functions
+    c00, c01, c11 = b1 @ b1, (b1 @ b2) * float(left_tangent @ right_tangent), b2 @ b2
+    x0, x1 = b1 @ (residual @ left_tangent), b2 @ (residual @ right_tangent)
+    determinant = c00 * c11 - c01 * c01
+    segment_length = np.hypot(*(last - first))
+    alpha_left = alpha_right = 0.0
+    if determinant:
+        alpha_left = (x0 * c11 - x1 * c01) / determinant
+        alpha_right = (c00 * x1 - c01 * x0) / determinant
+    chord = last - first
+    if (alpha_left < 1e-6 * segment_length or alpha_right < 1e-6 * segment_length
+            or alpha_left * (left_tangent @ chord) - alpha_right * (right_tangent @ chord) > segment_length ** 2):
+        # Degenerate fit (handles vanishing, or crossing over each other along the chord):
+        # fall back to the usual one-third tangent handles
+        alpha_left = alpha_right = segment_length / 3
+    return np.array([first, first + alpha_left * left_tangent, last + alpha_right * right_tangent, last])
+
+
+def _evaluate_bezier(control, u):
+    return _bernstein(u) @ control
+
+
+def _max_bezier_error(points, bezier, u):
+    """(largest squared distance, index of the point to split at) between the points and the curve.
+
+    Midpoints of the polyline's segments are checked too (against the curve
+    halfway between their ends' parameters), so a curve cannot bulge or loop
+    between two sparse points that it passes through exactly.
+    """
+    offsets = _evaluate_bezier(bezier, u) - points
+    squared = np.einsum("ij,ij->i", offsets, offsets)
+    offsets_mid = _evaluate_bezier(bezier, (u[1:] + u[:-1]) / 2) - (points[1:] + points[:-1]) / 2
+    squared_mid = np.einsum("ij,ij->i", offsets_mid, offsets_mid)
+    split = int(np.argmax(squared[1:-1])) + 1
+    worst_mid = int(np.argmax(squared_mid))
+    if squared_mid[worst_mid] > squared[split]:
+        # Split at whichever end of that segment is an interior point
+        return float(squared_mid[worst_mid]), min(max(worst_mid, 1), len(points) - 2)
+    return float(squared[split]), split
+
+
+def _newton_reparameterize(bezier, points, u):
+    """One Newton-Raphson step per point towards its closest point on the curve."""
+    offset = _evaluate_bezier(bezier, u) - points
+    d1 = 3 * (bezier[1:] - bezier[:-1])
+    d2 = 2 * (d1[1:] - d1[:-1])
+    v = (1 - u)[:, None]
+    w = u[:, None]
+    first_derivative = v * v * d1[0] + 2 * w * v * d1[1] + w * w * d1[2]
+    second_derivative = v * d2[0] + w * d2[1]
+    numerator = np.einsum("ij,ij->i", offset, first_derivative)
+    denominator = (np.einsum("ij,ij->i", first_derivative, first_derivative)
+                   + np.einsum("ij,ij->i", offset, second_derivative))
+    step = np.divide(numerator, denominator, out=np.zeros_like(u), where=denominator != 0)
+    return np.clip(u - step, 0.0, 1.0)
+
+
+def _is_straight(points, tolerance):
+    """True if every point lies within `tolerance` of the straight line between the run's ends."""
+    chord = points[-1] - points[0]
+    length = np.hypot(*chord)
+    offsets = points[1:-1] - points[0]
+    if not length:
+        return bool(np.all(np.hypot(offsets[:, 0], offsets[:, 1]) <= tolerance))
+    distances = np.abs(offsets[:, 0] * chord[1] - offsets[:, 1] * chord[0]) / length
+    return bool(np.all(distances <= tolerance))
+
+
+def compound_shape_groups(contours, hierarchy=None, keep=None, metrics=None):
+    """Groups contours into compound paths: [outer, hole, hole, ...] index lists, in drawing order.
+
+    With an OpenCV RETR_TREE `hierarchy` each contour's parent is read from
+    it and even depths are outer boundaries. Without one (tiled mode traces
+    no hierarchy) outer boundaries are told apart by orientation, as
+    findContours and the tiled tracer both wind them the opposite way to
+    holes, and each hole's parent is the smallest outer boundary that
+    contains it. `keep[i]` False leaves contour i out; a hole whose outer
+    boundary is left out is drawn on its own, as it always was. `metrics` is
+    the contours' contour_metrics table, computed here if not given.
+    """
+    count = len(contours)
+    keep = np.ones(count, bool) if keep is None else np.asarray(keep, bool)
+    parents = np.full(count, -1)
+    if hierarchy is not None and count:
+        tree_parents = np.asarray(hierarchy).reshape(-1, 4)[:, 3]
+        is_hole = np.zeros(count, bool)
+        for i in range(count):
+            depth, parent = 0, tree_parents[i]
+            while parent >= 0:
+                depth, parent = depth + 1, tree_parents[parent]
+            is_hole[i] = depth % 2 == 1
+        parents[is_hole] = tree_parents[is_hole]
+    else:
+        metrics = contour_metrics(contours) if metrics is None else metrics
+        areas = metrics["area"]
+        is_hole = areas > 0  # Outer boundaries have negative oriented area in image coordinates
+        outers = np.flatnonzero(~is_hole & keep)
+        outers = outers[np.argsort(-areas[outers], kind="stable")]  # Smallest first
+        boxes = metrics[outers]
+        for hole in np.flatnonzero(is_hole & keep):
+            box = metrics[hole]
+            inside = ((boxes["x0"] <= box["x0"]) & (boxes["y0"] <= box["y0"]) & (boxes["x1"] >= box["x1"])
+                      & (boxes["y1"] >= box["y1"]) & (-areas[outers] > areas[hole]))
+            point = tuple(float(v) for v in np.asarray(contours[hole]).reshape(-1, 2)[0])
+            for outer in outers[inside]:
+                if cv2.pointPolygonTest(contours[outer], point, False) >= 0:
+                    parents[hole] = outer
+                    break
+
+    groups = {}
+    for i in np.flatnonzero(keep):
+        parent = parents[i]
+        if is_hole[i] and parent >= 0 and keep[parent]:
+            groups.setdefault(parent, [parent]).append(i)
+        else:
+            groups.setdefault(i, [i])
+    return [groups[head] for head in sorted(groups)]
+
+
+def iter_svg_elements(contours_data, stroke_width=DEFAULT_STROKE_WIDTH, bronze_color=DEFAULT_BRONZE_COLOR,
+                      preserve_layers=True, path_data=contour_path_data, hierarchy=None):
+    """Yields the SVG body as a flat sequence of element events.
+
+    Events are ("group", attrs) to open a <g>, ("path", attrs) for a <path>
+    and ("end", None) to close the innermost group; attribute names are the
+    final SVG names. Both writer backends consume this, so the layer rules
+    (which contours are kept, closed and how they are styled) live in one place.
+    `path_data(contour, close)` builds each "d" attribute (CurveFitter.path_data
+    swaps polylines for Bezier curves). Styling is set once on each layer's
+    group and inherited, and each shape is one evenodd compound path of its
+    outer boundary and holes (see compound_shape_groups), so holes render
+    as holes and the element count drops. Which contours are drawn is decided
+    up front for each whole layer from its contour_metrics table
+    (contours_data['metrics'], computed here if missing). In legacy mode
+    `hierarchy` is the contour hierarchy detect_contours returned with the
+    list, used for the compound paths as in layered mode.
+    """
+    if preserve_layers:
+        metrics = contours_data.get('metrics') or {
+            layer: contour_metrics(contours_data[layer]) for layer in SVG_LAYER_MINIMUMS}
+        drawn = {layer: contour_mask(metrics[layer], *minimums) for layer, minimums in SVG_LAYER_MINIMUMS.items()}
+
+        # Create background layer: the circle gets a white fill and bronze stroke
+        yield "group", {
+            "id": "background",
+            "fill": "white",
+            "stroke": bronze_color,
+            "stroke-width": stroke_width
+        }
+        
+        # Add the circle background
+        for i in np.flatnonzero(drawn['circle']):
+            yield "path", {"d": path_data(contours_data['circle'][i])}
+        yield "end", None
+        
+        # Create foreground layer for the character lines (bronze stroked paths)
+        yield "group", {
+            "id": "foreground",
+            "fill": "none",
+            "stroke": bronze_color,
+            "stroke-width": stroke_width,
+            "stroke-linejoin": "round",
+            "stroke-linecap": "round"
+        }
+        
+        # Add edge contours as bronze stroked paths
+        # Don't close path for lines unless it's very clearly a closed shape
+        closed_edges = metrics['edges']["perimeter"] > SVG_CLOSED_EDGE_MIN_PERIMETER
+        for i in np.flatnonzero(drawn['edges']):
+            yield "path", {"d": path_data(contours_data['edges'][i], close=bool(closed_edges[i]))}
+        
+        # Add shape details if needed: white fill, bronze stroke inherited from the foreground
+        yield "group", {
+            "id": "details",
+            "fill": "white",
+            "fill-rule": "evenodd",
+            "stroke-width": stroke_width * 0.75,  # Slightly thinner lines for details
+            "stroke-linejoin": "miter"  # Details were never round-joined
+        }
+        
+        shape_contours = contours_data['shapes']
+        for group in compound_shape_groups(shape_contours, contours_data.get('shape_hierarchy'), drawn['shapes'],
+                                           metrics['shapes']):
+            yield "path", {"d": " ".join(path_data(shape_contours[i]) for i in group)}
+        yield "end", None  # details
+        yield "end", None  # foreground
+            
+    else:
+        # Original SVG creation for backward compatibility
+        yield "group", {
+            "fill-rule": "evenodd",
+            "fill": "black",
+            "stroke": "none"
+        }
+        
+        metrics = contour_metrics(contours_data)
+        for group in compound_shape_groups(contours_data, hierarchy, contour_mask(metrics, *SVG_LEGACY_MINIMUMS),
+                                           metrics):
+            yield "path", {"d": " ".join(path_data(contours_data[i]) for i in group)}
+        yield "end", None
+
+
+def _viewbox_dims(viewbox_size):
+    """(width, height) of the viewBox: a single number is the square --size, a pair comes from tiled mode."""
+    return tuple(viewbox_size) if isinstance(viewbox_size, (tuple, list)) else (viewbox_size, viewbox_size)
+
+
+def _xml_attr(value):
+    """Escapes an attribute value the way xml.dom.minidom does."""
+    return str(value).replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;").replace(">", "&gt;")
+
+
+def write_svg_stream(elements, output_svg_path, viewbox_size, width_mm, height_mm, compact=False):
+    """Streams SVG elements straight to a buffered file, without building a DOM (see write_svg_document)."""
+    with open(output_svg_path, "w", encoding="utf-8", buffering=SVG_WRITE_BUFFER_BYTES) as f:
+        write_svg_document(f.write, elements, viewbox_size, width_mm, height_mm, compact=compact)
+
+
+def write_svg_document(write, elements, viewbox_size, width_mm, height_mm, compact=False):
+    """Writes a whole SVG document from element events through the `write(text)` callable.
+
+    In pretty mode the output is byte-for-byte what svgwrite's save(pretty=True)
+    produces (sorted attributes, two-space indent, empty groups self-closed);
+    compact mode drops the indentation and line breaks. A start tag is held
+    back until its first child arrives so that empty groups can be self-closed.
+    """
+    newline = "" if compact else "\n"
+    indent_unit = "" if compact else "  "
+    viewbox_width, viewbox_height = _viewbox_dims(viewbox_size)
+    write('<?xml version="1.0" encoding="utf-8" ?>\n')
+    write('<svg xmlns="http://www.w3.org/2000/svg" xmlns:ev="http://www.w3.org/2001/xml-events" '
+          'xmlns:xlink="http://www.w3.org/1999/xlink" baseProfile="full" '
+          f'height="{_xml_attr(height_mm)}mm" version="1.1" viewBox="0 0 {viewbox_width} {viewbox_height}" '
+          f'width="{_xml_attr(width_mm)}mm">{newline}')
+    write(f"{indent_unit}<defs/>{newline}")
+
+    open_groups = []  # [start tag text, written?] per open <g>, outermost first
+    for kind, attrs in elements:
+        if kind == "end":
+            start_tag, written = open_groups.pop()
+            indent = indent_unit * (len(open_groups) + 1)
+            write(f"{indent}</g>{newline}" if written else f"{indent}{start_tag}/>{newline}")
+            continue
+        # Flush any held-back parent start tags now that they have a child
+        for depth, group in enumerate(open_groups):
+            if not group[1]:
+                write(f"{indent_unit * (depth + 1)}{group[0]}>{newline}")
+                group[1] = True
+        tag = "g" if kind == "group" else "path"
+        attr_text = "".join(f' {name}="{_xml_attr(value)}"' for name, value in sorted(attrs.items()))
+        if kind == "group":
+            open_groups.append([f"<{tag}{attr_text}", False])
+        else:
+            write(f"{indent_unit * (len(open_groups) + 1)}<{tag}{attr_text}/>{newline}")
+    write("</svg>\n")
+
+
 def create_svg_from_contours(contours_data, output_svg_path, viewbox_size, width_mm, height_mm, 
                              stroke_width=DEFAULT_STROKE_WIDTH, bronze_color=DEFAULT_BRONZE_COLOR, 
-                             preserve_layers=True):
-    """Create SVG file from detected contours with proper layering and styling."""
-    print(f"Creating SVG file: {output_svg_path}")
+                             preserve_layers=True, writer=DEFAULT_SVG_WRITER, compact=False,
+                             path_data=contour_path_data, timer=None, log=print, hierarchy=None):
+    """Create SVG file from detected contours with proper layering and styling.
+
+    `writer` selects the backend: "stream" writes elements directly to the
+    file, "svgwrite" builds and validates the svgwrite DOM first. `timer`
+    (a StageTimer) books element and path data generation to "svg_build"
+    and serializing/writing to "save". Messages go to `log`, as in
+    preprocess_image. `hierarchy` is passed on to iter_svg_elements.
+    """
+    timer = timer or StageTimer()
+    log(f"Creating SVG file: {output_svg_path}")
+    elements = timer.timed("svg_build", iter_svg_elements(contours_data, stroke_width, bronze_color, preserve_layers,
+                                                          path_data=path_data, hierarchy=hierarchy))
+
+    if writer == SVG_WRITER_STREAM:
+        try:
+            with timer.stage("save"):
+                write_svg_stream(elements, output_svg_path, viewbox_size, width_mm, height_mm, compact=compact)
+            log("SVG file created successfully.")
+            return True
+        except Exception as e:
+            log(f"ERROR saving SVG file: {e}", file=sys.stderr)
+            return False
 
     dwg = svgwrite.Drawing(
         output_svg_path,
         size=(f"{width_mm}mm", f"{height_mm}mm"),
-        viewBox=f"0 0 {viewbox_size} {viewbox_size}"
+        viewBox="0 0 %s %s" % _viewbox_dims(viewbox_size)
     )
     
     # Add a title (try-except in case the svgwrite version doesn't support it)
     try:
         dwg.add(dwg.title("Vectorized Icon"))
     except (AttributeError, TypeError):
-        print("Warning: Could not add title to SVG (unsupported by this version of svgwrite)")
+        log("Warning: Could not add title to SVG (unsupported by this version of svgwrite)")
     
-    if preserve_layers:
-        # Create background layer
-        background_layer = dwg.g(id="background")
-        dwg.add(background_layer)
-        
-        # Add the circle background with white fill
-        if contours_data['circle']:
-            for circle_contour in contours_data['circle']:
-                if len(circle_contour) < 3:
-                    continue
-                    
-                # Create path data
-                path_data = []
-                start_point = circle_contour[0][0]
-                path_data.append(f"M {start_point[0]},{start_point[1]}")
-                
-                for point in circle_contour[1:]:
-                    p = point[0]
-                    path_data.append(f"L {p[0]},{p[1]}")
-                
-                path_data.append("Z")
-                
-                # Create the circle path with white fill and bronze stroke
-                circle_path = dwg.path(
-                    d=" ".join(path_data), 
-                    fill="white",
-                    stroke=bronze_color,
-                    stroke_width=stroke_width
-                )
-                background_layer.add(circle_path)
-        
-        # Create foreground layer for the character lines
-        foreground_layer = dwg.g(id="foreground")
-        dwg.add(foreground_layer)
-        
-        # Add edge contours as bronze stroked paths
-        for edge_contour in contours_data['edges']:
-            if len(edge_contour) < 2:
-                continue
-                
-            path_data = []
-            start_point = edge_contour[0][0]
-            path_data.append(f"M {start_point[0]},{start_point[1]}")
-            
-            for point in edge_contour[1:]:
-                p = point[0]
-                path_data.append(f"L {p[0]},{p[1]}")
-            
-            # Don't close path for lines unless it's very clearly a closed shape
-            if cv2.arcLength(edge_contour, True) > 20:
-                path_data.append("Z")
-            
-            edge_path = dwg.path(
-                d=" ".join(path_data),
-                fill="none",
-                stroke=bronze_color,
-                stroke_width=stroke_width,
-                stroke_linejoin="round",
-                stroke_linecap="round"
-            )
-            foreground_layer.add(edge_path)
-        
-        # Add shape details if needed
-        detail_layer = dwg.g(id="details")
-        foreground_layer.add(detail_layer)
-        
-        for shape_contour in contours_data['shapes']:
-            if len(shape_contour) < 3 or cv2.contourArea(shape_contour) < 50:
-                continue
-                
-            path_data = []
-            start_point = shape_contour[0][0]
-            path_data.append(f"M {start_point[0]},{start_point[1]}")
-            
-            for point in shape_contour[1:]:
-                p = point[0]
-                path_data.append(f"L {p[0]},{p[1]}")
-            
-            path_data.append("Z")
-            
-            detail_path = dwg.path(
-                d=" ".join(path_data),
-                fill="white",
-                stroke=bronze_color,
-                stroke_width=stroke_width * 0.75  # Slightly thinner lines for details
-            )
-            detail_layer.add(detail_path)
-            
-    else:
-        # Original SVG creation for backward compatibility
-        path_group = dwg.g(
-            fill_rule="evenodd",
-            fill="black",
-            stroke="none"
-        )
-        dwg.add(path_group)
-        
-        for contour in contours_data:
-            if len(contour) < 2:
+    parents = [dwg]
+    with timer.stage("svg_build"):
+        for kind, attrs in elements:
+            if kind == "end":
+                parents.pop()
                 continue
-                
-            path_data = []
-            start_point = contour[0][0]
-            path_data.append(f"M {start_point[0]},{start_point[1]}")
-            
-            for point in contour[1:]:
-                p = point[0]
-                path_data.append(f"L {p[0]},{p[1]}")
-                
-            path_data.append("Z")
-            path = dwg.path(d=" ".join(path_data))
-            path_group.add(path)
+            svgwrite_attrs = {name.replace("-", "_"): value for name, value in attrs.items()}  # svgwrite kwarg spelling
+            element = dwg.g(**svgwrite_attrs) if kind == "group" else dwg.path(**svgwrite_attrs)
+            parents[-1].add(element)
+            if kind == "group":
+                parents.append(element)
 
     # Save the SVG file
     try:
-        dwg.save(pretty=True)
-        print("SVG file created successfully.")
+        with timer.stage("save"):
+            dwg.save(pretty=not compact)
+        log("SVG file created successfully.")
         return True
     except Exception as e:
-        print(f"ERROR saving SVG file: {e}", file=sys.stderr)
+        log(f"ERROR saving SVG file: {e}", file=sys.stderr)
         return False
 
 
+# --- Tiled Vectorization ---
+
+# Marching-squares boundary segments for each 2x2 pixel cell, indexed by which corners are inside
+# the object (1 = top-left, 2 = top-right, 4 = bottom-right, 8 = bottom-left). Segment ends are
+# pixel-edge midpoints in doubled coordinates relative to the cell's top-left pixel: T(op), R(ight),
+# B(ottom), L(eft). Every segment keeps the object on the same side, so outer boundaries and holes
+# come out with opposite orientation, and the diagonal cases (5, 10) keep the object 8-connected
+# like cv2.findContours does.
+_T, _R, _B, _L = (1, 0), (2, 1), (1, 2), (0, 1)
+MARCHING_SQUARES_SEGMENTS = {
+    1: [(_L, _T)], 2: [(_T, _R)], 4: [(_R, _B)], 8: [(_B, _L)],
+    3: [(_L, _R)], 6: [(_T, _B)], 12: [(_R, _L)], 9: [(_B, _T)],
+    14: [(_T, _L)], 13: [(_R, _T)], 11: [(_B, _R)], 7: [(_L, _B)],
+    5: [(_R, _T), (_L, _B)], 10: [(_T, _L), (_B, _R)],
+}
+
+
+def iter_tiles(width, height, tile_size):
+    """Yields (x0, y0, x1, y1) tile boxes that partition the image, row by row."""
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            yield x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height)
+
+
+def boundary_segments(mask, origin_x, origin_y):
+    """Marching-squares segments between the object (True) and background of a boolean mask.
+
+    `mask` covers pixels starting at (origin_x, origin_y) of the full image;
+    one cell is traced per 2x2 block of adjacent pixels. Returns (starts, ends)
+    as (N, 2) int64 arrays of doubled image coordinates, so that the segments
+    of neighbouring tiles meet on exactly the same points.
+    """
+    m = mask.view(np.uint8)
+    cases = m[:-1, :-1] | (m[:-1, 1:] << 1) | (m[1:, 1:] << 2) | (m[1:, :-1] << 3)
+    cases = cases.ravel()
+    cells = np.flatnonzero((cases != 0) & (cases != 15))  # Only cells the boundary passes through
+    cell_cases = cases[cells]
+    cell_y, cell_x = np.divmod(cells, m.shape[1] - 1)
+    starts, ends = [], []
+    for case, segments in MARCHING_SQUARES_SEGMENTS.items():
+        selected = cell_cases == case
+        if not selected.any():
+            continue
+        x = 2 * (cell_x[selected] + origin_x)
+        y = 2 * (cell_y[selected] + origin_y)
+        for (sx, sy), (ex, ey) in segments:
+            starts.append(np.stack([x + sx, y + sy], axis=1))
+            ends.append(np.stack([x + ex, y + ey], axis=1))
+    if not starts:
+        empty = np.empty((0, 2), np.int64)
+        return empty, empty
+    return np.concatenate(starts).astype(np.int64), np.concatenate(ends).astype(np.int64)
+
+
+def _point_keys(points, key_stride):
+    """One integer per doubled-coordinate point (coordinates start at -2 for the padding cells)."""
+    return (points[:, 1] + 2) * key_stride + (points[:, 0] + 2)
+
+
+def chain_segments(starts, ends, key_stride):
+    """Links boundary segments end-to-start into polylines.
+
+    Returns (closed, open): closed loops as point arrays, and chains that
+    leave this tile (their first and last points lie on a tile seam and are
+    joined to the neighbouring tiles' chains by join_open_chains). Instead of
+    walking segment by segment in Python, every segment is labelled with its
+    polyline and ranked along it by pointer jumping (log2(N) array passes),
+    then each segment is scattered straight to its place in the output.
+    """
+    count = len(starts)
+    if not count:
+        return [], []
+    start_keys = _point_keys(starts, key_stride)
+    end_keys = _point_keys(ends, key_stride)
+    order = np.argsort(start_keys, kind="stable").astype(np.int32)  # int32 halves the gathers' memory traffic
+    sorted_keys = start_keys[order]
+    positions = np.minimum(np.searchsorted(sorted_keys, end_keys), count - 1)
+    successors = np.where(sorted_keys[positions] == end_keys, order[positions], -1)
+    predecessors = np.full(count, -1, np.int32)
+    linked = np.flatnonzero(successors >= 0).astype(np.int32)
+    predecessors[successors[linked]] = linked
+
+    index = np.arange(count, dtype=np.int32)
+    passes = count.bit_length()
+    # Label: the first segment of an open chain (shifted below every index), or a loop's lowest index
+    is_head = predecessors < 0
+    labels = np.where(is_head, index - count, index)
+    jump = np.where(is_head, index, predecessors)
+    for _ in range(passes):
+        labels = np.minimum(labels, labels[jump])
+        jump = jump[jump]
+    # Rank: distance from the polyline's first segment (loops are cut open at their label)
+    is_first = is_head | (labels == index)
+    rank = (~is_first).astype(np.int32)
+    jump = np.where(is_first, index, predecessors)
+    for _ in range(passes):
+        rank = rank + rank[jump]
+        jump = jump[jump]
+        if is_first[jump].all():  # Every segment has reached its polyline's start
+            break
+
+    # Polylines are laid out by label, segments by rank within each
+    labels += count
+    sizes = np.bincount(labels, minlength=2 * count)
+    offsets = np.cumsum(sizes) - sizes
+    order = np.empty(count, np.int32)
+    order[offsets[labels] + rank] = index
+    closed, open_chains = [], []
+    for group in np.split(order, np.cumsum(sizes[sizes > 0])[:-1]):
+        if labels[group[0]] < count:
+            open_chains.append(np.concatenate([starts[group], ends[group[-1:]]]))
+        else:
+            closed.append(starts[group])
+    return closed, open_chains
+
+
+def join_open_chains(open_chains, key_stride):
+    """Joins chains cut at tile seams into closed loops (first/last points are shared seam points).
+
+    Returns (closed, unmatched). A chain whose end meets no other chain
+    cannot happen while the tiles agree on every seam pixel; should it
+    happen anyway, the loop is closed where the chain ends and counted in
+    `unmatched` instead of failing the whole conversion.
+    """
+    by_start = {}
+    for chain in open_chains:
+        by_start[int(_point_keys(chain[:1], key_stride)[0])] = chain
+    closed = []
+    unmatched = 0
+    while by_start:
+        start_key, chain = next(iter(by_start.items()))
+        del by_start[start_key]
+        parts = [chain]
+        end_key = int(_point_keys(chain[-1:], key_stride)[0])
+        while end_key != start_key:
+            chain = by_start.pop(end_key, None)
+            if chain is None:
+                unmatched += 1
+                break
+            parts.append(chain[1:])
+            end_key = int(_point_keys(chain[-1:], key_stride)[0])
+        loop = np.concatenate(parts)
+        closed.append(loop[:-1] if end_key == start_key else loop)  # The last point repeats the first
+    return closed, unmatched
+
+
+def loop_geometry(loops):
+    """OpenCV-style float32 contours (in pixels) and signed areas for many closed loops at once.
+
+    Points where the boundary runs straight on are dropped, as
+    CHAIN_APPROX_SIMPLE does. Areas are positive for outer boundaries and
+    negative for holes. Every loop is rotated to start at its top-left point
+    and the loops are sorted by that point, so the contours (and what
+    simplification makes of them) do not depend on where the tile seams
+    cut the boundaries. All loops are handled in one set of array operations
+    rather than one small NumPy call chain per loop.
+    """
+    if not loops:
+        return [], np.zeros(0)
+    lengths = np.fromiter(map(len, loops), np.int64, len(loops))
+    points = np.concatenate(loops)
+    loop_ends = np.cumsum(lengths)
+    loop_begins = loop_ends - lengths
+
+    # Canonical start point and order: the top-left point of each loop, loops in row-major order of it
+    x, y = points[:, 0], points[:, 1]
+    keys = (y - y.min()) * (x.max() - x.min() + 1) + (x - x.min())
+    firsts = np.minimum.reduceat(keys, loop_begins)
+    at_first = np.where(keys == np.repeat(firsts, lengths), np.arange(len(points)), len(points))
+    shifts = np.minimum.reduceat(at_first, loop_begins) - loop_begins
+    order = np.argsort(firsts, kind="stable")
+    source_begins, shifts, lengths = loop_begins[order], shifts[order], lengths[order]
+    loop_ends = np.cumsum(lengths)
+    loop_begins = loop_ends - lengths
+    within = np.arange(len(points)) - np.repeat(loop_begins, lengths)
+    points = points[np.repeat(source_begins, lengths) + (within + np.repeat(shifts, lengths)) % np.repeat(lengths, lengths)]
+
+    previous = np.arange(-1, len(points) - 1)
+    previous[loop_begins] = loop_ends - 1
+    following = np.arange(1, len(points) + 1)
+    following[loop_ends - 1] = loop_begins
+
+    x, y = points[:, 0].astype(np.float64), points[:, 1].astype(np.float64)
+    areas = np.add.reduceat(x[following] * y - x * y[following], loop_begins) / 8  # Doubled coordinates
+
+    incoming = points - points[previous]
+    outgoing = points[following] - points
+    turns = incoming[:, 0] * outgoing[:, 1] != incoming[:, 1] * outgoing[:, 0]
+    kept = (points[turns] / 2).astype(np.float32)
+    kept_counts = np.add.reduceat(turns.astype(np.int64), loop_begins)
+    contours = [c.reshape(-1, 1, 2) for c in np.split(kept, np.cumsum(kept_counts)[:-1])]
+    return contours, areas
+
+
+def refine_tiled_contours(contours, simplify, smooth, metrics=None):
+    """Simplification and smoothing for tiled contours, mirroring detect_contours.
+
+    The simplification tolerance is 0.1% of the perimeter as usual, but
+    capped at TILE_SIMPLIFY_MAX_EPSILON pixels: a contour that runs around
+    a whole drawing would otherwise lose everything shorter than its 0.1%.
+    Perimeters come from `metrics` (the contours' contour_metrics table).
+    """
+    if simplify and metrics is None:
+        metrics = contour_metrics(contours)
+    refined = []
+    for i, contour in enumerate(contours):
+        if simplify:
+            epsilon = min(0.001 * metrics["perimeter"][i], TILE_SIMPLIFY_MAX_EPSILON)
+            contour = cv2.approxPolyDP(contour, epsilon, True)
+        if smooth and len(contour) > 5:
+            contour = cv2.GaussianBlur(contour, (3, 3), 0)
+        refined.append(contour)
+    return refined
+
+
+def trace_tile(source, box, args, key_stride):
+    """Preprocesses one tile with context and traces each layer's boundaries between its own pixels.
+
+    The masks are computed on the tile plus args.tile_overlap pixels of its
+    neighbours, so the Canny blur and the circle mask's closing see the same
+    surroundings as in a whole-image pass. Only the cells between the
+    tile's own pixels are traced here (plus the padding cells outside the
+    image on the right/bottom edge); the cells on the seams to the left and
+    upper neighbours are left to trace_seams. Returns {layer: (closed, open,
+    borders)}, where borders are the tile's (first row, first column, last
+    row, last column) of the mask for trace_seams.
+    """
+    width, height = source.size
+    x0, y0, x1, y1 = box
+    overlap = args.tile_overlap
+    cx0, cy0 = max(0, x0 - overlap), max(0, y0 - overlap)
+    cx1, cy1 = min(width, x1 + overlap), min(height, y1 + overlap)
+
+    img_gray = np.asarray(flatten_on_white(source.crop((cx0, cy0, cx1, cy1))).convert('L'))
+    img_bw = threshold_image(img_gray, args.threshold)
+    masks = {'shapes': img_bw == 0}
+    if args.preserve_layers:
+        masks['circle'] = close_circle_mask(img_bw) == 0
+        masks['edges'] = detect_edges(img_gray, args.edge_backend) > 0
+    del img_gray, img_bw
+
+    traced = {}
+    for layer, mask in masks.items():
+        own = mask[y0 - cy0:y1 - cy0, x0 - cx0:x1 - cx0]
+        # Anything outside the image counts as background
+        padded = np.zeros((y1 - y0 + (y1 == height), x1 - x0 + (x1 == width)), bool)
+        padded[:y1 - y0, :x1 - x0] = own
+        starts, ends = boundary_segments(padded, x0, y0)
+        closed, open_chains = chain_segments(starts, ends, key_stride)
+        if layer == 'circle' and closed:
+            closed = [closed[int(np.argmax(loop_geometry(closed)[1]))]]  # Only the largest can win
+        borders = (own[0].copy(), own[:, 0].copy(), own[-1].copy(), own[:, -1].copy())
+        traced[layer] = (closed, open_chains, borders)
+    return traced
+
+
+def trace_seams(box, borders, tile_size, image_size, key_stride):
+    """Traces the cells on a tile's left and upper seams from the tiles that own their pixels.
+
+    `borders` maps each tile's (x0, y0) to its trace_tile borders for one
+    layer. Per-tile Canny (and, with little overlap, the circle closing)
+    can disagree about the same pixel in neighbouring tiles, so each seam
+    cell takes every pixel from the one tile that contains it; the chains
+    traced here then meet the tiles' own chains on exactly the same points.
+    Together with trace_tile, every cell of the image is traced exactly once.
+    Returns the seam chains as (closed, open), like chain_segments.
+    """
+    width, height = image_size
+    x0, y0, x1, y1 = box
+    first_row, first_column = borders[(x0, y0)][:2]
+    left = borders.get((x0 - tile_size, y0))
+    upper = borders.get((x0, y0 - tile_size))
+    upper_left = borders.get((x0 - tile_size, y0 - tile_size))
+    rows, columns = y1 - y0, x1 - x0
+
+    # The left seam: pixel columns x0 - 1 and x0 from row y0 - 1 down (background outside the image)
+    column_pair = np.zeros((rows + 1 + (y1 == height), 2), bool)
+    if upper_left is not None:
+        column_pair[0, 0] = upper_left[2][-1]
+    if upper is not None:
+        column_pair[0, 1] = upper[2][0]
+    if left is not None:
+        column_pair[1:rows + 1, 0] = left[3]
+    column_pair[1:rows + 1, 1] = first_column
+    # The upper seam: pixel rows y0 - 1 and y0 from column x0 on (the corner cell belongs to the left seam)
+    row_pair = np.zeros((2, columns + (x1 == width)), bool)
+    if upper is not None:
+        row_pair[0, :columns] = upper[2]
+    row_pair[1, :columns] = first_row
+
+    column_starts, column_ends = boundary_segments(column_pair, x0 - 1, y0 - 1)
+    row_starts, row_ends = boundary_segments(row_pair, x0, y0 - 1)
+    return chain_segments(np.concatenate([column_starts, row_starts]), np.concatenate([column_ends, row_ends]),
+                          key_stride)
+
+
+def vectorize_tiled(input_path, args, timer=None, log=print):
+    """Traces a (very large) image at full resolution in tiles and stitches the tiles' contours.
+
+    Instead of resizing to one square --size, the image is cut into
+    args.tile_size tiles that are preprocessed and traced independently, in
+    args.tile_jobs threads. The whole image is decoded once up front (PNG
+    cannot be decoded region by region), so memory still grows with the
+    image, about 4 bytes per pixel for RGBA; what tiling bounds is the
+    processing on top of it (float buffers and masks are per tile, and only
+    the traced outlines are kept for the whole image). Boundaries are traced along pixel
+    edges (marching squares), and the cells on a seam read each pixel from
+    the one tile that contains it (trace_seams), so contours cut by a seam
+    meet on exactly the same points and are rejoined without gaps or
+    duplicates, even where the tiles' Canny edges disagree. Shapes and the
+    circle come out the same for any tile size; the Canny edges are found
+    per tile (hysteresis does not stop at --tile-overlap) and can differ
+    slightly from one tile size to another.
+    Layers follow detect_contours: every shape boundary, the largest outer
+    boundary of the closed mask as the circle, and for the stroke layer the
+    outlines of the Canny edge lines (on a whole-page scan the inverted edge
+    map's outer contour is just the page border). Returns
+    (contours_data, (width, height)) with contours in image pixels.
+    `timer` (a StageTimer) times the decode, trace_tiles, stitch, simplify
+    and metrics stages; per-tile preprocessing runs inside trace_tiles.
+    Progress messages go to `log`, as in preprocess_image.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("decode"):
+        # Tiled mode exists for scans beyond PIL's default decompression-bomb limit
+        source = open_image(input_path, max_pixels=TILE_MAX_IMAGE_PIXELS)
+        source.load()  # Decode once; tiles are cropped from it concurrently
+    width, height = source.size
+    boxes = list(iter_tiles(width, height, args.tile_size))
+    key_stride = 2 * width + 8
+    log(f"Tiled vectorization: {width}x{height} px in {len(boxes)} tiles of {args.tile_size} px "
+        f"(overlap {args.tile_overlap} px, {args.tile_jobs} thread(s))")
+
+    layers = ('edges', 'circle', 'shapes') if args.preserve_layers else ('shapes',)
+    closed = {layer: [] for layer in layers}
+    open_chains = {layer: [] for layer in layers}
+    borders = {layer: {} for layer in layers}
+    with timer.stage("trace_tiles"), ThreadPoolExecutor(max_workers=args.tile_jobs) as pool:
+        # OpenCV and NumPy release the GIL, so tiles overlap usefully even in threads
+        for box, traced in zip(boxes, pool.map(lambda box: trace_tile(source, box, args, key_stride), boxes)):
+            for layer, (tile_closed, tile_open, tile_borders) in traced.items():
+                closed[layer].extend(tile_closed)
+                open_chains[layer].extend(tile_open)
+                borders[layer][box[:2]] = tile_borders
+    del source
+
+    geometry = {}
+    with timer.stage("stitch"):
+        for layer in layers:
+            for box in boxes:
+                seam_closed, seam_open = trace_seams(box, borders[layer], args.tile_size, (width, height), key_stride)
+                closed[layer].extend(seam_closed)
+                open_chains[layer].extend(seam_open)
+            joined, unmatched = join_open_chains(open_chains[layer], key_stride)
+            log(f"  {layer}: {len(closed[layer])} contours inside tiles, {len(joined)} stitched across seams")
+            if unmatched:
+                log(f"Warning: {unmatched} {layer} contour(s) did not meet at a tile seam and were closed where "
+                    f"they ended", file=sys.stderr)
+            geometry[layer] = loop_geometry(closed[layer] + joined)
+
+    shape_contours, shape_areas = geometry['shapes']
+    if not args.preserve_layers:
+        timer.count_contours("before_simplify", "shapes", shape_contours)
+        with timer.stage("simplify"):
+            # Same minimum area as the legacy contour filter
+            contours = [contour for contour, area in zip(shape_contours, shape_areas) if abs(area) >= 5]
+            contours = [contour for contour in refine_tiled_contours(contours, args.simplify, args.smooth) if len(contour) >= 2]
+        timer.count_contours("after_simplify", "shapes", contours)
+        log(f"Processed {len(contours)} contours after filtering/simplification.")
+        return contours, (width, height)
+
+    circle_contours, circle_areas = geometry['circle']
+    circle_contours = [circle_contours[int(np.argmax(circle_areas))]] if circle_contours else []
+    edge_contours = [contour for contour, area in zip(*geometry['edges']) if area > 0]  # Outer outlines only
+    for layer, contours in (("edges", edge_contours), ("circle", circle_contours), ("shapes", shape_contours)):
+        timer.count_contours("before_simplify", layer, contours)
+    with timer.stage("simplify"):
+        edge_metrics = contour_metrics(edge_contours)
+        if args.simplify:
+            kept = contour_mask(edge_metrics, 5)  # Skip very small contours
+            edge_contours = [edge_contours[i] for i in np.flatnonzero(kept)]
+            edge_metrics = edge_metrics[kept]
+        contours_data = {
+            'edges': refine_tiled_contours(edge_contours, args.simplify, args.smooth, edge_metrics),
+            'circle': refine_tiled_contours(circle_contours, args.simplify, args.smooth),
+            'shapes': refine_tiled_contours(shape_contours, args.simplify, args.smooth),
+            'shape_hierarchy': None,
+        }
+    for layer in ("edges", "circle", "shapes"):
+        timer.count_contours("after_simplify", layer, contours_data[layer])
+    with timer.stage("metrics"):
+        contours_data['metrics'] = {layer: contour_metrics(contours_data[layer]) for layer in ('edges', 'circle', 'shapes')}
+    log(f"Processed contours: {len(contours_data['edges'])} edges, {len(contours_data['circle'])} circle, "
+        f"{len(contours_data['shapes'])} shapes")
+    return contours_data, (width, height)
+
+
+def conversion_option_errors(args):
+    """Yields (option, problem) for every out-of-range conversion option (shared by the CLI, vectorize and --serve).
+
+    `option` is the argument name (tile_size); each caller words it its own
+    way, --tile-size on the command line and tile_size in vectorize().
+    """
+    # Sweeps check every value; vectorize() and the service only have the single one
+    if any(not 0 <= threshold <= 255 for threshold in getattr(args, "thresholds", [args.threshold])):
+        yield "threshold", "must be between 0 and 255"
+    if any(not 1 <= size <= MAX_TARGET_SIZE_PX for size in getattr(args, "sizes", [args.size])):
+        yield "size", f"must be between 1 and {MAX_TARGET_SIZE_PX} pixels"
+    if args.width <= 0:
+        yield "width", "must be positive"
+    if args.height <= 0:
+        yield "height", "must be positive"
+    if args.stroke_width < 0:
+        yield "stroke_width", "cannot be negative"
+    if args.precision is not None and not 0 <= args.precision <= 6:
+        yield "precision", "must be between 0 and 6 decimal places"
+    if args.curve_tolerance < 0:
+        yield "curve_tolerance", "cannot be negative"
+    if args.tile_size < 0 or 0 < args.tile_size < 16 or args.tile_size > MAX_TILE_SIZE_PX:
+        yield "tile_size", f"must be 0 (off) or between 16 and {MAX_TILE_SIZE_PX} pixels"
+    if not 0 <= args.tile_overlap <= MAX_TILE_OVERLAP_PX:
+        yield "tile_overlap", f"must be between 0 and {MAX_TILE_OVERLAP_PX} pixels"
+    if not 0 <= args.tile_jobs <= MAX_TILE_JOBS:
+        yield "tile_jobs", f"must be 0 (all cores) or at most {MAX_TILE_JOBS}"
+    if not 0 <= args.layer_jobs <= LAYER_COUNT:
+        yield "layer_jobs", f"must be 0 (automatic) or at most {LAYER_COUNT} (one per layer)"
+
+
 def parse_arguments():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(
@@ -441,7 +1796,7 @@ def parse_arguments():
 
     parser.add_argument(
         "input_files",
-        nargs='+',
+        nargs='*',
         help="Input PNG file(s) to convert. Supports wildcards (*.png)"
     )
 
@@ -453,16 +1808,17 @@ def parse_arguments():
 
     parser.add_argument(
         "-t", "--threshold",
-        type=int,
-        default=DEFAULT_THRESHOLD_VALUE,
-        help="Threshold value (0-255). Pixels strictly darker than this become the object (black). Adjust based on icon color vs background."
+        type=parse_sweep_values,
+        default=[DEFAULT_THRESHOLD_VALUE],
+        help="Threshold value (0-255). Pixels strictly darker than this become the object (black). Adjust based on icon color vs background. "
+             "A list (200,240) or range (180:250:10) runs a sweep."
     )
 
     parser.add_argument(
         "-s", "--size",
-        type=int,
-        default=DEFAULT_TARGET_SIZE_PX,
-        help="Target size in pixels for internal processing and the SVG viewBox"
+        type=parse_sweep_values,
+        default=[DEFAULT_TARGET_SIZE_PX],
+        help="Target size in pixels for internal processing and the SVG viewBox. A list or range runs a sweep."
     )
 
     parser.add_argument(
@@ -517,6 +1873,156 @@ def parse_arguments():
         help="Disable layered output (will create simple solid shapes)"
     )
 
+    parser.add_argument(
+        "--edge-backend",
+        choices=EDGE_BACKENDS,
+        default=DEFAULT_EDGE_BACKEND,
+        help="Canny implementation for the stroke layer: 'skimage' (reference) or 'opencv' (much faster, near-identical edges)"
+    )
+
+    parser.add_argument(
+        "--benchmark-edges",
+        action="store_true",
+        default=False,
+        help="Instead of converting, time each edge backend on the inputs and compare their edges to skimage's"
+    )
+
+    parser.add_argument(
+        "--writer",
+        choices=[SVG_WRITER_STREAM, SVG_WRITER_SVGWRITE],
+        default=DEFAULT_SVG_WRITER,
+        help="SVG writer backend: 'stream' writes elements directly, 'svgwrite' builds a validated DOM first"
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Number of files to convert in parallel worker processes (0 = one per CPU core)"
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        action="store_false",
+        dest="use_cache",
+        default=True,
+        help="Always reconvert, ignoring and not updating the conversion cache"
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Directory holding cached SVGs, keyed on input content and settings"
+    )
+
+    parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=DEFAULT_CACHE_MAX_MB,
+        help="Size limit of the conversion cache; least recently used entries are evicted beyond it"
+    )
+
+    parser.add_argument(
+        "--curve-tolerance",
+        type=float,
+        default=DEFAULT_CURVE_TOLERANCE,
+        help="Fit cubic Bezier curves to the contours, keeping every contour point within this many viewBox "
+             "units of the curve (e.g. 1.0); prints the node and byte savings. 0 = straight segments only"
+    )
+
+    parser.add_argument(
+        "--path-encoding",
+        choices=[PATH_ENCODING_ABSOLUTE, PATH_ENCODING_RELATIVE],
+        default=DEFAULT_PATH_ENCODING,
+        help="Path data encoding: 'absolute' (M x,y L x,y ...) or 'relative' (offsets, h/v shortcuts, "
+             "implicit command repeats and minimal separators; typically 30-50%% smaller)"
+    )
+
+    parser.add_argument(
+        "--precision",
+        type=int,
+        default=None,
+        help="Decimal places for path coordinates (default: integers stay exact, fractional "
+             f"coordinates keep {PATH_DECIMALS})"
+    )
+
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=DEFAULT_TILE_SIZE,
+        help="Trace the image at full resolution in tiles of this many pixels instead of resizing to --size "
+             "(for very large scans; the viewBox becomes the image's pixel size). The full image is still "
+             "decoded into memory (about 4 bytes per pixel); tiling bounds the processing buffers. 0 = off"
+    )
+
+    parser.add_argument(
+        "--tile-overlap",
+        type=int,
+        default=DEFAULT_TILE_OVERLAP,
+        help="Pixels of neighbouring context preprocessed around each tile"
+    )
+
+    parser.add_argument(
+        "--tile-jobs",
+        type=int,
+        default=1,
+        help="Number of tiles traced in parallel threads (0 = one per CPU core)"
+    )
+
+    parser.add_argument(
+        "--layer-jobs",
+        type=int,
+        default=0,
+        help="Threads tracing the edge, circle and shape layers of one image at the same time "
+             "(0 = up to %d, one per CPU core, or 1 when --jobs already runs several files at once)" % LAYER_COUNT
+    )
+
+    parser.add_argument(
+        "--sprite",
+        dest="sprite_file",
+        default=None,
+        help="After converting, also combine all converted SVGs into this sprite sheet of <symbol>s "
+             "(repeated paths shared through <use>) plus a JSON manifest next to it"
+    )
+
+    parser.add_argument(
+        "--report",
+        dest="report_file",
+        default=None,
+        help="Write a JSON run report to this file: per file and stage, wall time and peak memory, contour and "
+             "point counts before/after simplification, and output size"
+    )
+
+    parser.add_argument(
+        "-q", "--quiet",
+        action="store_true",
+        default=False,
+        help="Suppress the banner, progress messages and final status line (errors and the batch summary "
+             "are still printed)"
+    )
+
+    parser.add_argument(
+        "--serve",
+        type=int,
+        metavar="PORT",
+        default=None,
+        help="Instead of converting files, run a local HTTP conversion service on this port "
+             "(POST /vectorize with the image as the body) with --jobs warm worker processes"
+    )
+
+    parser.add_argument(
+        "--serve-host",
+        default=DEFAULT_SERVE_HOST,
+        help="Address the conversion service listens on"
+    )
+
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        default=False,
+        help="Write compact SVG (no indentation or line breaks) instead of pretty-printed output"
+    )
+
     args = parser.parse_args()
 
     # Expand any wildcards in input files (needed for Windows)
@@ -538,11 +2044,41 @@ def parse_arguments():
                  print(f"Warning: No files found matching pattern '{pattern}'", file=sys.stderr)
 
 
-    if not expanded_files:
+    if args.serve is not None:
+        if args.input_files:
+            parser.error("--serve runs the conversion service and takes no input files")
+        if not 0 <= args.serve <= 65535:
+            parser.error("--serve needs a port between 0 (any free port) and 65535")
+    elif not expanded_files:
         parser.error("No valid input files specified or found")
 
     args.input_files = expanded_files
 
+    # Several thresholds/sizes switch to sweep mode; single values behave as before
+    args.thresholds, args.sizes = args.threshold, args.size
+    args.threshold, args.size = args.thresholds[0], args.sizes[0]
+    args.sweep = len(args.thresholds) > 1 or len(args.sizes) > 1
+
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 (all cores) or a positive number")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+
+    for option, problem in conversion_option_errors(args):
+        parser.error(f"--{option.replace('_', '-')} {problem}")
+    if args.tile_jobs == 0:
+        args.tile_jobs = os.cpu_count() or 1
+    if args.layer_jobs == 0:
+        args.layer_jobs = 1 if args.jobs > 1 else default_layer_jobs()
+    if args.tile_size and args.sweep:
+        parser.error("tiled mode (--tile-size) cannot be combined with a threshold/size sweep")
+    if args.sprite_file and args.sweep:
+        parser.error("--sprite cannot be combined with a threshold/size sweep")
+    if args.serve is not None and args.sweep:
+        parser.error("--serve takes single --threshold/--size values as the service defaults, not a sweep")
+    if args.report_file and args.sweep:
+        parser.error("--report cannot be combined with a threshold/size sweep (sweeps write their own CSV report)")
+
     # If output file specified but multiple input files provided, warn user
     if args.output_file and len(args.input_files) > 1:
         print("Warning: Output file (-o) specified with multiple input files.", file=sys.stderr)
@@ -553,103 +2089,281 @@ def parse_arguments():
     return args
 
 
-def process_file(input_file, output_file, args):
-    """Process a single file with the given arguments."""
-    print("-" * 40)
-    print(f"Processing file: {input_file}")
-    print(f"Settings: Threshold={args.threshold}, Size={args.size}, Simplify={args.simplify}, Smooth={args.smooth}")
-    print(f"Style: Stroke Width={args.stroke_width}pt, Bronze Color={args.bronze_color}, Layers={args.preserve_layers}")
+# --- Conversion Cache ---
+
+class ConversionCache:
+    """Content-addressed store of finished SVGs, bounded in total size.
+
+    Entries are keyed on a hash of the input file's bytes plus every setting
+    that changes the output (CACHE_KEY_SETTINGS), so renaming or touching an
+    input does not cause a reconversion, while any change to its pixels or to
+    the options does. Each entry is a plain "<key>.svg" file; hits refresh its
+    mtime and eviction removes the least recently used entries first.
+    Writes go through a temporary file and os.replace, so parallel workers
+    sharing one cache directory never see a partial entry.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key_for(input_bytes, args):
+        settings = {name: getattr(args, name, None) for name in CACHE_KEY_SETTINGS}
+        digest = hashlib.sha256()
+        digest.update(f"v{CACHE_FORMAT_VERSION}\0".encode())
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        digest.update(b"\0")
+        digest.update(input_bytes)
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, f"{key}.svg")
+
+    def lookup(self, key):
+        """Returns the cached SVG path for `key` (marking it recently used), or None."""
+        entry_path = self._entry_path(key)
+        try:
+            os.utime(entry_path)
+        except OSError:
+            return None
+        return entry_path
+
+    def store(self, key, svg_path):
+        """Copies a finished SVG into the cache, then evicts down to max_bytes."""
+        os.makedirs(self.directory, exist_ok=True)
+        temp_fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(temp_fd, "wb") as dst, open(svg_path, "rb") as src:
+                shutil.copyfileobj(src, dst)
+            os.replace(temp_path, self._entry_path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".svg"):
+                    try:
+                        stat_result = entry.stat()
+                    except OSError:
+                        continue  # Removed by another worker
+                    entries.append((stat_result.st_mtime, stat_result.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def _files_identical(path_a, path_b):
+    """True if both files exist with identical contents."""
+    try:
+        if os.path.getsize(path_a) != os.path.getsize(path_b):
+            return False
+    except OSError:
+        return False
+    with open(path_a, "rb") as a, open(path_b, "rb") as b:
+        while True:
+            chunk_a, chunk_b = a.read(1 << 16), b.read(1 << 16)
+            if chunk_a != chunk_b:
+                return False
+            if not chunk_a:
+                return True
+
+
+def process_file(input_file, output_file, args, report=None):
+    """Process a single file with the given arguments.
+
+    When `report` is a dict (--report) it is filled with this file's entry:
+    per-stage wall time and peak memory, contour/point counts before and
+    after simplification, output size and overall time.
+    """
+    if report is None:
+        return _process_file(input_file, output_file, args, StageTimer(), {})
+    timer = StageTimer(enabled=True)
+    started = time.perf_counter()
+    report.update({"input": input_file, "output": None, "success": False, "cache_hit": False})
+    try:
+        success = _process_file(input_file, output_file, args, timer, report)
+    finally:
+        report["seconds"] = round(time.perf_counter() - started, 6)
+        report.update(timer.as_dict())
+    report["success"] = success
+    report["output_bytes"] = os.path.getsize(report["output"]) if success else None
+    return success
+
+
+def _process_file(input_file, output_file, args, timer, report):
+    """process_file's conversion; stages are timed on `timer` and the output path and cache use noted in `report`."""
+    log = log_for(args)
+    log("-" * 40)
+    log(f"Processing file: {input_file}")
+    log(f"Settings: Threshold={args.threshold}, Size={args.size}, Simplify={args.simplify}, Smooth={args.smooth}")
+    log(f"Style: Stroke Width={args.stroke_width}pt, Bronze Color={args.bronze_color}, Layers={args.preserve_layers}")
 
     # Determine output filename
     if output_file is None:
         input_base = os.path.splitext(input_file)[0]
         output_file = input_base + ".svg"
+    report["output"] = output_file
 
     # Convert to absolute paths for clarity
     input_abs_path = os.path.abspath(input_file)
     output_abs_path = os.path.abspath(output_file)
     
-    print(f"Input file (absolute): {input_abs_path}")
-    print(f"Output will be (absolute): {output_abs_path}")
+    log(f"Input file (absolute): {input_abs_path}")
+    log(f"Output will be (absolute): {output_abs_path}")
 
     # Check if input file exists (redundant check, but good practice)
     if not os.path.exists(input_file):
-        print(f"ERROR: Input file disappeared or check failed: {input_file}", file=sys.stderr)
+        log(f"ERROR: Input file disappeared or check failed: {input_file}", file=sys.stderr)
         return False
 
+    # Skip the conversion entirely if this exact input + settings was converted before
+    cache = ConversionCache(args.cache_dir, int(args.cache_max_mb * 1024 * 1024)) if args.use_cache else None
+    cache_key = None
+    if cache is not None:
+        try:
+            with timer.stage("cache_lookup"):
+                with open(input_file, "rb") as f:
+                    cache_key = ConversionCache.key_for(f.read(), args)
+                cached_svg_path = cache.lookup(cache_key)
+            if cached_svg_path is not None:
+                report["cache_hit"] = True
+                if _files_identical(cached_svg_path, output_abs_path):
+                    log(f"Unchanged (cache hit, output already up to date): {output_file}")
+                else:
+                    temp_fd, temp_path = tempfile.mkstemp(
+                        suffix=".svg", prefix=f".{os.path.basename(output_abs_path)}.", dir=os.path.dirname(output_abs_path)
+                    )
+                    with os.fdopen(temp_fd, "wb") as dst, open(cached_svg_path, "rb") as src:
+                        shutil.copyfileobj(src, dst)
+                    os.replace(temp_path, output_abs_path)
+                    log(f"Restored from cache (cache hit): {output_file}")
+                return True
+        except OSError as cache_err:
+            log(f"Warning: conversion cache unavailable, converting normally: {cache_err}", file=sys.stderr)
+            cache = None
+
     success = False
     temp_svg_path = None
+    viewbox_size = args.size
+    legacy_hierarchy = None
     try:
-        # 1. Preprocess Image
-        img_processed, preprocess_success = preprocess_image(
-            input_file,
-            args.size,
-            args.threshold,
-            preserve_layers=args.preserve_layers
-        )
+        if args.tile_size:
+            # 1+2. Preprocess and trace tile by tile at full resolution
+            contours_data, viewbox_size = vectorize_tiled(input_file, args, timer=timer, log=log)
+        else:
+            # 1. Preprocess Image
+            img_processed, preprocess_success = preprocess_image(
+                input_file,
+                args.size,
+                args.threshold,
+                preserve_layers=args.preserve_layers,
+                edge_backend=args.edge_backend,
+                timer=timer,
+                layer_jobs=args.layer_jobs,
+                log=log
+            )
 
-        if not preprocess_success or img_processed is None:
-            raise Exception("Image preprocessing failed.")
+            if not preprocess_success or img_processed is None:
+                raise Exception("Image preprocessing failed.")
 
-        # 2. Detect Contours
-        contours_data, contours_success = detect_contours(
-            img_processed,
-            simplify=args.simplify,
-            smooth=args.smooth,
-            preserve_layers=args.preserve_layers
-        )
+            # 2. Detect Contours
+            contours_data, contours_success = detect_contours(
+                img_processed,
+                simplify=args.simplify,
+                smooth=args.smooth,
+                preserve_layers=args.preserve_layers,
+                timer=timer,
+                layer_jobs=args.layer_jobs,
+                log=log
+            )
 
-        if not contours_success:
-            raise Exception("Contour detection failed.")
+            # Legacy mode returns (contours, hierarchy) rather than a success flag
+            if not args.preserve_layers:
+                legacy_hierarchy, contours_success = contours_success, contours_success is not None
+            if not contours_success:
+                raise Exception("Contour detection failed.")
 
         # 3. Create SVG from Contours
-        # Use a temporary file path during creation
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".svg", mode='w') as temp_f:
-            temp_svg_path = temp_f.name
-            print(f"Created temporary file: {temp_svg_path}")
+        # Use a temporary file next to the output so the final os.replace is an atomic rename
+        temp_fd, temp_svg_path = tempfile.mkstemp(
+            suffix=".svg", prefix=f".{os.path.basename(output_abs_path)}.", dir=os.path.dirname(output_abs_path)
+        )
+        os.close(temp_fd)
+        log(f"Created temporary file: {temp_svg_path}")
 
+        path_data, curve_fitter = path_data_for_args(args)
         if not create_svg_from_contours(
             contours_data,
             temp_svg_path, # Write to temp file first
-            args.size,
+            viewbox_size,
             args.width,
             args.height,
             stroke_width=args.stroke_width,
             bronze_color=args.bronze_color,
-            preserve_layers=args.preserve_layers
+            preserve_layers=args.preserve_layers,
+            writer=args.writer,
+            compact=args.compact,
+            path_data=path_data,
+            timer=timer,
+            log=log,
+            hierarchy=legacy_hierarchy
         ):
             raise Exception("SVG creation failed.")
 
         # If SVG creation successful, move temp file to final destination
-        print(f"Moving temporary file to final destination: {output_abs_path}")
+        log(f"Moving temporary file to final destination: {output_abs_path}")
         try:
             os.replace(temp_svg_path, output_file)
             if os.path.exists(output_file):
-                print(f"Confirmed: Output file exists at {output_file}")
+                log(f"Confirmed: Output file exists at {output_file}")
             else:
-                print(f"WARNING: Output file was not found after move operation at {output_file}")
+                log(f"WARNING: Output file was not found after move operation at {output_file}")
             temp_svg_path = None # Avoid deletion in finally block
         except Exception as move_err:
             raise Exception(f"Failed to move temporary SVG to final destination: {move_err}")
 
         success = True
-        print("-" * 30)
-        print(f"Successfully converted '{input_file}' to '{output_file}'")
-        print(f"SVG Size: {args.width}mm x {args.height}mm")
-        print(f"SVG ViewBox: 0 0 {args.size} {args.size}")
+        if cache is not None and cache_key is not None:
+            try:
+                cache.store(cache_key, output_abs_path)
+            except OSError as cache_err:
+                log(f"Warning: could not update conversion cache: {cache_err}", file=sys.stderr)
+        log("-" * 30)
+        log(f"Successfully converted '{input_file}' to '{output_file}'")
+        log(f"SVG Size: {args.width}mm x {args.height}mm")
+        log("SVG ViewBox: 0 0 %s %s" % _viewbox_dims(viewbox_size))
         
         if args.preserve_layers:
             edge_count = len(contours_data['edges']) if 'edges' in contours_data else 0
             circle_count = len(contours_data['circle']) if 'circle' in contours_data else 0 
             shape_count = len(contours_data['shapes']) if 'shapes' in contours_data else 0
-            print(f"Contours found: {edge_count} edges, {circle_count} circle, {shape_count} shapes")
+            log(f"Contours found: {edge_count} edges, {circle_count} circle, {shape_count} shapes")
         else:
-            print(f"Contours found: {len(contours_data)}")
+            log(f"Contours found: {len(contours_data)}")
+        if curve_fitter:
+            log(curve_fitter.summary())
+            report["curve_fitting"] = {
+                "nodes_before": curve_fitter.nodes_before, "nodes_after": curve_fitter.nodes_after,
+                "path_bytes_before": curve_fitter.bytes_before, "path_bytes_after": curve_fitter.bytes_after,
+            }
             
-        print("-" * 30)
+        log("-" * 30)
 
     except Exception as e:
-        print(f"\nERROR during processing of {input_file}: {e}", file=sys.stderr)
+        log(f"\nERROR during processing of {input_file}: {e}", file=sys.stderr)
         # import traceback # Uncomment for detailed debugging
         # traceback.print_exc() # Uncomment for detailed debugging
 
@@ -657,33 +2371,689 @@ def process_file(input_file, output_file, args):
         # Clean up temporary SVG file if it still exists (due to error)
         if temp_svg_path and os.path.exists(temp_svg_path):
             try:
-                print(f"Removing temporary file: {temp_svg_path}")
+                log(f"Removing temporary file: {temp_svg_path}")
                 os.remove(temp_svg_path)
             except OSError as rm_err:
-                print(f"Warning: could not remove temporary output file '{temp_svg_path}': {rm_err}", file=sys.stderr)
+                log(f"Warning: could not remove temporary output file '{temp_svg_path}': {rm_err}", file=sys.stderr)
 
     return success
 
 
+# --- Parameter Sweeps ---
+
+def parse_sweep_values(text):
+    """argparse type for --threshold/--size: "240", "200,220,240" or "start:stop:step" (stop inclusive)."""
+    try:
+        if ":" in text:
+            parts = [int(part) for part in text.split(":")]
+            if len(parts) not in (2, 3):
+                raise ValueError
+            start, stop = parts[0], parts[1]
+            step = parts[2] if len(parts) == 3 else 1
+            if step <= 0 or stop < start:
+                raise ValueError
+            return list(range(start, stop + 1, step))
+        return [int(part) for part in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an integer, a comma list or start:stop[:step], got '{text}'")
+
+
+class SweepPipeline:
+    """Memoized stage graph for converting one image under many settings.
+
+        decode -> resize(size) -> edges(size) ---------------------+
+                               -> masks(size, threshold) -> contours(size, threshold) -> svg
+
+    Each stage result is cached under (stage, parameters it depends on), so
+    a threshold sweep decodes, resizes and runs Canny once per size and
+    only repeats the threshold and contour stages. `release(size)` drops a
+    finished size's intermediates to keep memory bounded.
+    """
+
+    def __init__(self, input_path, args):
+        self.input_path = input_path
+        self.args = args
+        self.log = log_for(args)
+        self.memo = {}
+        self.stats = {}  # stage -> [computed, reused]
+
+    def _stage(self, name, params, compute):
+        key = (name,) + params
+        counts = self.stats.setdefault(name, [0, 0])
+        if key in self.memo:
+            counts[1] += 1
+            return self.memo[key]
+        counts[0] += 1
+        value = self.memo[key] = compute()
+        return value
+
+    def decoded(self):
+        return self._stage("decode", (), lambda: load_image_on_white(self.input_path, self.log))
+
+    def gray(self, size):
+        return self._stage("resize", (size,), lambda: gray_array_for_processing(self.decoded(), size))
+
+    def edges(self, size):
+        return self._stage("edges", (size,), lambda: detect_edges(self.gray(size), self.args.edge_backend))
+
+    def masks(self, size, threshold):
+        def compute():
+            shapes = threshold_image(self.gray(size), threshold)
+            if not self.args.preserve_layers:
+                return shapes
+            return {'edges': self.edges(size), 'shapes': shapes, 'circle': close_circle_mask(shapes)}
+        return self._stage("threshold", (size, threshold), compute)
+
+    def contours(self, size, threshold):
+        def compute():
+            # Layered mode returns (contours dict, success); legacy mode returns (contours, hierarchy)
+            contours_data, detected = detect_contours(
+                self.masks(size, threshold),
+                simplify=self.args.simplify,
+                smooth=self.args.smooth,
+                preserve_layers=self.args.preserve_layers,
+                layer_jobs=self.args.layer_jobs,
+                log=self.log
+            )
+            return contours_data, None if self.args.preserve_layers else detected
+        return self._stage("contours", (size, threshold), compute)
+
+    def release(self, size):
+        """Forgets every intermediate that depends on `size`."""
+        self.memo = {key: value for key, value in self.memo.items() if len(key) < 2 or key[1] != size}
+
+
+def sweep_file(input_file, output_file, args, report=None):
+    """Converts one input for every (size, threshold) combination and writes a comparison report.
+
+    Outputs are named "<base>_t<threshold>_s<size>.svg"; the report goes to
+    "<base>_sweep-report.csv" and is also printed as a table. (`report` is
+    accepted for run_batch's sake only; --report cannot be combined with a sweep.)
+    """
+    log = log_for(args)
+    log("-" * 40)
+    log(f"Sweeping file: {input_file}")
+    log(f"Thresholds: {args.thresholds}  Sizes: {args.sizes}")
+    base = os.path.splitext(os.path.abspath(output_file or input_file))[0]
+    pipeline = SweepPipeline(input_file, args)
+    rows = []
+    try:
+        for size in args.sizes:
+            for threshold in args.thresholds:
+                contours_data, hierarchy = pipeline.contours(size, threshold)
+                output_path = f"{base}_t{threshold}_s{size}.svg"
+                temp_fd, temp_svg_path = tempfile.mkstemp(
+                    suffix=".svg", prefix=f".{os.path.basename(output_path)}.", dir=os.path.dirname(output_path)
+                )
+                os.close(temp_fd)
+                path_data, _ = path_data_for_args(args)
+                try:
+                    if not create_svg_from_contours(
+                        contours_data, temp_svg_path, size, args.width, args.height,
+                        stroke_width=args.stroke_width, bronze_color=args.bronze_color,
+                        preserve_layers=args.preserve_layers, writer=args.writer, compact=args.compact,
+                        path_data=path_data, log=log, hierarchy=hierarchy
+                    ):
+                        raise Exception("SVG creation failed.")
+                    os.replace(temp_svg_path, output_path)
+                finally:
+                    if os.path.exists(temp_svg_path):
+                        os.remove(temp_svg_path)
+                with open(output_path, "rb") as f:
+                    svg_bytes = f.read()
+                if args.preserve_layers:
+                    layer_counts = {layer: len(contours_data[layer]) for layer in ("edges", "circle", "shapes")}
+                else:
+                    layer_counts = {"edges": 0, "circle": 0, "shapes": len(contours_data)}
+                rows.append({
+                    "threshold": threshold, "size": size, **layer_counts,
+                    "paths": svg_bytes.count(b"<path"), "bytes": len(svg_bytes), "output": output_path,
+                })
+            pipeline.release(size)
+    except Exception as e:
+        log(f"\nERROR during sweep of {input_file}: {e}", file=sys.stderr)
+        return False
+
+    report_path = f"{base}_sweep-report.csv"
+    columns = ["threshold", "size", "edges", "circle", "shapes", "paths", "bytes", "output"]
+    with open(report_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    log("-" * 30)
+    log(f"{'threshold':>9} {'size':>6} {'paths':>6} {'shapes':>6} {'bytes':>9}  output")
+    for row in rows:
+        log(f"{row['threshold']:>9} {row['size']:>6} {row['paths']:>6} {row['shapes']:>6} {row['bytes']:>9,}  {os.path.basename(row['output'])}")
+    stage_summary = ", ".join(f"{stage} {computed}x (reused {reused}x)" for stage, (computed, reused) in pipeline.stats.items())
+    log(f"Stages: {stage_summary}")
+    log(f"Sweep report: {report_path}")
+    log("-" * 30)
+    return True
+
+
+# --- Edge Backend Benchmark ---
+
+def edge_similarity(reference, candidate, tolerance_px=1):
+    """Compares two 0/255 edge maps: (F1 within `tolerance_px`, exact pixel IoU)."""
+    kernel = np.ones((2 * tolerance_px + 1, 2 * tolerance_px + 1), np.uint8)
+    ref, cand = reference > 0, candidate > 0
+    near_ref = cv2.dilate(reference, kernel) > 0
+    near_cand = cv2.dilate(candidate, kernel) > 0
+    precision = (cand & near_ref).sum() / max(int(cand.sum()), 1)
+    recall = (ref & near_cand).sum() / max(int(ref.sum()), 1)
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    iou = (ref & cand).sum() / max(int((ref | cand).sum()), 1)
+    return float(f1), float(iou)
+
+
+def benchmark_edge_backends(input_files, args, repeats=3):
+    """Times every available edge backend on each input and reports agreement with skimage."""
+    print(f"{'file':<32} {'backend':<8} {'median ms':>9} {'edge px':>8} {'F1@1px':>7} {'IoU':>6}")
+    for input_file in input_files:
+        try:
+            img_gray = gray_array_for_processing(load_image_on_white(input_file), args.size)
+        except Exception as e:
+            print(f"ERROR: could not load {input_file}: {e}", file=sys.stderr)
+            continue
+        reference = None
+        for backend in EDGE_BACKENDS:
+            timings = []
+            try:
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    edges = detect_edges(img_gray, backend)
+                    timings.append(time.perf_counter() - started)
+            except ImportError as e:
+                print(f"{os.path.basename(input_file)[:32]:<32} {backend:<8} unavailable ({e})")
+                continue
+            if reference is None and backend == EDGE_BACKEND_SKIMAGE:
+                reference = edges
+            f1, iou = edge_similarity(reference, edges) if reference is not None else (float("nan"), float("nan"))
+            print(f"{os.path.basename(input_file)[:32]:<32} {backend:<8} {sorted(timings)[len(timings) // 2] * 1000:>9.1f} "
+                  f"{int(np.count_nonzero(edges)):>8} {f1:>7.4f} {iou:>6.3f}")
+
+
+# --- Sprite Sheet ---
+
+def sprite_symbol_id(svg_path, taken):
+    """Stable symbol ID from an icon's file name ("Builder Profile.svg" -> "icon-builder-profile")."""
+    stem = os.path.splitext(os.path.basename(svg_path))[0]
+    symbol_id = SPRITE_SYMBOL_PREFIX + (re.sub(r"[^a-z0-9]+", "-", stem.lower()).strip("-") or "unnamed")
+    unique_id, suffix = symbol_id, 2
+    while unique_id in taken:
+        unique_id, suffix = f"{symbol_id}-{suffix}", suffix + 1
+    taken.add(unique_id)
+    return unique_id
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def build_sprite(icons, sprite_path, compact=False, log=print):
+    """Combines converted SVGs into one sprite sheet of <symbol>s plus a JSON manifest.
+
+    `icons` is a list of (input file, converted SVG file). Each SVG's layer
+    groups become a <symbol> with the icon's viewBox and an ID derived from
+    its file name, so pages reference icons as
+    <svg><use href="sprite.svg#icon-name"/></svg> from one cached request.
+    Path data that occurs more than once in the sheet (e.g. the same
+    background circle in every icon) is written once in <defs> under an ID
+    derived from its content and referenced with <use>; paths carry no
+    styling of their own, so a <use> renders exactly like the path it
+    replaces. Group IDs are prefixed with the symbol ID to stay unique.
+    The manifest ("<sprite base>.json") lists each symbol's ID, source,
+    viewBox and physical size. Returns the manifest as a dict. The summary
+    lines go to `log`.
+    """
+    taken = set()
+    symbols = []
+    for input_file, svg_path in icons:
+        root = ET.parse(svg_path).getroot()
+        symbols.append({
+            "id": sprite_symbol_id(svg_path, taken),
+            "source": input_file,
+            "svg": svg_path,
+            "root": root,
+            "bytes": os.path.getsize(svg_path),
+        })
+    symbols.sort(key=lambda symbol: symbol["id"])
+
+    occurrences = {}
+    for symbol in symbols:
+        for element in symbol["root"].iter():
+            if _local_name(element.tag) == "path" and "d" in element.attrib:
+                occurrences[element.attrib["d"]] = occurrences.get(element.attrib["d"], 0) + 1
+    shared = {d: SPRITE_SHARED_PATH_PREFIX + hashlib.sha1(d.encode("utf-8")).hexdigest()[:10]
+              for d, count in occurrences.items() if count > 1}
+
+    newline = "" if compact else "\n"
+    indent_unit = "" if compact else "  "
+    out = ['<?xml version="1.0" encoding="utf-8" ?>\n',
+           '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" version="1.1">',
+           newline]
+
+    def write_element(element, depth, symbol_id):
+        tag = _local_name(element.tag)
+        if tag in ("defs", "title"):
+            return
+        attrs = dict(element.attrib)
+        if tag == "path" and attrs.get("d") in shared:
+            tag = "use"
+            attrs = {**{k: v for k, v in attrs.items() if k != "d"}, "xlink:href": "#" + shared[attrs["d"]]}
+        if "id" in attrs:
+            attrs["id"] = f"{symbol_id}-{attrs['id']}"
+        attr_text = "".join(f' {name}="{_xml_attr(value)}"' for name, value in sorted(attrs.items()))
+        children = list(element)
+        if not children:
+            out.append(f"{indent_unit * depth}<{tag}{attr_text}/>{newline}")
+            return
+        out.append(f"{indent_unit * depth}<{tag}{attr_text}>{newline}")
+        for child in children:
+            write_element(child, depth + 1, symbol_id)
+        out.append(f"{indent_unit * depth}</{tag}>{newline}")
+
+    if shared:
+        out.append(f"{indent_unit}<defs>{newline}")
+        for d, path_id in sorted(shared.items(), key=lambda item: item[1]):
+            out.append(f'{indent_unit * 2}<path d="{_xml_attr(d)}" id="{path_id}"/>{newline}')
+        out.append(f"{indent_unit}</defs>{newline}")
+    for symbol in symbols:
+        root = symbol["root"]
+        out.append(f'{indent_unit}<symbol id="{symbol["id"]}" viewBox="{_xml_attr(root.get("viewBox", ""))}">{newline}')
+        for child in root:
+            write_element(child, 2, symbol["id"])
+        out.append(f"{indent_unit}</symbol>{newline}")
+    out.append("</svg>\n")
+
+    sprite_dir = os.path.dirname(os.path.abspath(sprite_path))
+    temp_fd, temp_path = tempfile.mkstemp(suffix=".svg", prefix=f".{os.path.basename(sprite_path)}.", dir=sprite_dir)
+    with os.fdopen(temp_fd, "w", encoding="utf-8") as f:
+        f.write("".join(out))
+    os.replace(temp_path, sprite_path)
+
+    manifest = {
+        "sprite": os.path.basename(sprite_path),
+        "bytes": os.path.getsize(sprite_path),
+        "separate_files_bytes": sum(symbol["bytes"] for symbol in symbols),
+        "shared_paths": len(shared),
+        "shared_path_uses": sum(occurrences[d] for d in shared),
+        "symbols": [{
+            "id": symbol["id"],
+            "source": os.path.relpath(os.path.abspath(symbol["source"]), sprite_dir),
+            "svg": os.path.relpath(os.path.abspath(symbol["svg"]), sprite_dir),
+            "viewBox": symbol["root"].get("viewBox"),
+            "width": symbol["root"].get("width"),
+            "height": symbol["root"].get("height"),
+        } for symbol in symbols],
+    }
+    manifest_path = os.path.splitext(sprite_path)[0] + ".json"
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    log(f"Sprite sheet: {sprite_path} ({len(symbols)} symbols, {manifest['bytes']:,} bytes vs "
+          f"{manifest['separate_files_bytes']:,} as separate files; {len(shared)} shared paths replace "
+          f"{manifest['shared_path_uses']} copies)")
+    log(f"Sprite manifest: {manifest_path}")
+    return manifest
+
+
+# --- Library API ---
+
+def _image_from_input(image):
+    """PIL image from encoded image bytes (PNG, JPEG, ...) or a uint8 pixel array (H x W, or H x W x 3/4 in RGB(A) order)."""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        try:
+            img = open_image(io.BytesIO(image))  # PIL's default size limit, even in tiled mode
+            img.load()
+        except Exception as e:
+            raise ValueError(f"could not decode image data: {e}") from e
+        return img
+    if isinstance(image, np.ndarray):
+        if image.dtype != np.uint8 or image.ndim not in (2, 3) or (image.ndim == 3 and image.shape[2] not in (3, 4)):
+            raise ValueError(f"expected a uint8 array of shape (H, W), (H, W, 3) or (H, W, 4), got {image.dtype} {image.shape}")
+        return Image.fromarray(np.ascontiguousarray(image))
+    raise TypeError(f"vectorize() expects image bytes or a NumPy array, not {type(image).__name__}")
+
+
+def vectorize(image, **options):
+    """Converts an image to SVG in memory and returns the SVG document as UTF-8 bytes.
+
+    `image` is encoded image bytes or a uint8 pixel array (RGB(A) order;
+    convert OpenCV's BGR first). `options` are the conversion settings of
+    the command line under their argument names (threshold, size, width,
+    height, simplify, smooth, stroke_width, bronze_color, preserve_layers,
+    edge_backend, curve_tolerance, path_encoding, precision, compact,
+    tile_size, tile_overlap, tile_jobs, layer_jobs); see VECTORIZE_OPTIONS for the
+    defaults. Nothing touches the filesystem or the cache, and the
+    pipeline's progress messages go to a log kept for this call only
+    (sys.stdout and sys.stderr are left alone), so threads may call it
+    concurrently.
+    Raises TypeError/ValueError for bad input or options and RuntimeError
+    if the conversion fails.
+
+    The script's file name is not importable as a module name, so load it with
+    importlib.util.spec_from_file_location(...) and call module.vectorize().
+    """
+    unknown = sorted(set(options) - set(VECTORIZE_OPTIONS))
+    if unknown:
+        raise TypeError(f"vectorize() got unexpected option(s): {', '.join(unknown)}")
+    args = argparse.Namespace(**{**VECTORIZE_OPTIONS, **options}, writer=SVG_WRITER_STREAM)
+    problems = list(conversion_option_errors(args))
+    if args.edge_backend not in EDGE_BACKENDS:
+        problems.append(("edge_backend", f"must be one of {', '.join(EDGE_BACKENDS)}"))
+    if args.path_encoding not in (PATH_ENCODING_ABSOLUTE, PATH_ENCODING_RELATIVE):
+        problems.append(("path_encoding", f"must be '{PATH_ENCODING_ABSOLUTE}' or '{PATH_ENCODING_RELATIVE}'"))
+    if problems:
+        raise ValueError("; ".join(f"{option} {problem}" for option, problem in problems))
+    if args.tile_jobs == 0:
+        args.tile_jobs = os.cpu_count() or 1
+    if args.layer_jobs == 0:
+        args.layer_jobs = default_layer_jobs()
+    source = _image_from_input(image)
+
+    messages = io.StringIO()
+
+    def log(*values, file=None, **kwargs):
+        print(*values, file=messages, **kwargs)
+
+    svg_text = io.StringIO()
+    hierarchy = None
+    try:
+        if args.tile_size:
+            contours_data, viewbox_size = vectorize_tiled(source, args, log=log)
+        else:
+            viewbox_size = args.size
+            img_processed, preprocess_success = preprocess_image(
+                source, args.size, args.threshold, preserve_layers=args.preserve_layers, edge_backend=args.edge_backend,
+                layer_jobs=args.layer_jobs, log=log
+            )
+            if not preprocess_success or img_processed is None:
+                raise RuntimeError(f"image preprocessing failed: {messages.getvalue().strip()}")
+            contours_data, detected = detect_contours(
+                img_processed, simplify=args.simplify, smooth=args.smooth, preserve_layers=args.preserve_layers,
+                layer_jobs=args.layer_jobs, log=log
+            )
+            if not args.preserve_layers:
+                hierarchy = detected
+        path_data, _ = path_data_for_args(args)
+        elements = iter_svg_elements(contours_data, args.stroke_width, args.bronze_color, args.preserve_layers,
+                                     path_data=path_data, hierarchy=hierarchy)
+        write_svg_document(svg_text.write, elements, viewbox_size, args.width, args.height, compact=args.compact)
+    except RuntimeError:
+        raise
+    except Exception as e:  # Anything the pipeline raises is a failed conversion, not a bad argument
+        raise RuntimeError(f"conversion failed: {type(e).__name__}: {e}") from e
+    return svg_text.getvalue().encode("utf-8")
+
+
+# --- Conversion Service (--serve) ---
+
+def _warm_service_worker(edge_backend):
+    """Pool initializer: pays the imports and first-call costs once per worker, not once per request."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C stops the service; the parent then shuts the pool down
+    vectorize(np.full((64, 64), 255, np.uint8), size=64, edge_backend=edge_backend)
+
+
+def _start_service_pool(jobs, edge_backend):
+    """Starts the service's worker processes and waits until every one of them has warmed up."""
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=_warm_service_worker, initargs=(edge_backend,))
+    # Submitting one task per worker at once starts every worker process now; each warms up in the
+    # initializer before it takes any work, so no request ever lands on a cold worker
+    for future in [pool.submit(os.getpid) for _ in range(jobs)]:
+        future.result()
+    return pool
+
+
+def _service_convert(server, data, options):
+    """Runs one conversion in the server's pool; if a worker process has died, replaces the pool and retries once."""
+    pool = server.pool
+    try:
+        return pool.submit(vectorize, data, **options).result()
+    except BrokenProcessPool:
+        with server.pool_lock:
+            if server.pool is pool:  # The first request to notice replaces it; the others use the new pool
+                pool.shutdown(wait=False, cancel_futures=True)
+                server.pool = _start_service_pool(server.worker_count, server.defaults["edge_backend"])
+            pool = server.pool
+    return pool.submit(vectorize, data, **options).result()
+
+
+def _coerce_option(name, text):
+    """Converts a query-string value to the type of the option's default."""
+    default = VECTORIZE_OPTIONS[name]
+    if isinstance(default, bool):
+        if text.lower() in ("1", "true", "yes", "on"):
+            return True
+        if text.lower() in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(f"{name} must be true or false, got '{text}'")
+    value_type = int if default is None else type(default)  # precision is the only option without a default
+    try:
+        return value_type(text)
+    except ValueError:
+        raise ValueError(f"{name} must be {value_type.__name__}, got '{text}'") from None
+
+
+class VectorizeRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end of the conversion service.
+
+    POST /vectorize with the image file as the request body returns the SVG;
+    options go in the query string under their argument names (dashes or
+    underscores), e.g. /vectorize?threshold=200&curve-tolerance=1, and
+    override the defaults the service was started with. GET /health reports
+    the worker count. Conversions run in the server's warm process pool;
+    bad options or a bad Content-Length get 400, and 503 means the
+    conversion workers could not be restarted.
+    """
+
+    server_version = "PNG-SVG-Vectorizer"
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error_text(self, status, message):
+        self._send(status, "text/plain; charset=utf-8", (message + "\n").encode("utf-8"))
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/health":
+            return self._send_error_text(404, "not found (POST /vectorize or GET /health)")
+        body = json.dumps({"status": "ok", "workers": self.server.worker_count, "defaults": self.server.defaults})
+        self._send(200, "application/json", body.encode("utf-8"))
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/vectorize":
+            return self._send_error_text(404, "not found (POST /vectorize or GET /health)")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            return self._send_error_text(400, "Content-Length must be a whole number of bytes")
+        if length == 0:
+            return self._send_error_text(411, "send the image as the request body, with a Content-Length")
+        if length > SERVE_MAX_UPLOAD_MB * 1024 * 1024:
+            return self._send_error_text(413, f"image larger than {SERVE_MAX_UPLOAD_MB} MB")
+        data = self.rfile.read(length)
+        try:
+            options = dict(self.server.defaults)
+            for name, values in parse_qs(url.query).items():
+                name = name.replace("-", "_")
+                if name not in VECTORIZE_OPTIONS:
+                    raise ValueError(f"unknown option '{name}'")
+                options[name] = _coerce_option(name, values[-1])
+            svg_bytes = _service_convert(self.server, data, options)
+        except (TypeError, ValueError) as e:
+            return self._send_error_text(400, str(e))
+        except BrokenProcessPool:
+            return self._send_error_text(503, "conversion workers unavailable; try again")
+        except Exception as e:  # Conversion failure or a crashed worker
+            return self._send_error_text(500, f"conversion failed: {e}")
+        self._send(200, "image/svg+xml", svg_bytes)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def serve(args):
+    """Runs the local conversion service until interrupted (--serve PORT).
+
+    A pool of args.jobs worker processes is started and warmed up front
+    (imports, OpenCV/scikit-image initialisation), so each request only
+    pays for its own conversion. The conversion options given on the
+    command line become the service's defaults. A pool that loses a worker
+    process (crash, OOM kill) is replaced and warmed again by the next
+    request that finds it broken.
+    """
+    defaults = {name: getattr(args, name) for name in VECTORIZE_OPTIONS}
+    server = ThreadingHTTPServer((args.serve_host, args.serve), VectorizeRequestHandler)
+    server.pool, server.defaults, server.quiet = _start_service_pool(args.jobs, args.edge_backend), defaults, args.quiet
+    server.pool_lock = threading.Lock()
+    server.worker_count = args.jobs
+    host, port = server.server_address[:2]
+    print(f"Conversion service on http://{host}:{port}/vectorize with {args.jobs} worker process(es); "
+          "Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping conversion service...")
+    finally:
+        server.server_close()
+        server.pool.shutdown(cancel_futures=True)
+
+
+# --- Batch Execution ---
+
+def _log_errors_only(*values, file=None, **kwargs):
+    """The --quiet log: progress messages are dropped; messages sent to a file (errors go to sys.stderr) still print."""
+    if file is not None:
+        print(*values, file=file, **kwargs)
+
+
+def log_for(args):
+    """The `log` callable for a run: print, or under --quiet one that keeps only the errors."""
+    return _log_errors_only if args.quiet else print
+
+
+def _process_file_captured(task):
+    """Worker-process entry point: converts one file and returns its output instead of printing it.
+
+    Capturing the output lets the parent print each file's log as one block,
+    in input order, rather than interleaving lines from several workers.
+    stdout and stderr are captured separately so errors still end up on
+    stderr, as in a serial run. Returns (input, success, stdout text,
+    stderr text, --report entry or None).
+    """
+    worker, input_file, output_file, args = task
+    report = {} if args.report_file else None
+    out_log, err_log = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(out_log), contextlib.redirect_stderr(err_log):
+        try:
+            success = worker(input_file, output_file, args, report)
+        except Exception as e:  # process_file handles its own errors; this is a last resort
+            print(f"\nERROR during processing of {input_file}: {e}", file=sys.stderr)
+            success = False
+    return input_file, success, out_log.getvalue(), err_log.getvalue(), report
+
+
+def run_batch(input_files, output_file, args, worker=process_file):
+    """Runs `worker` (process_file or sweep_file) on every input file, in parallel when args.jobs > 1.
+
+    Returns (succeeded, failed, reports): lists of input paths, plus one
+    --report entry per file in input order (empty without --report). Logs
+    are printed in input order as soon as each file's turn comes up.
+    """
+    tasks = [(worker, input_file, output_file, args) for input_file in input_files]
+    succeeded, failed, reports = [], [], []
+
+    if args.jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            report = {} if args.report_file else None
+            success = worker(*task[1:], report)
+            (succeeded if success else failed).append(task[1])
+            if report is not None:
+                reports.append(report)
+        return succeeded, failed, reports
+
+    workers = min(args.jobs, len(tasks))
+    log_for(args)(f"Converting {len(tasks)} files with {workers} worker processes...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields results in submission order while workers run ahead
+        results = pool.map(_process_file_captured, tasks, chunksize=1)
+        for task in tasks:
+            try:
+                input_file, success, out_text, err_text, report = next(results)
+            except Exception as e:  # A worker died (e.g. killed, out of memory)
+                input_file, success, out_text = task[1], False, ""
+                err_text = f"\nERROR: worker failed while converting {task[1]}: {e}\n"
+                report = {"input": task[1], "success": False} if args.report_file else None
+            sys.stdout.write(out_text)
+            sys.stdout.flush()
+            sys.stderr.write(err_text)
+            sys.stderr.flush()
+            (succeeded if success else failed).append(input_file)
+            if report is not None:
+                reports.append(report)
+    return succeeded, failed, reports
+
+
 # --- Main Execution ---
 if __name__ == "__main__":
     # Parse command line arguments
     args = parse_arguments()
+    log = log_for(args)
+
+    log("PNG to SVG Conversion Tool v2")
+    log("=============================")
 
-    print("PNG to SVG Conversion Tool v2")
-    print("=============================")
+    if args.benchmark_edges:
+        benchmark_edge_backends(args.input_files, args)
+        sys.exit(0)
 
-    # Count successes and failures
-    success_count = 0
-    failure_count = 0
+    if args.serve is not None:
+        serve(args)
+        sys.exit(0)
+
+    # Determine output file: Use -o if single input, otherwise generate automatically
+    output_file_arg = args.output_file if len(args.input_files) == 1 else None
 
     # Process all input files
-    for input_file in args.input_files:
-        # Determine output file: Use -o if single input, otherwise generate automatically
-        output_file_arg = args.output_file if len(args.input_files) == 1 else None
-        if process_file(input_file, output_file_arg, args):
-            success_count += 1
-        else:
+    batch_started = time.perf_counter()
+    succeeded, failed, reports = run_batch(args.input_files, output_file_arg, args,
+                                           worker=sweep_file if args.sweep else process_file)
+    success_count = len(succeeded)
+    failure_count = len(failed)
+
+    if args.report_file:
+        run_report = {
+            "settings": {name: getattr(args, name, None) for name in CACHE_KEY_SETTINGS},
+            "jobs": args.jobs,
+            "layer_jobs": args.layer_jobs,
+            "seconds": round(time.perf_counter() - batch_started, 6),
+            "files": reports,
+        }
+        try:
+            with open(args.report_file, "w", encoding="utf-8") as f:
+                json.dump(run_report, f, indent=2)
+                f.write("\n")
+            log(f"Run report: {args.report_file}")
+        except OSError as e:
+            print(f"ERROR writing run report {args.report_file}: {e}", file=sys.stderr)
+            failure_count += 1
+
+    if args.sprite_file and succeeded:
+        icons = [(input_file, output_file_arg or os.path.splitext(input_file)[0] + ".svg") for input_file in succeeded]
+        try:
+            build_sprite(icons, args.sprite_file, compact=args.compact, log=log)
+        except (OSError, ET.ParseError) as e:
+            print(f"ERROR building sprite sheet {args.sprite_file}: {e}", file=sys.stderr)
             failure_count += 1
 
     # Print summary if processing multiple files
@@ -693,6 +3063,10 @@ if __name__ == "__main__":
         print(f"  Successfully converted: {success_count}")
         print(f"  Failed conversions:     {failure_count}")
         print(f"  Total files processed:  {len(args.input_files)}")
+        print(f"  Worker processes:       {min(args.jobs, len(args.input_files))}")
+        print(f"  Elapsed time:           {time.perf_counter() - batch_started:.1f}s")
+        for failed_file in failed:
+            print(f"  FAILED: {failed_file}")
         print("=" * 40)
 
     # Exit with error code if any conversions failed
@@ -700,5 +3074,5 @@ if __name__ == "__main__":
         print("\nCompleted with errors.", file=sys.stderr)
         sys.exit(1)
 
-    print("\nCompleted successfully.")
+    log("\nCompleted successfully.")
     sys.exit(0) # Exit successfully
\ No newline at end of file